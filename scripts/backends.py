@@ -0,0 +1,265 @@
+"""
+Model backends behind the shared model client.
+Each backend takes Gemini-style calls (model, contents, GenerateContentConfig)
+and returns google.genai response objects, so the scripts, cache and ledger
+work the same whichever backend serves the call.
+"""
+
+import json
+import time
+import socket
+import threading
+import contextvars
+
+import httpx
+from google import genai
+from google.genai import types
+
+CACHE_DISPLAY_NAME = "saudi-tech-legal-guide prompt prefix"
+
+# Calls made under a Cancellation (hedged racers) go through a separate client whose
+# connections are not kept alive, so each racer opens its own and its Cancellation sees
+# it; every other call shares the default pooled connections
+RACING_LIMITS = httpx.Limits(max_keepalive_connections=0)
+
+FINISH_REASONS = {
+    "stop": types.FinishReason.STOP,
+    "length": types.FinishReason.MAX_TOKENS,
+    "content_filter": types.FinishReason.SAFETY,
+}
+
+
+class BackendError(Exception):
+    """HTTP error from a backend; `code` and `response` feed the scheduler's retry logic."""
+
+    def __init__(self, code, message, response=None):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.response = response
+
+
+current_cancellation = contextvars.ContextVar("current_cancellation", default=None)
+
+
+class Cancellation:
+    """Lets another thread stop the calls made while it is current, even mid-read.
+
+    While one is current, the backends send calls through their racing
+    HTTP clients, which register each connection a call opens with it (see
+    track_request). cancel() shuts their
+    sockets down, which ends a read blocked on a stalled server with an
+    error, so the call gives up its scheduler slot at once; a connection
+    registered after cancel() is shut as soon as it opens.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._streams = []
+        self._lock = threading.Lock()
+
+    def attach(self, network_stream):
+        with self._lock:
+            self._streams.append(network_stream)
+            cancelled = self.cancelled
+        if cancelled:
+            _shutdown(network_stream)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            streams, self._streams = self._streams, []
+        for stream in streams:
+            _shutdown(stream)
+
+
+def _shutdown(network_stream):
+    sock = network_stream.get_extra_info("socket")
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass                 # already closed
+
+
+def track_request(request):
+    """httpx request hook: register the connection a call opens with the current Cancellation."""
+    cancellation = current_cancellation.get()
+    if cancellation is None:
+        return
+
+    def trace(event, info):
+        if event in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            cancellation.attach(info["return_value"])
+
+    request.extensions = {**request.extensions, "trace": trace}
+
+
+RACING_HOOKS = {"request": [track_request]}
+
+
+class GeminiBackend:
+    """Google Gemini through google-genai, optionally at another base URL."""
+
+    name = "gemini"
+
+    def __init__(self, api_key=None, base_url=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self._client = None
+        self._racing_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # Created on first use so model names can be resolved without an API key.
+        # Only one may ever exist: a discarded genai.Client closes its connections.
+        with self._lock:
+            if self._client is None:
+                http_options = types.HttpOptions(base_url=self.base_url) if self.base_url else None
+                self._client = genai.Client(api_key=self.api_key, http_options=http_options)
+            return self._client
+
+    @property
+    def racing_client(self):
+        """The client for calls made under a Cancellation, created on first use like `client`."""
+        with self._lock:
+            if self._racing_client is None:
+                http_options = types.HttpOptions(base_url=self.base_url, client_args={
+                    "limits": RACING_LIMITS, "event_hooks": RACING_HOOKS})
+                self._racing_client = genai.Client(api_key=self.api_key, http_options=http_options)
+            return self._racing_client
+
+    def _call_client(self):
+        return self.racing_client if current_cancellation.get() is not None else self.client
+
+    def model_name(self, model):
+        """Name of the model that really serves calls for `model`."""
+        return model
+
+    def generate_content(self, model, contents, config=None):
+        return self._call_client().models.generate_content(model=model, contents=contents, config=config)
+
+    def generate_content_stream(self, model, contents, config=None):
+        return self._call_client().models.generate_content_stream(model=model, contents=contents, config=config)
+
+    def create_cache(self, model, system_instruction, ttl):
+        """Upload a system instruction as cached content for `ttl` seconds.
+
+        Returns (name, expiry as a Unix time, tokens cached); calls that set
+        GenerateContentConfig.cached_content to the name are billed the
+        cached-token rate for it.
+        """
+        cache = self.client.caches.create(model=model, config=types.CreateCachedContentConfig(
+            system_instruction=system_instruction, ttl=f"{ttl}s", display_name=CACHE_DISPLAY_NAME))
+        expires = cache.expire_time.timestamp() if cache.expire_time else time.time() + ttl
+        tokens = cache.usage_metadata.total_token_count if cache.usage_metadata else None
+        return cache.name, expires, tokens
+
+    def delete_cache(self, name):
+        self.client.caches.delete(name=name)
+
+
+class OpenAICompatibleBackend:
+    """Any server speaking the OpenAI chat completions API, such as llama.cpp or vLLM.
+
+    Every call goes to one local model (`model`, or the requested Gemini
+    model name if unset, which llama.cpp ignores). Image input, image generation and
+    provider-side caches are not supported; llama.cpp and vLLM reuse the KV
+    cache of a repeated prompt prefix on their own.
+    """
+
+    name = "openai"
+
+    def __init__(self, base_url, api_key=None, model=None):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.http = httpx.Client(base_url=self.base_url, headers=headers, timeout=None)
+        # For calls made under a Cancellation; see RACING_LIMITS
+        self.racing_http = httpx.Client(base_url=self.base_url, headers=headers, timeout=None,
+                                        limits=RACING_LIMITS, event_hooks=RACING_HOOKS)
+
+    def _http(self):
+        return self.racing_http if current_cancellation.get() is not None else self.http
+
+    def model_name(self, model):
+        return f"{self.name}:{self.model or model}"
+
+    def _request(self, model, contents, config, stream):
+        """Translate a Gemini-style call into a chat completions body and timeout."""
+        if config and config.response_modalities and "IMAGE" in config.response_modalities:
+            raise BackendError(501, f"The {self.name} backend cannot generate images; use --backend gemini")
+        if not all(isinstance(content, str) for content in contents):
+            raise BackendError(501, f"The {self.name} backend only sends text prompts; use --backend gemini")
+        messages = [{"role": "user", "content": "\n\n".join(contents)}]
+        if config and config.system_instruction:
+            messages.insert(0, {"role": "system", "content": config.system_instruction})
+        body = {
+            "model": self.model or model,
+            "messages": messages,
+            "stream": stream,
+        }
+        if stream:
+            body["stream_options"] = {"include_usage": True}
+        timeout = None
+        if config:
+            if config.temperature is not None:
+                body["temperature"] = config.temperature
+            if config.max_output_tokens:
+                body["max_tokens"] = config.max_output_tokens
+            if config.http_options and config.http_options.timeout:
+                timeout = config.http_options.timeout / 1000
+        return body, timeout
+
+    def create_cache(self, model, system_instruction, ttl):
+        raise BackendError(501, f"The {self.name} backend has no provider-side caches")
+
+    def _check(self, response):
+        if response.status_code >= 400:
+            response.read()
+            raise BackendError(response.status_code, response.text[:500], response)
+
+    def generate_content(self, model, contents, config=None):
+        body, timeout = self._request(model, contents, config, stream=False)
+        response = self._http().post("/chat/completions", json=body, timeout=timeout)
+        self._check(response)
+        data = response.json()
+        choice = data["choices"][0]
+        return to_response(choice["message"].get("content") or "", choice.get("finish_reason"), data.get("usage"))
+
+    def generate_content_stream(self, model, contents, config=None):
+        body, timeout = self._request(model, contents, config, stream=True)
+        finish_reason = None
+        with self._http().stream("POST", "/chat/completions", json=body, timeout=timeout) as response:
+            self._check(response)
+            for line in response.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                data = json.loads(payload)
+                choices = data.get("choices") or []
+                text = (choices[0].get("delta") or {}).get("content") if choices else None
+                finish_reason = (choices[0].get("finish_reason") if choices else None) or finish_reason
+                # The usage-only chunk at the end repeats the finish reason seen before it
+                if text or data.get("usage"):
+                    yield to_response(text or "", finish_reason, data.get("usage"))
+
+
+def to_response(text, finish_reason=None, usage=None):
+    """Wrap chat completion output in a google.genai response."""
+    usage_metadata = None
+    if usage:
+        usage_metadata = types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=usage.get("prompt_tokens"),
+            candidates_token_count=usage.get("completion_tokens"),
+            total_token_count=usage.get("total_tokens"),
+        )
+    return types.GenerateContentResponse(
+        candidates=[types.Candidate(
+            content=types.Content(role="model", parts=[types.Part(text=text)]),
+            finish_reason=FINISH_REASONS.get(finish_reason, types.FinishReason.OTHER) if finish_reason else None,
+        )],
+        usage_metadata=usage_metadata,
+    )
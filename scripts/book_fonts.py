@@ -0,0 +1,133 @@
+"""
+Fonts for the PDF books, from the files in fonts/.
+The stylesheet only names families that get @font-face rules here, so a
+build never fetches a font or picks one up from the system. DejaVu Sans and
+DejaVu Sans Mono are in the repository. The book's own fonts, Inter and Noto
+Sans Arabic, are used once their files are added to fonts/; until then
+their families are set in DejaVu Sans. Before layout, each font is cut down
+to the characters its edition uses; WeasyPrint then embeds that subset
+whole, so every part of the book carries the same font program and the
+merged PDF keeps only one copy of it.
+"""
+
+import os
+import hashlib
+import unicodedata
+from pathlib import Path
+
+from fontTools import subset
+from fontTools.ttLib import TTFont
+
+BASE_DIR = Path(__file__).parent.parent
+FONTS_DIR = BASE_DIR / "fonts"
+
+# Fonts in the repository as (weight, file) by family; DejaVu Sans covers the symbols the
+# text fonts lack, like ☐
+FONT_FILES = {
+    "DejaVu Sans": [(400, "DejaVuSans.ttf"), (700, "DejaVuSans-Bold.ttf")],
+    "DejaVu Sans Mono": [(400, "DejaVuSansMono.ttf")],
+}
+
+# The book's text fonts, used when all of a family's files are in fonts/ (see fonts/README.md)
+BOOK_FONT_FILES = {
+    "Inter": [(400, "Inter-Regular.ttf"), (500, "Inter-Medium.ttf"), (600, "Inter-SemiBold.ttf"),
+              (700, "Inter-Bold.ttf")],
+    "Noto Sans Arabic": [(400, "NotoSansArabic-Regular.ttf"), (600, "NotoSansArabic-SemiBold.ttf"),
+                         (700, "NotoSansArabic-Bold.ttf")],
+}
+FALLBACK_FAMILY = "DejaVu Sans"
+
+# Characters no font needs to draw: controls, bidi marks and spaces
+INVISIBLE = {"Cc", "Cf", "Zs", "Zl", "Zp"}
+
+
+def fallback_families():
+    """The book font families without all their files in fonts/, which are set in FALLBACK_FAMILY."""
+    return [family for family, faces in BOOK_FONT_FILES.items()
+            if not all((FONTS_DIR / name).exists() for _, name in faces)]
+
+
+def vendored_fonts():
+    """Paths of the fonts to use as {family: [(weight, path)]}; raises if a repository font is missing.
+
+    Book font families missing from fonts/ map to FALLBACK_FAMILY's files.
+    """
+    missing = [name for faces in FONT_FILES.values() for _, name in faces if not (FONTS_DIR / name).exists()]
+    if missing:
+        raise FileNotFoundError(f"Fonts missing from {FONTS_DIR}: {', '.join(missing)}")
+    fonts = {family: [(weight, FONTS_DIR / name) for weight, name in faces] for family, faces in FONT_FILES.items()}
+    fallback = fallback_families()
+    for family, faces in BOOK_FONT_FILES.items():
+        fonts[family] = (fonts[FALLBACK_FAMILY] if family in fallback
+                         else [(weight, FONTS_DIR / name) for weight, name in faces])
+    return fonts
+
+
+def _file_hash(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()[:16]
+
+
+def subset_font(path, characters, cache_dir):
+    """A copy of the font at path with only the glyphs for characters; returns its path.
+
+    Layout features are kept, so Arabic joining forms and ligatures reachable
+    from the characters stay in. Subsets are cached by the font file and the
+    character set, and older subsets of the same font are removed.
+    """
+    key = hashlib.sha256(f"{_file_hash(path)}\0{''.join(sorted(characters))}".encode("utf-8")).hexdigest()[:16]
+    target = cache_dir / f"{path.stem}-{key}{path.suffix}"
+    if target.exists():
+        return target
+
+    options = subset.Options()
+    options.layout_features = ["*"]
+    options.name_IDs = ["*"]
+    options.notdef_outline = True
+    options.hinting = False
+    font = TTFont(path)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=[ord(c) for c in characters])
+    subsetter.subset(font)
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_file = target.with_name(target.name + ".tmp")
+    font.save(tmp_file)
+    os.replace(tmp_file, target)
+    # Only this font's subsets: DejaVuSans-* would also match DejaVuSans-Bold's
+    for stale in cache_dir.glob(f"{path.stem}-{'?' * len(key)}{path.suffix}"):
+        if stale != target:
+            stale.unlink()
+    return target
+
+
+def edition_fonts(text, cache_dir):
+    """Subsets of the fonts in use for the characters in text, as {family: [(weight, path)]}."""
+    characters = set(text)
+    return {family: [(weight, subset_font(path, characters, cache_dir)) for weight, path in faces]
+            for family, faces in vendored_fonts().items()}
+
+
+def uncovered(text):
+    """Visible characters in text that none of the fonts in use has, sorted."""
+    covered = set()
+    for path in {path for faces in vendored_fonts().values() for _, path in faces}:
+        with TTFont(path, lazy=True) as font:
+            covered.update(chr(code) for code in font.getBestCmap())
+    return sorted(c for c in set(text) - covered if unicodedata.category(c) not in INVISIBLE)
+
+
+def font_face_css(fonts):
+    """@font-face rules for {family: [(weight, path)]}.
+
+    Subset file names carry a hash of the font and its characters, so a new
+    font or new characters change the stylesheet and lay out again the
+    parts cached with the old one.
+    """
+    rules = []
+    for family, faces in fonts.items():
+        for weight, path in faces:
+            rules.append(f"@font-face {{\n"
+                         f"    font-family: '{family}';\n"
+                         f"    src: url('{Path(path).as_uri()}');\n"
+                         f"    font-weight: {weight};\n}}")
+    return "\n\n".join(rules)
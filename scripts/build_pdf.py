@@ -4,11 +4,26 @@ Build styled PDF books from markdown chapters with illustrations.
 Modern style: white background, green accents, dark grey text.
 """
 
+import io
 import os
 import re
+import time
+import string
+import hashlib
+import argparse
+import resource
 import markdown
+import weasyprint
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import Fit
 from weasyprint import HTML, CSS
+from weasyprint.text.fonts import FontConfiguration
+
+from book_fonts import FALLBACK_FAMILY, edition_fonts, fallback_families, font_face_css, uncovered
+from illustration_assets import (DRAFT_DPI, PRINT_DPI, caption, get_illustrations_for_chapter, localized,
+                                 plan_items_by_path, prepare, print_derivative)
 
 # Directories
 BASE_DIR = Path(__file__).parent.parent
@@ -16,6 +31,7 @@ CHAPTERS_AR = BASE_DIR / "chapters_ar"
 CHAPTERS_EN = BASE_DIR / "chapters_en"
 ILLUSTRATIONS = BASE_DIR / "illustrations"
 OUTPUT_DIR = BASE_DIR / "output"
+RENDER_CACHE = OUTPUT_DIR / ".render_cache"
 
 # Modern color scheme
 COLORS = {
@@ -29,13 +45,50 @@ COLORS = {
     "code_bg": "#F5F5F5",      # Code background
 }
 
-# CSS Styling
-CSS_STYLE = f"""
-@import url('https://fonts.googleapis.com/css2?family=Noto+Sans+Arabic:wght@400;600;700&family=Inter:wght@400;500;600;700&display=swap');
+# Render profiles. print is the book's full look; draft swaps gradients, shadows and rounded
+# corners for flat equivalents, embeds low-resolution images and leaves out the cover pages,
+# so a layout preview renders and writes faster. Line layout is the same in both, and it is
+# most of the Arabic edition's build time, so the draft saves far less there
+PROFILES = {
+    "print": {
+        "quote_background": "linear-gradient(135deg, #E8F5E9 0%, #F1F8E9 100%)",
+        "rule_background": f"linear-gradient(90deg, {COLORS['secondary']}, transparent)",
+        "cover_background": "linear-gradient(135deg, #E8F5E9 0%, #FFFFFF 50%, #E8F5E9 100%)",
+        "decoration_background": f"linear-gradient(90deg, {COLORS['secondary']}, {COLORS['accent']})",
+        "figure_shadow": "0 4px 12px rgba(0,0,0,0.1)",
+        "rounded": True,
+        "image_dpi": PRINT_DPI,
+        "covers": True,
+    },
+    "draft": {
+        "quote_background": "#E8F5E9",
+        "rule_background": COLORS['secondary'],
+        "cover_background": "none",
+        "decoration_background": COLORS['secondary'],
+        "figure_shadow": "none",
+        "rounded": False,
+        "image_dpi": DRAFT_DPI,
+        "covers": False,
+    },
+}
+
+def build_css(profile="print"):
+    """The book stylesheet for a render profile; both profiles come from this one source.
 
+    Fonts are not included: build_book puts @font-face rules for the
+    edition's font subsets in front of it.
+    """
+    look = PROFILES[profile]
+
+    def radius(value):
+        return value if look["rounded"] else "0"
+
+    return f"""
 @page {{
     size: A4;
     margin: 2.5cm 2cm;
+    /* Margin boxes inherit from the page, not the body */
+    font-family: 'Inter', 'Noto Sans Arabic', 'DejaVu Sans';
     @top-center {{
         content: string(chapter-title);
         font-size: 10pt;
@@ -57,7 +110,7 @@ CSS_STYLE = f"""
 }}
 
 body {{
-    font-family: 'Inter', 'Noto Sans Arabic', sans-serif;
+    font-family: 'Inter', 'Noto Sans Arabic', 'DejaVu Sans';
     font-size: 11pt;
     line-height: 1.8;
     color: {COLORS['text']};
@@ -68,7 +121,7 @@ body {{
 body.rtl {{
     direction: rtl;
     text-align: right;
-    font-family: 'Noto Sans Arabic', 'Inter', sans-serif;
+    font-family: 'Noto Sans Arabic', 'Inter', 'DejaVu Sans';
 }}
 
 /* Cover Page */
@@ -225,9 +278,9 @@ tr:nth-child(even) {{
 blockquote {{
     margin: 1.5em 0;
     padding: 1em 1.5em;
-    background: linear-gradient(135deg, #E8F5E9 0%, #F1F8E9 100%);
+    background: {look['quote_background']};
     border-left: 4px solid {COLORS['secondary']};
-    border-radius: 0 8px 8px 0;
+    border-radius: {radius('0 8px 8px 0')};
     font-style: italic;
     color: {COLORS['text']};
 }}
@@ -235,22 +288,22 @@ blockquote {{
 body.rtl blockquote {{
     border-left: none;
     border-right: 4px solid {COLORS['secondary']};
-    border-radius: 8px 0 0 8px;
+    border-radius: {radius('8px 0 0 8px')};
 }}
 
 /* Code */
 code {{
-    font-family: 'Courier New', monospace;
+    font-family: 'DejaVu Sans Mono', 'Noto Sans Arabic', 'DejaVu Sans';
     background: {COLORS['code_bg']};
     padding: 2px 6px;
-    border-radius: 4px;
+    border-radius: {radius('4px')};
     font-size: 0.9em;
 }}
 
 pre {{
     background: {COLORS['code_bg']};
     padding: 1em;
-    border-radius: 8px;
+    border-radius: {radius('8px')};
     overflow-x: auto;
     border: 1px solid {COLORS['border']};
 }}
@@ -270,8 +323,8 @@ pre code {{
 .figure img {{
     max-width: 100%;
     height: auto;
-    border-radius: 8px;
-    box-shadow: 0 4px 12px rgba(0,0,0,0.1);
+    border-radius: {radius('8px')};
+    box-shadow: {look['figure_shadow']};
 }}
 
 .figure-caption {{
@@ -285,7 +338,7 @@ pre code {{
 .tip, .warning, .note {{
     margin: 1.5em 0;
     padding: 1em 1.5em;
-    border-radius: 8px;
+    border-radius: {radius('8px')};
     page-break-inside: avoid;
 }}
 
@@ -324,7 +377,7 @@ a {{
 hr {{
     border: none;
     height: 2px;
-    background: linear-gradient(90deg, {COLORS['secondary']}, transparent);
+    background: {look['rule_background']};
     margin: 2em 0;
 }}
 
@@ -343,7 +396,7 @@ hr {{
     align-items: center;
     min-height: 80vh;
     text-align: center;
-    background: linear-gradient(135deg, #E8F5E9 0%, #FFFFFF 50%, #E8F5E9 100%);
+    background: {look['cover_background']};
     padding: 3em;
 }}
 
@@ -374,9 +427,14 @@ hr {{
 .chapter-cover .chapter-decoration {{
     width: 100px;
     height: 4px;
-    background: linear-gradient(90deg, {COLORS['secondary']}, {COLORS['accent']});
+    background: {look['decoration_background']};
     margin: 2em auto;
-    border-radius: 2px;
+    border-radius: {radius('2px')};
+}}
+
+/* Chapter heading in place of the cover page (draft profile) */
+h1.chapter-heading {{
+    page-break-before: always;
 }}
 
 /* Checklist styling */
@@ -398,6 +456,87 @@ hr {{
 }}
 """
 
+# Parallel rendering: chunks are laid out without page numbers, which are overlaid after the merge.
+# Each chunk ends its document, so the forced break after the cover or contents is dropped;
+# the next chunk starts a new page anyway
+CHUNK_CSS = """
+@page {
+    @bottom-center { content: none; }
+}
+
+.cover, .toc {
+    page-break-after: auto;
+}
+"""
+
+# A chapter chunk starts on its cover page, which shows the chapter title as in the single document
+CHAPTER_CHUNK_CSS = """
+@page :first {
+    @top-center { content: string(chapter-title); }
+}
+"""
+
+
+def continued_title_css(title):
+    """Stylesheet for a front-matter chunk that follows the cover.
+
+    In the single document the contents pages carry the title set by the
+    cover's heading as their running header, first page included; a chunk
+    laid out on its own has no cover, so the title is given here.
+    """
+    title = title.replace("\\", "\\\\").replace('"', '\\"')
+    return f"""
+@page {{
+    @top-center {{ content: "{title}"; }}
+}}
+
+@page :first {{
+    @top-center {{ content: "{title}"; }}
+}}
+"""
+
+
+def body_margin_css(first, last):
+    """Stylesheet for a chunk's body margins.
+
+    In the single document the body's default margin only shows above the
+    book's first page and below its last; it is cut at the forced breaks in
+    between. A chunk laid out on its own would get both, so it keeps only
+    those at the ends of the book.
+    """
+    return f"""
+body {{
+    {'' if first else 'margin-top: 0;'}
+    {'' if last else 'margin-bottom: 0;'}
+}}
+"""
+
+
+# Blank pages carrying only the page number; no background, so they can be laid over the book
+NUMBERS_CSS = """
+@page {
+    @top-center { content: none; }
+}
+
+body {
+    background: none;
+}
+
+.numbered-page {
+    height: 1px;
+    break-after: page;
+}
+
+.numbered-page:last-child {
+    break-after: auto;
+}
+"""
+
+BOOK_TITLES = {
+    "ar": "البوصلة القانونية لشركات التقنية في السعودية",
+    "en": "The Legal Compass for Tech Companies in Saudi Arabia",
+}
+
 # Chapter order
 CHAPTER_ORDER = [
     "00_introduction",
@@ -421,43 +560,12 @@ CHAPTER_ORDER = [
     "appendix_d_glossary",
 ]
 
-# Illustration mapping (chapter_id -> list of illustration files)
-def get_illustrations_for_chapter(chapter_id):
-    """Get illustration paths for a chapter."""
-    illustrations = []
-
-    # Map chapter IDs to illustration directories
-    chapter_mapping = {
-        "01_company_types": "ch01",
-        "02_foreign_investors": "ch01",  # MISA is in ch01
-        "03_founding_steps": "ch01",
-        "04_pdpl_basics": "ch02",
-        "05_consent": "ch02",
-        "06_cross_border": "ch03",
-        "07_pdpl_compliance": "ch03",
-        "08_pdpl_penalties": "ch04",
-        "09_cybersecurity_ecosystem": "ch05",
-        "10_ecc_controls": "ch05",
-        "11_government_contracts": "ch06",
-        "12_compliance_advantage": "ch07",
-        "13_ai_landscape": "ch08",
-        "14_ai_products": "ch08",
-    }
-
-    if chapter_id in chapter_mapping:
-        ch_dir = ILLUSTRATIONS / chapter_mapping[chapter_id]
-        if ch_dir.exists():
-            illustrations = sorted(ch_dir.glob("*.jpg")) + sorted(ch_dir.glob("*.png"))
-
-    return illustrations
-
-
 def create_cover_html(lang):
     """Create cover page HTML."""
     if lang == "ar":
         return f"""
         <div class="cover">
-            <h1>البوصلة القانونية لشركات التقنية في السعودية</h1>
+            <h1>{BOOK_TITLES['ar']}</h1>
             <p class="subtitle">دليلك العملي للأنظمة والامتثال</p>
             <p class="author">د. عبدالله</p>
             <p class="year">٢٠٢٦</p>
@@ -466,7 +574,7 @@ def create_cover_html(lang):
     else:
         return f"""
         <div class="cover">
-            <h1>The Legal Compass for Tech Companies in Saudi Arabia</h1>
+            <h1>{BOOK_TITLES['en']}</h1>
             <p class="subtitle">Your Practical Guide to Regulations and Compliance</p>
             <p class="author">Dr. Abdullah</p>
             <p class="year">2026</p>
@@ -556,8 +664,9 @@ def create_chapter_cover(title, chapter_id, lang):
     '''
 
 
-def process_markdown(content, chapter_id, lang):
+def process_markdown(content, chapter_id, lang, profile="print"):
     """Convert markdown to HTML and add illustrations."""
+    look = PROFILES[profile]
 
     # Extract title from first heading
     title_match = re.search(r'^#\s+(.+)$', content, re.MULTILINE)
@@ -570,17 +679,23 @@ def process_markdown(content, chapter_id, lang):
     md = markdown.Markdown(extensions=['tables', 'fenced_code'])
     html = md.convert(content)
 
-    # Create chapter cover + content
-    chapter_cover = create_chapter_cover(title, chapter_id, lang)
+    # Create chapter cover + content; drafts open the chapter with its title instead
+    if look["covers"]:
+        chapter_cover = create_chapter_cover(title, chapter_id, lang)
+    else:
+        chapter_cover = f'<h1 class="chapter-heading">{title}</h1>'
 
     # Add illustrations at the end of the chapter
     illustrations = get_illustrations_for_chapter(chapter_id)
     if illustrations:
+        items = plan_items_by_path()
         for img_path in illustrations[:2]:  # Max 2 images per chapter
-            img_name = img_path.stem.replace("_", " ").title()
+            img_name = caption(img_path, lang, items.get(img_path.resolve()))
+            # Embed the print-sized derivative of this edition's variant, not the full-resolution original
+            img_src = print_derivative(localized(img_path, lang, items), look["image_dpi"])
             html += f'''
             <div class="figure">
-                <img src="file://{img_path}" alt="{img_name}">
+                <img src="file://{img_src}" alt="{img_name}">
                 <p class="figure-caption">{img_name}</p>
             </div>
             '''
@@ -588,13 +703,31 @@ def process_markdown(content, chapter_id, lang):
     return chapter_cover + f'<div class="chapter-content">{html}</div>'
 
 
-def build_book(lang):
-    """Build PDF book for a language."""
+def log(lang, message):
+    """Print a line tagged with its language, since both editions may build at once."""
+    prefix = "\n" if message.startswith("\n") else ""
+    print(f"{prefix}[{lang.upper()}] {message.lstrip()}", flush=True)
+
+
+def build_book(lang, jobs=1, cache=False, profile="print"):
+    """Build PDF book for a language.
+
+    By default the book is laid out as a single document. With jobs > 1 or
+    cache, the cover, table of contents and each chapter are laid out as
+    separate documents, in `jobs` processes, and merged; with cache, each
+    part's pages are kept in output/.render_cache and only parts whose HTML
+    or CSS changed are laid out again. A draft (see PROFILES) is written next to
+    the print PDF as book_<lang>_draft.pdf and cached separately. Text is set
+    only in the fonts in fonts/ (see book_fonts), cut down to the characters
+    this edition uses.
+    """
 
     chapters_dir = CHAPTERS_AR if lang == "ar" else CHAPTERS_EN
-    output_file = OUTPUT_DIR / f"book_{lang}.pdf"
+    look = PROFILES[profile]
+    suffix = "" if profile == "print" else f"_{profile}"
+    output_file = OUTPUT_DIR / f"book_{lang}{suffix}.pdf"
 
-    print(f"\nBuilding {'Arabic' if lang == 'ar' else 'English'} PDF...")
+    log(lang, f"\nBuilding {'Arabic' if lang == 'ar' else 'English'} PDF ({profile})...")
 
     # Collect all chapter content
     chapters_content = []
@@ -603,45 +736,260 @@ def build_book(lang):
         if chapter_file.exists():
             content = chapter_file.read_text(encoding='utf-8')
             chapters_content.append((chapter_id, content))
-            print(f"  Added: {chapter_id}")
+            log(lang, f"  Added: {chapter_id}")
+
+    # Make any missing variants and print derivatives up front, in parallel
+    items = plan_items_by_path()
+    prepare((path for chapter_id, _ in chapters_content for path in get_illustrations_for_chapter(chapter_id)[:2]),
+            lambda path: print_derivative(localized(path, lang, items), look["image_dpi"]))
 
     # Build HTML document
-    rtl_class = ' class="rtl"' if lang == "ar" else ''
+    front_matter = [("toc", create_toc_html(chapters_content, lang))]
+    if look["covers"]:
+        front_matter.insert(0, ("cover", create_cover_html(lang)))
+    chapters_html = []
+    for chapter_id, content in chapters_content:
+        chapter_html = process_markdown(content, chapter_id, lang, profile)
+        chapters_html.append(f'<div class="chapter">{chapter_html}</div>')
+
+    full_html = html_document([part for _, part in front_matter] + chapters_html, lang)
 
-    html_parts = [
+    # Save HTML for debugging
+    html_file = OUTPUT_DIR / f"book_{lang}{suffix}.html"
+    html_file.write_text(full_html, encoding='utf-8')
+    log(lang, f"  HTML saved: {html_file}")
+
+    # Subset the fonts to the edition's characters: its HTML, the stylesheet's generated
+    # content and the page number digits
+    text = full_html + build_css(profile) + string.digits
+    fallback = fallback_families()
+    if fallback:
+        log(lang, f"  [!] {', '.join(fallback)} not in fonts/; set in {FALLBACK_FAMILY} (see fonts/README.md)")
+    missing = uncovered(text)
+    if missing:
+        log(lang, f"  [!] {len(missing)} characters are in none of the fonts in fonts/ and will come from "
+                  f"system fonts: {''.join(missing)}")
+    css = font_face_css(edition_fonts(text, RENDER_CACHE / "fonts" / lang)) + build_css(profile)
+
+    # Generate PDF
+    started = time.perf_counter()
+    if cache or jobs > 1:
+        log(lang, f"  Generating PDF in {len(front_matter) + len(chapters_html)} parts, {jobs} at a time...")
+        chunks = [(name, html_document([part], lang),
+                   [css, CHUNK_CSS] + ([continued_title_css(BOOK_TITLES[lang])] if i and look["covers"] else []))
+                  for i, (name, part) in enumerate(front_matter)]
+        chunks += [(chapter_id, html_document([part], lang), [css, CHUNK_CSS, CHAPTER_CHUNK_CSS])
+                   for (chapter_id, _), part in zip(chapters_content, chapters_html)]
+        chunks = [(name, html, stylesheets + [body_margin_css(i == 0, i == len(chunks) - 1)])
+                  for i, (name, html, stylesheets) in enumerate(chunks)]
+        cache_dir = RENDER_CACHE / f"{lang}{suffix}" if cache else None
+        write_pdf_in_chunks(chunks, lang, output_file, jobs, css, cache_dir)
+    else:
+        log(lang, f"  Generating PDF...")
+        HTML(string=full_html, base_url=str(BASE_DIR)).write_pdf(
+            output_file,
+            stylesheets=[CSS(string=css, font_config=font_config())],
+            font_config=font_config(),
+            full_fonts=True,
+        )
+
+    log(lang, f"  PDF saved: {output_file} ({time.perf_counter() - started:.1f}s)")
+    return output_file
+
+
+def html_document(parts, lang):
+    """Wrap body parts in the book's HTML document."""
+    rtl_class = ' class="rtl"' if lang == "ar" else ''
+    return '\n'.join([
         f'<!DOCTYPE html><html lang="{lang}"><head><meta charset="UTF-8"></head>',
         f'<body{rtl_class}>',
-        create_cover_html(lang),
-        create_toc_html(chapters_content, lang),
-    ]
+        *parts,
+        '</body></html>',
+    ])
 
-    # Add chapters
-    for chapter_id, content in chapters_content:
-        chapter_html = process_markdown(content, chapter_id, lang)
-        html_parts.append(f'<div class="chapter">{chapter_html}</div>')
 
-    html_parts.append('</body></html>')
+_font_config = None
 
-    full_html = '\n'.join(html_parts)
 
-    # Save HTML for debugging
-    html_file = OUTPUT_DIR / f"book_{lang}.html"
-    html_file.write_text(full_html, encoding='utf-8')
-    print(f"  HTML saved: {html_file}")
+def font_config():
+    """This process's WeasyPrint FontConfiguration, made on first use and shared by every part it lays out.
 
-    # Generate PDF
-    print(f"  Generating PDF...")
-    HTML(string=full_html, base_url=str(BASE_DIR)).write_pdf(
-        output_file,
-        stylesheets=[CSS(string=CSS_STYLE)]
+    Making one loads the fontconfig setup and scans the system fonts, and
+    each @font-face file is registered with it once; sharing it means that
+    happens once per process rather than once per part.
+    """
+    global _font_config
+    if _font_config is None:
+        _font_config = FontConfiguration()
+    return _font_config
+
+
+def render_chunk(html, stylesheets):
+    """Lay out one part of the book on its own; returns the PDF bytes. Runs in a worker process.
+
+    The fonts are already the edition's subsets, so they are embedded whole
+    (full_fonts) rather than cut down again to this part's glyphs; every
+    part then carries the same font programs, and the merge keeps one copy.
+    """
+    return HTML(string=html, base_url=str(BASE_DIR)).write_pdf(
+        stylesheets=[CSS(string=css, font_config=font_config()) for css in stylesheets],
+        font_config=font_config(),
+        full_fonts=True,
     )
 
-    print(f"  PDF saved: {output_file}")
-    return output_file
+
+def chunk_key(html, stylesheets):
+    """Hash of everything a part's layout depends on.
+
+    The HTML holds the chapter text, the language and the illustration
+    paths, which name the image hash; the WeasyPrint version is included
+    because a new release can lay the same input out differently.
+    """
+    digest = hashlib.sha256(weasyprint.__version__.encode("utf-8"))
+    for text in [html, *stylesheets]:
+        digest.update(b"\0" + text.encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def cached_render(cache_dir, name, html, stylesheets):
+    """PDF bytes for a part from the render cache, or None."""
+    if cache_dir is None:
+        return None
+    cache_file = cache_dir / f"{name}-{chunk_key(html, stylesheets)}.pdf"
+    return cache_file.read_bytes() if cache_file.exists() else None
+
+
+def store_render(cache_dir, name, html, stylesheets, pdf):
+    """Keep a part's PDF in the render cache, replacing older renders of the same part."""
+    cache_file = cache_dir / f"{name}-{chunk_key(html, stylesheets)}.pdf"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_suffix(".pdf.tmp")
+    tmp_file.write_bytes(pdf)
+    os.replace(tmp_file, cache_file)
+    for stale in cache_dir.glob(f"{name}-*.pdf"):
+        if stale != cache_file:
+            stale.unlink()
+
+
+def write_pdf_in_chunks(chunks, lang, output_file, jobs, css, cache_dir=None):
+    """Render (name, html, stylesheets) chunks in a process pool and merge them into one PDF.
+
+    Running headers come from each chunk, since every chapter sets its own
+    title (the contents chunk is given the cover's, see continued_title_css).
+    Page numbers must run through the whole book, so chunks are laid
+    out without them and a blank document with the book's page count and
+    only page numbers, styled by `css`, is laid over the merged pages. With
+    cache_dir, chunks rendered before with the same inputs are reused.
+    """
+    rendered = [cached_render(cache_dir, *chunk) for chunk in chunks]
+    missing = [i for i, pdf in enumerate(rendered) if pdf is None]
+    if cache_dir is not None:
+        log(lang, f"  {len(chunks) - len(missing)} of {len(chunks)} parts unchanged since the last build")
+
+    # The largest chunks go first so the slowest one is not left for last
+    missing.sort(key=lambda i: -len(chunks[i][1]))
+    if jobs > 1 and len(missing) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {i: executor.submit(render_chunk, *chunks[i][1:]) for i in missing}
+            for i in missing:
+                rendered[i] = futures[i].result()
+    else:
+        for i in missing:
+            rendered[i] = render_chunk(*chunks[i][1:])
+    if cache_dir is not None:
+        for i in missing:
+            store_render(cache_dir, *chunks[i], rendered[i])
+
+    # Each part's outline is added by hand: a part with no h1 (the contents after
+    # the cover) goes under the entry before it, as in a single document
+    writer = PdfWriter()
+    parent = None
+    for (_, html, _), pdf in zip(chunks, rendered):
+        reader = PdfReader(io.BytesIO(pdf))
+        start = len(writer.pages)
+        writer.append(reader, import_outline=False)
+        if "<h1" in html or parent is None:
+            parent = copy_outline(writer, reader, reader.outline, start)
+        else:
+            copy_outline(writer, reader, reader.outline, start, parent)
+
+    # The overlay only depends on the page count, so it is cached like a chunk
+    pages = len(writer.pages)
+    numbers_chunk = ("page-numbers", html_document(['<div class="numbered-page"></div>'] * pages, lang),
+                     [css, NUMBERS_CSS])
+    numbers_pdf = cached_render(cache_dir, *numbers_chunk)
+    if numbers_pdf is None:
+        numbers_pdf = render_chunk(*numbers_chunk[1:])
+        if cache_dir is not None:
+            store_render(cache_dir, *numbers_chunk, numbers_pdf)
+    numbers = PdfReader(io.BytesIO(numbers_pdf))
+    if len(numbers.pages) != pages:
+        raise RuntimeError(f"Page number overlay has {len(numbers.pages)} pages for a {pages}-page book")
+    for page, numbered in zip(writer.pages, numbers.pages):
+        page.merge_page(numbered)
+        # Merging rewrites the page's content stream uncompressed
+        page.compress_content_streams()
+
+    # Every part embeds the same font subsets; keep one copy of each. A pass only
+    # merges objects that are identical as written, so the descriptors and font
+    # dictionaries pointing at merged font files are caught by the passes after it
+    objects = None
+    while True:
+        writer.compress_identical_objects()
+        remaining = sum(obj is not None for obj in writer._objects)
+        if remaining == objects:
+            break
+        objects = remaining
+
+    with open(output_file, "wb") as f:
+        writer.write(f)
+
+
+def copy_outline(writer, reader, items, start, parent=None):
+    """Add a part's outline items to the book's under parent, pages offset by start; returns the last one added."""
+    item = None
+    for entry in items:
+        if isinstance(entry, list):
+            copy_outline(writer, reader, entry, start, item)
+        else:
+            item = writer.add_outline_item(entry.title, start + reader.get_destination_page_number(entry),
+                                           parent=parent, fit=Fit.xyz(entry.left, entry.top, entry.zoom))
+    return item
+
+
+def timed_build(lang, jobs, cache=False, profile="print"):
+    """Build one edition and measure it; returns (pdf path, seconds, peak RSS in MB).
+
+    Runs in its own process, so the figure is this edition's alone. ru_maxrss
+    is a per-process maximum, for RUSAGE_CHILDREN too (the largest finished
+    child, not a sum), so with jobs > 1 it is the peak of the biggest single
+    process, this one or a render worker, not of the whole pool.
+    """
+    started = time.perf_counter()
+    output_file = build_book(lang, jobs, cache, profile)
+    seconds = time.perf_counter() - started
+    # ru_maxrss is in kilobytes on Linux
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return output_file, seconds, peak / 1024
 
 
 def main():
-    """Build both Arabic and English PDFs."""
+    """Build the Arabic and English PDFs, each in its own process."""
+    parser = argparse.ArgumentParser(description="Build the Saudi Tech Legal Compass PDFs")
+    parser.add_argument("--lang", choices=["ar", "en", "both"], default="both",
+                        help="Edition to build: ar (Arabic), en (English), or both (default) at the same time")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Lay out the cover, table of contents and chapters as separate documents in "
+                             "this many processes per edition and merge them (default: 1)")
+    parser.add_argument("--cache", action="store_true",
+                        help=f"Lay out the book in parts and reuse unchanged parts from "
+                             f"{RENDER_CACHE.relative_to(BASE_DIR)}; without it and with --jobs 1 (default) "
+                             "the book is laid out as one document")
+    parser.add_argument("--profile", choices=list(PROFILES), default="print",
+                        help="print (default): the finished look; draft: flat styles, low-resolution images "
+                             "and no cover pages, for a quick layout preview written to book_<lang>_draft.pdf")
+    args = parser.parse_args()
 
     print("=" * 60)
     print("Saudi Tech Legal Compass - PDF Builder")
@@ -650,21 +998,26 @@ def main():
     # Create output directory
     OUTPUT_DIR.mkdir(exist_ok=True)
 
-    # Build both versions
-    ar_pdf = build_book("ar")
-    en_pdf = build_book("en")
+    languages = ["ar", "en"] if args.lang == "both" else [args.lang]
+
+    # The editions share nothing, so they build side by side; a fresh process per
+    # edition keeps each one's peak RSS separate
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=len(languages), max_tasks_per_child=1) as executor:
+        futures = {lang: executor.submit(timed_build, lang, args.jobs, args.cache, args.profile)
+                   for lang in languages}
+        results = {lang: future.result() for lang, future in futures.items()}
+    total = time.perf_counter() - started
 
     print("\n" + "=" * 60)
     print("PDF GENERATION COMPLETE")
     print("=" * 60)
-    print(f"\nArabic PDF: {ar_pdf}")
-    print(f"English PDF: {en_pdf}")
-
-    # Show file sizes
-    ar_size = ar_pdf.stat().st_size / (1024 * 1024)
-    en_size = en_pdf.stat().st_size / (1024 * 1024)
-    print(f"\nArabic: {ar_size:.1f} MB")
-    print(f"English: {en_size:.1f} MB")
+    for lang, (pdf, seconds, peak) in results.items():
+        lang_name = "Arabic" if lang == "ar" else "English"
+        size = pdf.stat().st_size / (1024 * 1024)
+        print(f"\n{lang_name} PDF: {pdf}")
+        print(f"  {size:.1f} MB, built in {seconds:.1f}s, peak RSS {peak:.0f} MB")
+    print(f"\nTotal wall time: {total:.1f}s")
 
 
 if __name__ == "__main__":
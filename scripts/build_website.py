@@ -5,16 +5,22 @@ Build a static website from the book chapters with proper disclaimers.
 
 import os
 import re
+import shutil
 import markdown
 from pathlib import Path
 from datetime import datetime
 
+from illustration_assets import (WEB_MIME, caption, get_illustrations_for_chapter, localized, plan_items_by_path,
+                                 prepare, web_derivatives)
+
 # Directories
 BASE_DIR = Path(__file__).parent.parent
 CHAPTERS_AR = BASE_DIR / "chapters_ar"
 CHAPTERS_EN = BASE_DIR / "chapters_en"
 ILLUSTRATIONS = BASE_DIR / "illustrations"
 WEBSITE_DIR = BASE_DIR / "website"
+IMAGES_DIR = WEBSITE_DIR / "images"
+IMAGE_SIZES = "(max-width: 860px) 100vw, 860px"
 
 # Chapter order
 CHAPTER_ORDER = [
@@ -410,6 +416,22 @@ nav a.active {
     box-shadow: var(--shadow-lg);
 }
 
+.content figure {
+    margin: 1.5rem 0;
+    text-align: center;
+}
+
+.content figure img {
+    height: auto;
+    margin-bottom: 0.5rem;
+}
+
+.content figcaption {
+    color: var(--text-light);
+    font-size: 0.9rem;
+    font-style: italic;
+}
+
 .content strong {
     color: var(--text);
     font-weight: 600;
@@ -551,6 +573,44 @@ def process_chapter(content):
     md = markdown.Markdown(extensions=['tables', 'fenced_code'])
     return md.convert(content)
 
+def publish_image(path, published):
+    """Copy a derivative into the website and add it to published; returns its URL relative to a chapter page."""
+    target = IMAGES_DIR / path.parent.name / path.name
+    if not target.exists():
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(path, target)
+    published.add(target)
+    return f"../images/{path.parent.name}/{path.name}"
+
+def prune_images(published):
+    """Delete the images in website/images that no page uses any more; returns how many were removed.
+
+    Derivatives are named by the hash of their source image, so a replaced
+    or dropped illustration leaves its old files behind until pruned.
+    """
+    if not IMAGES_DIR.exists():
+        return 0
+    removed = 0
+    for path in IMAGES_DIR.rglob("*"):
+        if path.is_file() and path not in published:
+            path.unlink()
+            removed += 1
+    for directory in IMAGES_DIR.iterdir():
+        if directory.is_dir() and not any(directory.iterdir()):
+            directory.rmdir()
+    return removed
+
+def create_figure_html(derivatives, caption, published):
+    """<picture> with AVIF/WebP sources at several widths and a JPEG fallback."""
+    srcsets = {fmt: ", ".join(f"{publish_image(path, published)} {width}w" for width, path in versions)
+               for fmt, versions in derivatives.items()}
+    sources = "".join(f'<source type="{WEB_MIME[fmt]}" srcset="{srcset}" sizes="{IMAGE_SIZES}">'
+                      for fmt, srcset in srcsets.items() if fmt != "jpeg")
+    fallback = publish_image(derivatives["jpeg"][-1][1], published)
+    img = (f'<img src="{fallback}" srcset="{srcsets["jpeg"]}" sizes="{IMAGE_SIZES}" alt="{caption}" '
+           f'loading="lazy" decoding="async">')
+    return f'<figure><picture>{sources}{img}</picture><figcaption>{caption}</figcaption></figure>'
+
 def create_page(chapter_id, content, lang, chapters):
     """Create a full HTML page."""
 
@@ -623,8 +683,14 @@ def build_website():
     (WEBSITE_DIR / "ar").mkdir(parents=True, exist_ok=True)
     (WEBSITE_DIR / "en").mkdir(parents=True, exist_ok=True)
 
+    items = plan_items_by_path()
+    figure_paths = [path for ch_id, _, _ in CHAPTER_ORDER for path in get_illustrations_for_chapter(ch_id)[:2]]
+    published = set()
+
     for lang in ["ar", "en"]:
         print(f"\nBuilding {lang.upper()} pages...")
+        # This edition's figures as web derivatives, made in parallel and cached by image hash
+        figures = prepare(figure_paths, lambda path: web_derivatives(localized(path, lang, items)))
         chapters_dir = CHAPTERS_AR if lang == "ar" else CHAPTERS_EN
         output_dir = WEBSITE_DIR / lang
 
@@ -633,6 +699,9 @@ def build_website():
             if chapter_file.exists():
                 content = chapter_file.read_text(encoding='utf-8')
                 html_content = process_chapter(content)
+                for img_path in get_illustrations_for_chapter(ch_id)[:2]:  # Max 2 images per chapter, as in the PDF
+                    img_name = caption(img_path, lang, items.get(img_path.resolve()))
+                    html_content += create_figure_html(figures[img_path], img_name, published)
 
                 page = create_page(ch_id, html_content, lang, CHAPTER_ORDER)
 
@@ -721,6 +790,11 @@ def build_website():
 
     (WEBSITE_DIR / "index.html").write_text(main_index, encoding='utf-8')
 
+    # Only after both editions are written, so no page is left pointing at a removed image
+    removed = prune_images(published)
+    if removed:
+        print(f"\nRemoved {removed} images no page uses any more")
+
     print("\n" + "=" * 60)
     print("WEBSITE BUILD COMPLETE")
     print("=" * 60)
@@ -0,0 +1,228 @@
+"""
+Local completeness check for generated chapters.
+Parses a chapter's markdown heading tree, matches it against the sections
+listed in BOOK_STRUCTURE and flags sections that are missing or cut short,
+so only those need generating again. A section whose heading was reworded
+past recognition is reported as renamed, not missing, so it is never
+written a second time. Runs without any network calls.
+"""
+
+import re
+
+from extractive_summary import clean_inline, terms
+
+MATCH_THRESHOLD = 0.6         # share of a section title's terms a heading must contain
+MIN_SECTION_FRACTION = 0.2    # sections under this share of their word budget are truncated
+MIN_CHAPTER_FRACTION = 0.6    # chapters under this share of word_target are reported as short
+
+HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+PARENTHETICAL = re.compile(r"\s*\([^)]*\)")
+SENTENCE_END = re.compile(r"[.!?؟:;؛)\]\"'»”*|`>]$")
+
+
+def parse_headings(content):
+    """Return (line index, level, text) for every markdown heading outside code blocks."""
+    headings = []
+    in_code = False
+    for i, line in enumerate(content.splitlines()):
+        if line.lstrip().startswith("```"):
+            in_code = not in_code
+            continue
+        match = None if in_code else HEADING.match(line)
+        if match:
+            headings.append((i, len(match.group(1)), clean_inline(match.group(2))))
+    return headings
+
+
+def title_variants(title, lang):
+    """Term sets a heading may match for a section title.
+
+    The model often rewords a parenthetical like "(Complete List)" or the
+    part after a colon, so the title without them counts too.
+    """
+    variants = []
+    for variant in (title, PARENTHETICAL.sub("", title), title.partition(":")[0]):
+        wanted = set(terms(variant, lang))
+        if wanted and wanted not in variants:
+            variants.append(wanted)
+    return variants
+
+
+def heading_score(heading_terms, variants):
+    """Best share of a title variant's terms found in a heading (0 to 1)."""
+    return max((len(wanted & heading_terms) / len(wanted) for wanted in variants), default=0.0)
+
+
+def ends_abruptly(text):
+    """True if text stops mid-sentence, like a response cut off by the token limit."""
+    lines = [line.strip() for line in text.strip().splitlines() if line.strip()]
+    if not lines:
+        return True
+    last = lines[-1]
+    if last.startswith(("|", "#", ">", "```")) or re.match(r"^(?:[-*+]|\d+[.)])\s", last):
+        return False
+    return not SENTENCE_END.search(last)
+
+
+def check_chapter(content, sections, word_target, lang):
+    """Compare a chapter with its spec.
+
+    Returns a report dict: total "words", "word_target", "short", whether the
+    text is "cut_off" mid-sentence, and one entry
+    per spec section with its "status" ("ok", "renamed", "missing" or
+    "truncated"), the matched "heading" and "level", its "words" and the
+    [start, end) line span. Headings are matched to section titles by shared
+    terms, so numbering, emphasis and added subtitles do not matter. A
+    section no heading matches, with an unmatched heading at the section
+    level in its place between its neighbours, is "renamed" to that heading.
+
+    >>> chapter = "\\n".join(["# Data", "## Consent basics", "Ask first.",
+    ...                       "## Life without consent", "Other grounds.", "## Privacy notices", "Tell users."])
+    >>> report = check_chapter(chapter, ["Consent basics", "When consent is not needed", "Privacy notices"], 6, "en")
+    >>> [(s["status"], s["heading"]) for s in report["sections"]]
+    [('ok', 'Consent basics'), ('renamed', 'Life without consent'), ('ok', 'Privacy notices')]
+    >>> needs_repair(report)
+    []
+    """
+    lines = content.splitlines()
+    # The chapter title is the first level-1 heading; sections live below it
+    title_line = first_title_line(content)
+    headings = [h for h in parse_headings(content) if h[0] != title_line]
+    budget = word_target / max(1, len(sections))
+    words = len(content.split())
+
+    report = {"words": words, "word_target": word_target,
+              "short": words < word_target * MIN_CHAPTER_FRACTION,
+              "cut_off": ends_abruptly(content), "sections": []}
+
+    # Best matches are taken first, so a reordered or renamed section still
+    # finds its heading; each heading serves one section at most
+    heading_terms = [set(terms(text, lang)) for _, _, text in headings]
+    candidates = []
+    for index, title in enumerate(sections):
+        variants = title_variants(title, lang)
+        for k, (_, level, _) in enumerate(headings):
+            score = heading_score(heading_terms[k], variants)
+            if score >= MATCH_THRESHOLD:
+                candidates.append((-score, level, abs(k - index), index, k))
+    matches = {}
+    used = set()
+    for _, _, _, index, k in sorted(candidates):
+        if index not in matches and k not in used:
+            matches[index] = k
+            used.add(k)
+
+    # An unmatched heading at the section level between a missing section's
+    # neighbours is that section under a reworded title. Headings repeating a
+    # matched one are duplicates, not renames
+    level = min((headings[k][1] for k in used), default=2)
+    matched_text = {headings[k][2] for k in used}
+    spare = [k for k, (_, heading_level, text) in enumerate(headings)
+             if k not in used and heading_level == level and text not in matched_text]
+    renamed = set()
+    for index in range(len(sections)):
+        if index in matches:
+            continue
+        before = max((k for i, k in matches.items() if i < index), default=-1)
+        after = min((k for i, k in matches.items() if i > index), default=len(headings))
+        k = next((k for k in spare if before < k < after and k not in used), None)
+        if k is not None:
+            matches[index] = k
+            used.add(k)
+            renamed.add(index)
+
+    for index, title in enumerate(sections):
+        entry = {"index": index, "title": title, "status": "missing", "heading": None,
+                 "level": None, "words": 0, "start": None, "end": None}
+        if index in matches:
+            k = matches[index]
+            start, level, text = headings[k]
+            end = next((h[0] for h in headings[k + 1:] if h[1] <= level), len(lines))
+            body = "\n".join(lines[start + 1:end])
+            section_words = len(body.split())
+            cut_off = end == len(lines) and ends_abruptly(body)
+            truncated = section_words < budget * MIN_SECTION_FRACTION or cut_off
+            entry.update(heading=text, level=level, words=section_words, start=start, end=end,
+                         status="truncated" if truncated else "renamed" if index in renamed else "ok")
+        report["sections"].append(entry)
+    return report
+
+
+def first_title_line(content):
+    """Line index of the chapter's level-1 title, or None."""
+    return next((i for i, level, _ in parse_headings(content) if level == 1), None)
+
+
+def needs_repair(report):
+    """Spec sections that are missing or truncated; renamed sections are kept as they are."""
+    return [s for s in report["sections"] if s["status"] in ("missing", "truncated")]
+
+
+def section_level(report):
+    """Heading level the chapter uses for its sections (2 unless it shows otherwise)."""
+    levels = [s["level"] for s in report["sections"] if s["level"]]
+    return min(levels) if levels else 2
+
+
+def splice_sections(content, report, replacements):
+    """Put regenerated sections into a chapter.
+
+    replacements maps a section index to its new markdown, which must start
+    with its heading. A truncated section is replaced in place; a missing one
+    goes straight after the previous spec section found in the chapter (or
+    before the first one), so the spec order is kept. Renamed sections count
+    as found and are never inserted again.
+    """
+    lines = content.splitlines()
+    sections = report["sections"]
+    inserts = {}                 # line index -> texts to insert before it
+    replaced = {}                # start line -> (end line, text)
+    # Missing sections before the first one found go in front of it; with none found, at the end
+    anchor = next((s["start"] for s in sections if s["start"] is not None), len(lines))
+
+    for entry in sections:
+        text = replacements.get(entry["index"])
+        if entry["status"] == "missing":
+            if text is not None:
+                inserts.setdefault(anchor, []).append(text)
+            continue
+        if entry["status"] == "truncated" and text is not None:
+            replaced[entry["start"]] = (entry["end"], text)
+        anchor = entry["end"]
+
+    output = []
+    i = 0
+    while i <= len(lines):
+        for text in inserts.get(i, []):
+            if output and output[-1].strip():
+                output.append("")
+            output.extend(text.strip().splitlines())
+            output.append("")
+        if i == len(lines):
+            break
+        if i in replaced:
+            end, text = replaced[i]
+            output.extend(text.strip().splitlines())
+            output.append("")
+            i = end
+            continue
+        output.append(lines[i])
+        i += 1
+    return "\n".join(output).rstrip() + "\n"
+
+
+def describe(report):
+    """One line per problem found, for logs."""
+    problems = []
+    if report["short"]:
+        problems.append(f"{report['words']} of {report['word_target']} target words")
+    if report["cut_off"]:
+        problems.append("text ends mid-sentence")
+    for entry in report["sections"]:
+        if entry["status"] == "missing":
+            problems.append(f"section {entry['index'] + 1} missing: {entry['title']}")
+        elif entry["status"] == "renamed":
+            problems.append(f"section {entry['index'] + 1} renamed to \"{entry['heading']}\": {entry['title']}")
+        elif entry["status"] == "truncated":
+            problems.append(f"section {entry['index'] + 1} truncated ({entry['words']} words): {entry['title']}")
+    return problems
@@ -0,0 +1,17 @@
+"""
+Console output shared by the book pipelines.
+Both languages, and several chapters within each, run in threads at once,
+so every module prints through log() to keep their lines from interleaving.
+"""
+
+import threading
+
+# Serialises console output from concurrent language pipelines
+PRINT_LOCK = threading.Lock()
+
+
+def log(lang, message=""):
+    """Print a language-tagged message; safe to call from several threads."""
+    with PRINT_LOCK:
+        for line in message.split("\n"):
+            print(f"[{lang.upper()}] {line}" if line else "", flush=True)
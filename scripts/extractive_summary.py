@@ -0,0 +1,135 @@
+"""
+Local extractive summarizer for chapter context.
+Scores sentences by TF-IDF, boosts terms from the chapter's headings and the
+lead sentence of each section, and returns the best few in reading order.
+Works on Arabic and English markdown without any network calls.
+"""
+
+import re
+import math
+from collections import Counter
+
+DEFAULT_SENTENCES = 4
+MIN_SENTENCE_WORDS = 6
+MAX_SENTENCE_WORDS = 60
+HEADING_TERM_WEIGHT = 2.0     # multiplier for terms that also appear in headings
+LEAD_SENTENCE_BONUS = 1.3     # multiplier for the first sentence under a heading
+
+STOPWORDS_EN = set("""
+a an and are as at be been but by can do does for from has have how if in into is it its
+may more must not of on or our should so such than that the their them then there these
+they this those to under up us was we what when where which while who will with within
+without would you your also any all each other only one can't don't it's
+""".split())
+
+STOPWORDS_AR = set("""
+في من على إلى الى عن مع أن ان إن لا ما هذا هذه ذلك تلك التي الذي الذين كان كانت يكون
+تكون هو هي هم هن نحن أو او ثم قد لم لن كل بعض أي اي حتى عند بين كما أيضا ايضا إذا اذا
+هل لكن بل غير منذ خلال حول ضمن بعد قبل لدى لها له لهم به بها فيها فيه عليه عليها وهو وهي
+""".split())
+
+ARABIC_DIACRITICS = re.compile(r"[\u064B-\u0652\u0670\u0640]")
+SENTENCE_END = re.compile(r"(?<=[.!?؟])\s+")
+WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize(word):
+    """Lower-case a word and fold Arabic letter variants so matching ignores spelling noise."""
+    word = ARABIC_DIACRITICS.sub("", word.lower())
+    word = re.sub("[أإآ]", "ا", word)
+    word = word.replace("ى", "ي").replace("ة", "ه")
+    # Strip the definite article so "البيانات" matches "بيانات"
+    if word.startswith("ال") and len(word) > 4:
+        word = word[2:]
+    return word
+
+
+STOPWORDS_NORMALIZED = {
+    "ar": {normalize(w) for w in STOPWORDS_AR},
+    "en": {normalize(w) for w in STOPWORDS_EN},
+}
+
+
+def terms(text, lang):
+    """Content terms of a piece of text, with stopwords removed."""
+    stopwords = STOPWORDS_AR if lang == "ar" else STOPWORDS_EN
+    stopwords_normalized = STOPWORDS_NORMALIZED["ar" if lang == "ar" else "en"]
+    result = []
+    for word in WORD.findall(text):
+        if word.isdigit() or word in stopwords:
+            continue
+        word = normalize(word)
+        if len(word) > 1 and word not in stopwords_normalized:
+            result.append(word)
+    return result
+
+
+LIST_ITEM = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+")
+
+
+def clean_inline(text):
+    """Strip inline markdown (emphasis, links, code ticks, quote markers)."""
+    text = re.sub(r"!?\[([^\]]*)\]\([^)]*\)", r"\1", text)
+    text = re.sub(r"[*_`]+", "", text)
+    text = re.sub(r"^\s*>\s*", "", text)
+    return " ".join(text.split())
+
+
+def split_markdown(content):
+    """Split chapter markdown into (headings, sentences) where each sentence is (text, is_lead).
+
+    Only running prose is kept: tables, code and list items rarely make good
+    summary sentences.
+    """
+    content = re.sub(r"```.*?```", "", content, flags=re.DOTALL)
+    headings = []
+    sentences = []
+    lead_pending = True
+    for block in re.split(r"\n\s*\n", content):
+        lines = [line for line in block.strip().splitlines()
+                 if not line.lstrip().startswith("|") and not LIST_ITEM.match(line)]
+        if not lines:
+            continue
+        if lines[0].startswith("#"):
+            headings.append(clean_inline(lines[0].lstrip("#")))
+            lines = lines[1:]
+            lead_pending = True
+        paragraph = clean_inline(" ".join(clean_inline(line) for line in lines))
+        for sentence in SENTENCE_END.split(paragraph):
+            if MIN_SENTENCE_WORDS <= len(sentence.split()) <= MAX_SENTENCE_WORDS:
+                sentences.append((sentence, lead_pending))
+                lead_pending = False
+    return headings, sentences
+
+
+def summarize(content, lang, max_sentences=DEFAULT_SENTENCES):
+    """Pick the most representative sentences of a chapter, in their original order."""
+    headings, sentences = split_markdown(content)
+    if not sentences:
+        return ""
+
+    sentence_terms = [terms(text, lang) for text, _ in sentences]
+    document_frequency = Counter(term for ts in sentence_terms for term in set(ts))
+    heading_terms = {term for heading in headings for term in terms(heading, lang)}
+    count = len(sentences)
+
+    scores = []
+    for (text, is_lead), ts in zip(sentences, sentence_terms):
+        if not ts:
+            scores.append(0.0)
+            continue
+        frequency = Counter(ts)
+        score = 0.0
+        for term, tf in frequency.items():
+            weight = tf * math.log(1 + count / document_frequency[term])
+            if term in heading_terms:
+                weight *= HEADING_TERM_WEIGHT
+            score += weight
+        # Normalise by length so long sentences do not win on size alone
+        score /= math.sqrt(len(ts))
+        if is_lead:
+            score *= LEAD_SENTENCE_BONUS
+        scores.append(score)
+
+    best = sorted(range(count), key=lambda i: scores[i], reverse=True)[:max_sentences]
+    return " ".join(sentences[i][0] for i in sorted(best))
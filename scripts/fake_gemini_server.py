@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Gemini generateContent API, for exercising the
+scheduler without quota or network. Injects 429s and latency on demand.
+Also answers OpenAI-style /v1/chat/completions for the openai backend, and
+keeps cachedContents in memory so prefix caching can be exercised.
+
+Usage:
+    python scripts/fake_gemini_server.py --port 8765 --throttle-rate 0.3 --latency 2
+    GEMINI_API_KEY=fake GEMINI_BASE_URL=http://127.0.0.1:8765 python scripts/write_book.py --no-cache
+    python scripts/write_book.py --no-cache --backend openai --base-url http://127.0.0.1:8765/v1
+"""
+
+import re
+import json
+import time
+import random
+import base64
+import signal
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 1x1 white PNG returned for image models
+PLACEHOLDER_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAADElEQVR4nGP4//8/AAX+Av4N70a4AAAAAElFTkSuQmCC"
+)
+
+ROUTE = re.compile(r"^/[^/]+/models/([^:/]+):(generateContent|streamGenerateContent)")
+OPENAI_ROUTE = re.compile(r"/chat/completions$")
+CACHE_ROUTE = re.compile(r"^/[^/]+/cachedContents(?:/([^/?]+))?")
+
+
+class FakeGemini(BaseHTTPRequestHandler):
+    """Answers generateContent / streamGenerateContent with synthetic text."""
+
+    options = None
+    stats = {"requests": 0, "throttled": 0, "max_in_flight": 0, "caches_created": 0, "cached_calls": 0}
+    in_flight = 0
+    caches = {}                  # name -> cached prefix tokens
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        if self.options.verbose:
+            super().log_message(format, *args)
+
+    def do_DELETE(self):
+        match = CACHE_ROUTE.match(self.path)
+        if not match or self.caches.pop(f"cachedContents/{match.group(1)}", None) is None:
+            self.send_error(404)
+            return
+        self.send_json(200, {})
+
+    def create_cache(self, body):
+        """Store a cachedContents entry; only its size matters to the fake."""
+        text = "".join(part.get("text", "") for part in (body.get("systemInstruction") or {}).get("parts", []))
+        text += "".join(part.get("text", "") for content in body.get("contents", [])
+                        for part in content.get("parts", []))
+        ttl = float(body.get("ttl", "3600s").rstrip("s"))
+        with self.lock:
+            self.stats["caches_created"] += 1
+            name = f"cachedContents/fake{self.stats['caches_created']}"
+            self.caches[name] = len(text) // 4
+        expires = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + ttl))
+        self.send_json(200, {"name": name, "model": body.get("model"), "displayName": body.get("displayName"),
+                             "expireTime": expires, "usageMetadata": {"totalTokenCount": self.caches[name]}})
+
+    def do_POST(self):
+        match = ROUTE.match(self.path)
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if CACHE_ROUTE.match(self.path):
+            self.create_cache(body)
+            return
+        cached_tokens = 0
+        if body.get("cachedContent"):
+            if body["cachedContent"] not in self.caches:
+                self.send_json(404, {"error": {"code": 404, "message": "CachedContent not found (fake).",
+                                               "status": "NOT_FOUND"}})
+                return
+            cached_tokens = self.caches[body["cachedContent"]]
+            with self.lock:
+                self.stats["cached_calls"] += 1
+        if match:
+            model, method = match.groups()
+            prompt = "".join(
+                part.get("text", "")
+                for content in body.get("contents", [])
+                for part in content.get("parts", [])
+            )
+        elif OPENAI_ROUTE.search(self.path):
+            model, method = body.get("model", ""), "chat.stream" if body.get("stream") else "chat"
+            prompt = "".join(message.get("content", "") for message in body.get("messages", []))
+        else:
+            self.send_error(404)
+            return
+
+        with self.lock:
+            self.stats["requests"] += 1
+            FakeGemini.in_flight += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], FakeGemini.in_flight)
+            throttled = random.random() < self.options.throttle_rate
+            if throttled:
+                self.stats["throttled"] += 1
+
+        try:
+            if throttled:
+                self.send_json(429, {"error": {
+                    "code": 429,
+                    "message": "Resource has been exhausted (fake).",
+                    "status": "RESOURCE_EXHAUSTED",
+                    "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo",
+                                 "retryDelay": f"{self.options.retry_delay}s"}],
+                }})
+                return
+
+            time.sleep(random.expovariate(1 / self.options.latency) if self.options.latency else 0)
+            if method == "streamGenerateContent":
+                self.stream(model, prompt, cached_tokens)
+            elif method.startswith("chat"):
+                self.chat(prompt, stream=method == "chat.stream")
+            else:
+                self.send_json(200, self.response(model, prompt, self.fake_text(), cached_tokens=cached_tokens))
+        finally:
+            with self.lock:
+                FakeGemini.in_flight -= 1
+
+    def fake_text(self):
+        words = [f"word{random.randint(0, 9999)}" for _ in range(self.options.words)]
+        paragraphs = [" ".join(words[i:i + 40]) + "." for i in range(0, len(words), 40)]
+        return "# Fake Chapter\n\n" + "\n\n".join(paragraphs)
+
+    def response(self, model, prompt, text, final=True, cached_tokens=0):
+        if "image" in model:
+            parts = [{"inlineData": {"mimeType": "image/png",
+                                     "data": base64.b64encode(PLACEHOLDER_PNG).decode()}}]
+        else:
+            parts = [{"text": text}]
+        candidate = {"content": {"role": "model", "parts": parts}}
+        if final:
+            candidate["finishReason"] = "STOP"
+        usage = {
+            "promptTokenCount": len(prompt) // 4 + cached_tokens,
+            "candidatesTokenCount": len(text) // 4,
+            "totalTokenCount": (len(prompt) + len(text)) // 4 + cached_tokens,
+        }
+        if cached_tokens:
+            usage["cachedContentTokenCount"] = cached_tokens
+        return {"candidates": [candidate], "usageMetadata": usage}
+
+    def stream(self, model, prompt, cached_tokens=0):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        text = self.fake_text()
+        pieces = [text[i:i + 200] for i in range(0, len(text), 200)]
+        for i, piece in enumerate(pieces):
+            chunk = self.response(model, prompt, piece, final=i == len(pieces) - 1, cached_tokens=cached_tokens)
+            self.wfile.write(f"data: {json.dumps(chunk)}\r\n\r\n".encode())
+            self.wfile.flush()
+            time.sleep(self.options.chunk_delay)
+
+    def chat(self, prompt, stream):
+        """Answer an OpenAI-style chat completion, streamed as SSE if asked."""
+        text = self.fake_text()
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4,
+                 "total_tokens": (len(prompt) + len(text)) // 4}
+        if not stream:
+            self.send_json(200, {"choices": [{"index": 0, "finish_reason": "stop",
+                                              "message": {"role": "assistant", "content": text}}],
+                                 "usage": usage})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        pieces = [text[i:i + 200] for i in range(0, len(text), 200)]
+        events = [{"choices": [{"index": 0, "delta": {"content": piece},
+                                "finish_reason": "stop" if i == len(pieces) - 1 else None}]}
+                  for i, piece in enumerate(pieces)]
+        events.append({"choices": [], "usage": usage})
+        for event in events:
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(self.options.chunk_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Gemini API server for scheduler testing")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--throttle-rate", type=float, default=0.2,
+                        help="Fraction of requests answered with 429 (default: 0.2)")
+    parser.add_argument("--retry-delay", type=float, default=1.0,
+                        help="retryDelay advertised on 429 responses, in seconds (default: 1)")
+    parser.add_argument("--latency", type=float, default=0.5,
+                        help="Mean latency before the first byte, exponentially distributed (default: 0.5)")
+    parser.add_argument("--chunk-delay", type=float, default=0.01,
+                        help="Delay between streamed chunks (default: 0.01)")
+    parser.add_argument("--words", type=int, default=400,
+                        help="Words per generated response (default: 400)")
+    parser.add_argument("--verbose", action="store_true")
+    FakeGemini.options = parser.parse_args()
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+    server = ThreadingHTTPServer(("127.0.0.1", FakeGemini.options.port), FakeGemini)
+    print(f"Fake Gemini listening on http://127.0.0.1:{FakeGemini.options.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"\nStats: {json.dumps(FakeGemini.stats)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,27 +7,36 @@ AI decides what illustrations are needed and generates them.
 import os
 import json
 import base64
+import struct
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from datetime import datetime
 
-from google import genai
-from google.genai import types
+import httpx
+from google.genai import errors, types
+
+from backends import BackendError
+from console import log
+from model_client import CacheMiss, add_client_arguments, get_client
+from rate_limiter import DeadlineExceeded
+from ledger import call_context
+from illustration_assets import MANIFEST_FILE, PLAN_FILE, localized, make_derivatives, plan_key
 
 # Configuration
 BOOK_SPEC_PATH = Path(__file__).parent.parent / "book-project-spec.md"
 ILLUSTRATIONS_DIR = Path(__file__).parent.parent / "illustrations"
-PLAN_FILE = ILLUSTRATIONS_DIR / "illustration_plan.json"
+DEFAULT_WORKERS = 4
+LABEL_MODEL = "gemini-3-flash-preview"   # reads the English labels off finished images
+
+# Ways a label lookup can fail that are recorded in the manifest and retried on the next run:
+# provider and backend errors, a call that ran out of time or retries, and a reply that is not a label list
+LABEL_ERRORS = (errors.APIError, BackendError, CacheMiss, DeadlineExceeded, httpx.HTTPError, ValueError)
 
 # Ensure output directory exists
 ILLUSTRATIONS_DIR.mkdir(exist_ok=True)
 
-def get_client():
-    """Initialize Gemini client with API key from environment."""
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY environment variable not set")
-    return genai.Client(api_key=api_key)
-
 def read_book_spec():
     """Read the book specification file."""
     with open(BOOK_SPEC_PATH, "r", encoding="utf-8") as f:
@@ -39,7 +48,9 @@ def generate_illustration_plan(client, book_spec):
     planning_prompt = """You are an expert book illustrator. Create exactly 20 illustrations for a book about Saudi tech regulations.
 
 Return a JSON array with this exact structure for each item:
-{"chapter": "ch01", "type": "flowchart", "title_en": "Title", "title_ar": "عنوان", "description": "What it shows", "prompt": "Image generation prompt"}
+{"chapter": "ch01", "type": "flowchart", "title_en": "Title", "title_ar": "عنوان", "description": "What it shows", "prompt": "Image generation prompt", "labels": [{"en": "Label", "ar": "تسمية"}]}
+
+"labels" lists every short text label the image shows (box names, steps, axis names), in English with its Arabic translation. The prompt must use exactly these English labels.
 
 Types: diagram, flowchart, comparison_table, infographic
 Chapters: ch01-ch14, appendix_a, appendix_b
@@ -68,7 +79,7 @@ Cover these topics:
 
 Return ONLY valid JSON array, no markdown, no explanation."""
 
-    response = client.models.generate_content(
+    response = client.generate_content(
         model="gemini-3-flash-preview",
         contents=[planning_prompt],
         config=types.GenerateContentConfig(
@@ -119,6 +130,9 @@ Return ONLY valid JSON array, no markdown, no explanation."""
 def generate_single_illustration(client, illustration_info, index):
     """Generate a single illustration using Gemini image model."""
 
+    labels = ", ".join(label["en"] for label in illustration_info.get("labels", []))
+    labels = f"Labels (use exactly these words): {labels}\n" if labels else ""
+
     # Create optimized prompt for professional book illustration
     image_prompt = f"""Create a professional, clean illustration for a business/legal book.
 Style: Modern, minimalist, professional infographic style suitable for print.
@@ -131,28 +145,65 @@ Illustration request:
 
 Title: {illustration_info['title_en']}
 Type: {illustration_info['type']}
-
+{labels}
 Important: This is for a professional book about Saudi Arabian tech regulations. Keep it clean, corporate, and informative."""
 
-    try:
-        response = client.models.generate_content(
-            model="gemini-3-pro-image-preview",
-            contents=[image_prompt],
-            config=types.GenerateContentConfig(
-                response_modalities=['IMAGE', 'TEXT']
-            )
+    response = client.generate_content(
+        model="gemini-3-pro-image-preview",
+        contents=[image_prompt],
+        config=types.GenerateContentConfig(
+            response_modalities=['IMAGE', 'TEXT']
         )
+    )
 
-        # Extract image from response
-        for part in response.candidates[0].content.parts:
-            if hasattr(part, 'inline_data') and part.inline_data:
-                return part.inline_data.data, part.inline_data.mime_type
-
-        return None, None
-
-    except Exception as e:
-        print(f"  Error generating illustration: {e}")
-        return None, None
+    # Extract image from response
+    for part in response.candidates[0].content.parts:
+        if hasattr(part, 'inline_data') and part.inline_data:
+            return part.inline_data.data, part.inline_data.mime_type
+
+    return None, None
+
+def valid_labels(labels):
+    """The well-formed entries of a label list from the model, with positions clamped to the image."""
+    valid = []
+    for label in labels if isinstance(labels, list) else []:
+        try:
+            text = str(label["text"]).strip()
+            box = {k: min(1.0, max(0.0, float(label.get(k, 0) if k in "wh" else label[k]))) for k in "xywh"}
+        except (AttributeError, KeyError, TypeError, ValueError):
+            continue
+        if text:
+            valid.append({"en": str(label.get("en", "")), "text": text, **box})
+    return valid
+
+def locate_labels(client, path, mime_type, illustration_info):
+    """Arabic labels for the English text in a finished image, placed where that text is.
+
+    Returns a list of {"en", "text", "x", "y", "w", "h"}: the English label,
+    its Arabic translation, and the label's centre and size as shares of
+    the image width and height. Translations from the plan item's labels are
+    used where they match.
+    """
+    known = "\n".join(f"- {label['en']} = {label['ar']}" for label in illustration_info.get("labels", []))
+    known = f"Use these translations where a label matches:\n{known}\n" if known else ""
+    prompt = f"""This illustration is for the Arabic edition of a book about Saudi tech regulations.
+List every English text label in the image except its title.
+For each, return {{"en": "label as written", "text": "Arabic translation", "x": 0.5, "y": 0.5, "w": 0.2, "h": 0.05}},
+where x and y are the centre of the label and w and h its width and height, as shares of the image width and height (0 to 1).
+{known}
+Return ONLY a valid JSON array, no markdown, no explanation."""
+
+    response = client.generate_content(
+        model=LABEL_MODEL,
+        contents=[types.Part.from_bytes(data=Path(path).read_bytes(), mime_type=mime_type), prompt],
+        config=types.GenerateContentConfig(
+            temperature=0,
+            response_mime_type="application/json",
+        )
+    )
+    if not response.text:
+        raise ValueError("the response contained no text")
+    return valid_labels(json.loads(response.text))
 
 def save_illustration(image_data, mime_type, illustration_info, index):
     """Save the generated illustration to disk."""
@@ -171,18 +222,192 @@ def save_illustration(image_data, mime_type, illustration_info, index):
     filepath = chapter_dir / filename
 
     # Save image
-    with open(filepath, "wb") as f:
+    tmp_file = filepath.with_suffix(f".{ext}.tmp")
+    with open(tmp_file, "wb") as f:
         f.write(image_data)
+    os.replace(tmp_file, filepath)
 
     return filepath
 
+def legacy_illustration(illustration_info):
+    """File generated for this plan item before the manifest existed, found by title, or None."""
+    chapter_dir = ILLUSTRATIONS_DIR / illustration_info.get("chapter", "misc")
+    safe_title = illustration_info['title_en'].lower().replace(" ", "_")[:30]
+    existing = sorted(chapter_dir.glob(f"*{safe_title}*")) if chapter_dir.exists() else []
+    return existing[0] if existing else None
+
+def image_size(data):
+    """(width, height) of PNG or JPEG bytes read from the header, or (None, None)."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:2] == b"\xff\xd8":
+        i = 2
+        while i + 9 < len(data) and data[i] == 0xFF:
+            marker = data[i + 1]
+            length = struct.unpack(">H", data[i + 2:i + 4])[0]
+            # Start-of-frame markers carry the dimensions (C4, C8 and CC are not frames)
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack(">HH", data[i + 5:i + 9])
+                return width, height
+            i += 2 + length
+    return None, None
+
+class IllustrationManifest:
+    """Record of every plan item's image in illustrations/manifest.json, keyed by plan_key.
+
+    Each entry has the item's status ("done" or "failed"), path relative to
+    the illustrations directory, mime type, size in bytes, dimensions and,
+    for failures, the reason. Finished images also get labels_ar, the Arabic
+    labels located on them (see locate_labels), once that has succeeded;
+    until then labels_error holds why the last attempt failed. Updates are
+    merged into the file on disk and written atomically, so
+    concurrent generators do not lose each other's entries.
+    """
+
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self):
+        if not self.path.exists():
+            return {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def done(self, illustration_info):
+        """Path of this item's finished image, or None if it still has to be generated."""
+        entry = self.load().get(plan_key(illustration_info))
+        if entry and entry["status"] == "done":
+            path = ILLUSTRATIONS_DIR / entry["path"]
+            if path.exists():
+                return path
+        return None
+
+    def has_labels(self, illustration_info):
+        """Whether this item's Arabic labels have been located (an image without text has an empty list)."""
+        return "labels_ar" in self.load().get(plan_key(illustration_info), {})
+
+    def adopt(self, plan):
+        """Record images generated before the manifest existed, matched by title.
+
+        Runs only while there is no manifest file, so later edits to a plan
+        item change its key and get a new image.
+        """
+        if self.path.exists():
+            return 0
+        adopted = 0
+        for illustration_info in plan:
+            path = legacy_illustration(illustration_info)
+            if path:
+                mime_type = "image/png" if path.suffix == ".png" else "image/jpeg"
+                self.record(illustration_info, "done", path=path, mime_type=mime_type, data=path.read_bytes())
+                adopted += 1
+        return adopted
+
+    def record(self, illustration_info, status, path=None, mime_type=None, data=None, error=None, labels_ar=None,
+               labels_error=None):
+        """Store the outcome for a plan item and return its entry."""
+        width, height = image_size(data) if data else (None, None)
+        entry = {
+            "status": status,
+            "title_en": illustration_info['title_en'],
+            "chapter": illustration_info.get("chapter", "misc"),
+            "path": Path(path).relative_to(ILLUSTRATIONS_DIR).as_posix() if path else None,
+            "mime_type": mime_type,
+            "bytes": len(data) if data else None,
+            "width": width,
+            "height": height,
+            "error": error,
+            "updated": datetime.now().isoformat(timespec="seconds"),
+        }
+        if labels_ar is not None:
+            entry["labels_ar"] = labels_ar
+        if labels_error is not None:
+            entry["labels_error"] = labels_error
+        return self._write(illustration_info, lambda old: entry)
+
+    def add_labels(self, illustration_info, labels_ar, labels_error=None):
+        """Store the Arabic labels located on an item's finished image, or why that failed; returns its entry."""
+        if labels_ar is None:
+            return self._write(illustration_info, lambda old: {**old, "labels_error": labels_error})
+        return self._write(illustration_info, lambda old: {**old, "labels_ar": labels_ar, "labels_error": None})
+
+    def _write(self, illustration_info, update):
+        with self._lock:
+            manifest = self.load()
+            key = plan_key(illustration_info)
+            manifest[key] = entry = update(manifest.get(key, {}))
+            tmp_file = self.path.with_suffix(".json.tmp")
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, self.path)
+        return entry
+
+def place_labels(client, path, mime_type, illustration_info, index):
+    """Locate the Arabic labels for a finished image and make its Arabic variant.
+
+    Returns (labels, None), or (None, reason) if the labels could not be
+    located; the failure is logged, and the caller records it so the next
+    run tries again.
+    """
+    chapter = illustration_info.get("chapter", "misc")
+    labels_ar = error = None
+    try:
+        with call_context(item=f"{index:02d}_{chapter}", kind="labels"):
+            labels_ar = locate_labels(client, path, mime_type, illustration_info)
+    except LABEL_ERRORS as e:
+        error = f"{type(e).__name__}: {e}"
+        log("ar", f"[!] Could not place Arabic labels on {illustration_info['title_en']}: {error}")
+    # The Arabic variant and its derivatives are made now so the builders find them cached
+    make_derivatives(localized(path, "ar", {path.resolve(): {**illustration_info, "labels_ar": labels_ar or []}}))
+    return labels_ar, error
+
+def render_illustration(client, manifest, illustration_info, index):
+    """Generate one plan item and record it in the manifest; returns (status, path or reason).
+
+    Items the manifest already has are skipped, apart from placing their
+    Arabic labels if that has not succeeded yet ("labelled"). Failures,
+    including images that cannot be decoded into derivatives, are recorded
+    with their reason and tried again on the next run.
+    """
+    path = manifest.done(illustration_info)
+    if path:
+        if manifest.has_labels(illustration_info):
+            return "skipped", path
+        mime_type = "image/png" if path.suffix == ".png" else "image/jpeg"
+        labels_ar, labels_error = place_labels(client, path, mime_type, illustration_info, index)
+        manifest.add_labels(illustration_info, labels_ar, labels_error)
+        return ("skipped" if labels_ar is None else "labelled"), path
+    chapter = illustration_info.get("chapter", "misc")
+    try:
+        with call_context(item=f"{index:02d}_{chapter}", kind="illustration"):
+            image_data, mime_type = generate_single_illustration(client, illustration_info, index)
+        if not image_data:
+            raise RuntimeError("the response contained no image")
+        path = save_illustration(image_data, mime_type, illustration_info, index)
+        # The print and web derivatives are made now so the builders find them cached
+        make_derivatives(path)
+        labels_ar, labels_error = place_labels(client, path, mime_type, illustration_info, index)
+    except Exception as e:
+        manifest.record(illustration_info, "failed", error=str(e))
+        return "failed", str(e)
+    manifest.record(illustration_info, "done", path=path, mime_type=mime_type, data=image_data,
+                    labels_ar=labels_ar, labels_error=labels_error)
+    return "success", path
+
 def main():
     """Main automation flow."""
+    parser = argparse.ArgumentParser(description="Generate illustrations for the Saudi Tech Legal Compass book")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Number of illustrations to generate concurrently (default: {DEFAULT_WORKERS})")
+    add_client_arguments(parser)
+    args = parser.parse_args()
+
     print("=" * 60)
     print("Saudi Tech Legal Compass - Illustration Generator")
     print("=" * 60)
 
-    client = get_client()
+    client = get_client(args)
     book_spec = read_book_spec()
 
     # Step 1: Check for existing plan or generate new one
@@ -193,7 +418,8 @@ def main():
         print(f"Loaded plan with {len(plan)} illustrations")
     else:
         print("\nStep 1: AI is analyzing the book and planning illustrations...")
-        plan = generate_illustration_plan(client, book_spec)
+        with call_context(item="illustration_plan", kind="plan"):
+            plan = generate_illustration_plan(client, book_spec)
 
         # Save the plan
         with open(PLAN_FILE, "w", encoding="utf-8") as f:
@@ -202,35 +428,31 @@ def main():
         print(f"Plan saved to: {PLAN_FILE}")
 
     # Step 2: Generate illustrations
-    print(f"\nStep 2: Generating {len(plan)} illustrations...")
+    print(f"\nStep 2: Generating {len(plan)} illustrations with {args.workers} workers...")
     print("-" * 40)
 
+    manifest = IllustrationManifest()
+    adopted = manifest.adopt(plan)
+    if adopted:
+        print(f"Recorded {adopted} existing illustrations in {MANIFEST_FILE.name}")
     results = []
-    for i, illustration in enumerate(plan, 1):
-        print(f"\n[{i}/{len(plan)}] {illustration['title_en']}")
-        print(f"  Type: {illustration['type']}")
-        print(f"  Chapter: {illustration.get('chapter', 'N/A')}")
-
-        # Check if already generated
-        chapter = illustration.get("chapter", "misc")
-        safe_title = illustration['title_en'].lower().replace(" ", "_")[:30]
-        existing = list((ILLUSTRATIONS_DIR / chapter).glob(f"*{safe_title}*")) if (ILLUSTRATIONS_DIR / chapter).exists() else []
-
-        if existing:
-            print(f"  Skipping (already exists): {existing[0].name}")
-            results.append({"status": "skipped", "path": str(existing[0])})
-            continue
-
-        print("  Generating...")
-        image_data, mime_type = generate_single_illustration(client, illustration, i)
-
-        if image_data:
-            filepath = save_illustration(image_data, mime_type, illustration, i)
-            print(f"  Saved: {filepath}")
-            results.append({"status": "success", "path": str(filepath)})
-        else:
-            print("  Failed to generate")
-            results.append({"status": "failed", "illustration": illustration['title_en']})
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = {executor.submit(render_illustration, client, manifest, illustration, i): (i, illustration)
+                   for i, illustration in enumerate(plan, 1)}
+        for future in as_completed(futures):
+            i, illustration = futures[future]
+            status, detail = future.result()
+            print(f"\n[{i}/{len(plan)}] {illustration['title_en']} ({illustration.get('chapter', 'N/A')}, "
+                  f"{illustration['type']})")
+            if status == "skipped":
+                print(f"  Skipping (already exists): {detail.name}")
+            elif status == "labelled":
+                print(f"  Placed Arabic labels on: {detail.name}")
+            elif status == "success":
+                print(f"  Saved: {detail}")
+            else:
+                print(f"  Failed to generate: {detail}")
+            results.append({"status": status})
 
     # Summary
     print("\n" + "=" * 60)
@@ -238,11 +460,19 @@ def main():
     print("=" * 60)
     success = sum(1 for r in results if r['status'] == 'success')
     skipped = sum(1 for r in results if r['status'] == 'skipped')
+    labelled = sum(1 for r in results if r['status'] == 'labelled')
     failed = sum(1 for r in results if r['status'] == 'failed')
+    unlabelled = sum(1 for illustration in plan
+                     if manifest.done(illustration) and not manifest.has_labels(illustration))
     print(f"Generated: {success}")
     print(f"Skipped (existing): {skipped}")
+    print(f"Arabic labels placed on existing: {labelled}")
     print(f"Failed: {failed}")
+    if unlabelled:
+        print(f"Without Arabic labels: {unlabelled} (see labels_error in {MANIFEST_FILE.name}; "
+              f"run again to retry)")
     print(f"\nIllustrations saved to: {ILLUSTRATIONS_DIR}")
+    print(f"Manifest: {MANIFEST_FILE}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,167 @@
+"""
+Hedged streaming requests for chapter generation.
+If a chapter call has not produced its first token, or has not finished,
+by a chosen percentile of the latencies recorded in the generation ledger,
+a duplicate request is fired; whichever finishes first is kept and the
+other is cancelled.
+"""
+
+import time
+import queue
+import threading
+import contextvars
+
+from backends import Cancellation, current_cancellation
+from ledger import call_context, load_records, percentile
+
+# Fewer live chapter calls than this in the ledger and hedging stays off
+MIN_HISTORY = 5
+HEDGED_KINDS = {"chapter", "section"}
+
+
+class HedgePolicy:
+    """When to fire a duplicate request: no first token after `ttft_after`
+    seconds, or not finished after `seconds_per_word` times the word target.
+    With no first-token history (ttft_after None) only the finish deadline applies."""
+
+    def __init__(self, ttft_after, seconds_per_word, pct=None):
+        self.ttft_after = ttft_after
+        self.seconds_per_word = seconds_per_word
+        self.pct = pct
+
+    @classmethod
+    def from_ledger(cls, path, pct):
+        """Build a policy from the pct-th percentile of past chapter calls, or None if history is thin."""
+        live = [r for r in load_records(path)
+                if r.get("kind") in HEDGED_KINDS and "event" not in r and not r.get("cache_hit")
+                and not r.get("aborted") and not r.get("error") and r.get("latency") and r.get("output_words")]
+        if len(live) < MIN_HISTORY:
+            return None
+        # None when no call recorded a first-token time
+        ttft = percentile([r["ttft"] for r in live if r.get("ttft") is not None], pct)
+        seconds_per_word = percentile([r["latency"] / r["output_words"] for r in live], pct)
+        return cls(ttft, seconds_per_word, pct)
+
+    def finish_after(self, word_target):
+        """Seconds a call for word_target words may run before it is hedged."""
+        return self.seconds_per_word * word_target
+
+    def first_token_after(self, word_target):
+        """Seconds a call may wait for its first token before it is hedged."""
+        return self.ttft_after if self.ttft_after is not None else self.finish_after(word_target)
+
+    def describe(self):
+        first = f"first token {self.ttft_after:.1f}s" if self.ttft_after is not None else "no first-token history"
+        return f"p{self.pct} {first}, finish {self.seconds_per_word * 1000:.0f}ms per target word"
+
+
+def race_stream(client, model, contents, config, policy, word_target, make_watch):
+    """Stream a call, hedging it with a duplicate if it runs past the policy's deadlines.
+
+    make_watch(role) returns a function that is fed each text chunk of that
+    racer ("primary" or "backup") and returns a reason string to abort it,
+    like RunawayDetector.feed. Returns (text, reason): the text of the first
+    racer to finish, or the abort reason if every racer was aborted. The
+    outcome is recorded in the client's ledger as a "hedge" event.
+    """
+    events = queue.Queue()
+    racers = []
+    start = time.monotonic()
+
+    def launch(role):
+        racer = {"role": role, "start": time.monotonic(), "first": None, "words": 0,
+                 "cancel": Cancellation()}
+        watch = make_watch(role)
+
+        def run():
+            # The controlling thread cancels a losing racer, which closes its connection
+            # even while it waits on a stalled server
+            current_cancellation.set(racer["cancel"])
+            with call_context(hedge=role):
+                stream = client.generate_content_stream(model=model, contents=contents, config=config)
+                parts = []
+                try:
+                    for chunk in stream:
+                        if racer["cancel"].cancelled:
+                            return
+                        if racer["first"] is None:
+                            racer["first"] = time.monotonic()
+                        text = chunk.text or ""
+                        parts.append(text)
+                        racer["words"] += len(text.split())
+                        reason = watch(text)
+                        if reason:
+                            events.put(("aborted", racer, reason))
+                            return
+                    if not racer["cancel"].cancelled:
+                        events.put(("done", racer, "".join(parts)))
+                except Exception as e:
+                    if not racer["cancel"].cancelled:
+                        events.put(("error", racer, e))
+                finally:
+                    stream.close()
+
+        racers.append(racer)
+        # Each thread needs its own copy of the caller's ledger tags
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(run,), daemon=True).start()
+
+    launch("primary")
+    trigger = None
+    failures = []
+    while True:
+        timeout = None
+        if trigger is None:
+            started = racers[0]["first"] is not None
+            deadline = start + (policy.finish_after(word_target) if started else policy.first_token_after(word_target))
+            # Re-check at least every second so a first token moves us to the finish deadline
+            timeout = min(1.0, max(0.0, deadline - time.monotonic()))
+        try:
+            kind, racer, value = events.get(timeout=timeout)
+        except queue.Empty:
+            if time.monotonic() >= deadline:
+                trigger = "finish" if racers[0]["first"] is not None else "first_token"
+                launch("backup")
+            continue
+
+        if kind == "done":
+            for other in racers:
+                if other is not racer:
+                    other["cancel"].cancel()
+            _record_hedge(client, racers, racer, trigger, value, start)
+            return value, None
+
+        failures.append((kind, value))
+        if len(failures) == len(racers):
+            _record_hedge(client, racers, None, trigger, "", start)
+            for kind, value in failures:
+                if kind == "aborted":
+                    return "", value
+            raise failures[0][1]
+
+
+def _record_hedge(client, racers, winner, trigger, text, start):
+    """Log whether hedging fired for a call, who won, and the latency it saved (an estimate)."""
+    ledger = getattr(client, "ledger", None)
+    if not ledger:
+        return
+    now = time.monotonic()
+    saved = 0.0
+    primary = racers[0]
+    if winner is not None and winner is not primary:
+        if primary["first"] is not None and primary["words"]:
+            # Project the primary's finish from its streaming rate and the winner's length
+            rate = primary["words"] / max(now - primary["first"], 1e-6)
+            saved = max(0, len(text.split()) - primary["words"]) / rate
+        else:
+            # The primary had not started streaming, so it still had at least the winner's generation ahead
+            saved = now - (winner["first"] or winner["start"])
+    ledger.record_event(
+        "hedge",
+        fired=trigger is not None,
+        trigger=trigger,
+        winner=winner["role"] if winner else None,
+        fired_after=round(racers[1]["start"] - start, 3) if len(racers) > 1 else None,
+        latency=round(now - start, 3),
+        saved=round(saved, 3),
+    )
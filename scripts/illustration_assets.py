@@ -0,0 +1,294 @@
+"""
+Illustrations as the book builders use them.
+Maps chapters to their illustration files and makes smaller derivatives of
+each generated image: one for print, sized to the PDF figure width at a
+target DPI, and web versions at several widths in AVIF and WebP with a JPEG
+fallback. Derivatives are cached under illustrations/derivatives by a hash
+of the source image, so they are only made again when the image changes.
+
+Images are generated once, with English labels. The Arabic edition gets a
+variant composited locally: the plan's title_ar as a banner above the image
+and the Arabic labels the manifest records for it (labels_ar) over the
+English ones, shaped right-to-left with a bundled font.
+"""
+
+import os
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFont, features
+from arabic_reshaper import reshape
+from bidi.algorithm import get_display
+
+BASE_DIR = Path(__file__).parent.parent
+ILLUSTRATIONS = BASE_DIR / "illustrations"
+DERIVATIVES_DIR = ILLUSTRATIONS / "derivatives"
+PLAN_FILE = ILLUSTRATIONS / "illustration_plan.json"
+MANIFEST_FILE = ILLUSTRATIONS / "manifest.json"
+FONTS_DIR = BASE_DIR / "fonts"
+
+# The PDF text block is A4 (21 x 29.7cm) less 2cm side and 2.5cm top/bottom margins
+FIGURE_WIDTH_CM = 17.0
+FIGURE_MAX_HEIGHT_CM = 20.0   # leaves room for the caption on a page
+PRINT_DPI = 300
+DRAFT_DPI = 96                # low-resolution proxies for draft PDFs
+PRINT_QUALITY = 85
+WEB_WIDTHS = (480, 860, 1280)   # phone, the 860px content column, and that column on 1.5x screens
+WEB_QUALITY = {"avif": 55, "webp": 78, "jpeg": 80}
+WEB_MIME = {"avif": "image/avif", "webp": "image/webp", "jpeg": "image/jpeg"}
+
+# Arabic variants: the first font found is used, so adding the book's own font to fonts/ takes over
+LABEL_FONTS = ("NotoSansArabic-Bold.ttf", "DejaVuSans-Bold.ttf")
+BANNER_COLOR = "#1B5E20"      # the PDF's primary green
+BANNER_HEIGHT = 0.11          # share of the image width
+LABEL_SIZE = 0.024            # label text size as a share of the image width
+VARIANT_QUALITY = 92          # variants are derived again, so they are kept close to the source
+
+# Illustration directories by chapter id
+CHAPTER_ILLUSTRATIONS = {
+    "01_company_types": "ch01",
+    "02_foreign_investors": "ch01",  # MISA is in ch01
+    "03_founding_steps": "ch01",
+    "04_pdpl_basics": "ch02",
+    "05_consent": "ch02",
+    "06_cross_border": "ch03",
+    "07_pdpl_compliance": "ch03",
+    "08_pdpl_penalties": "ch04",
+    "09_cybersecurity_ecosystem": "ch05",
+    "10_ecc_controls": "ch05",
+    "11_government_contracts": "ch06",
+    "12_compliance_advantage": "ch07",
+    "13_ai_landscape": "ch08",
+    "14_ai_products": "ch08",
+}
+
+
+def get_illustrations_for_chapter(chapter_id):
+    """Get illustration paths for a chapter."""
+    if chapter_id not in CHAPTER_ILLUSTRATIONS:
+        return []
+    ch_dir = ILLUSTRATIONS / CHAPTER_ILLUSTRATIONS[chapter_id]
+    if not ch_dir.exists():
+        return []
+    return sorted(ch_dir.glob("*.jpg")) + sorted(ch_dir.glob("*.png"))
+
+
+def plan_key(illustration_info):
+    """Stable hash of a plan item; editing its prompt or titles gives a new key."""
+    payload = json.dumps(illustration_info, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def plan_items_by_path():
+    """Plan items keyed by their image's path, with the manifest's labels_ar for that image."""
+    if not (PLAN_FILE.exists() and MANIFEST_FILE.exists()):
+        return {}
+    with open(PLAN_FILE, "r", encoding="utf-8") as f:
+        plan = {plan_key(item): item for item in json.load(f)}
+    with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    return {(ILLUSTRATIONS / entry["path"]).resolve(): {**plan[key], "labels_ar": entry.get("labels_ar", [])}
+            for key, entry in manifest.items() if key in plan and entry["status"] == "done" and entry["path"]}
+
+
+def caption(path, lang, item=None):
+    """Figure caption: the plan title in lang, or the file name for images outside the plan."""
+    if item and item.get(f"title_{lang}"):
+        return item[f"title_{lang}"]
+    return path.stem.replace("_", " ").title()
+
+
+def web_formats():
+    """Web formats this Pillow can write, best first; JPEG is always last as the fallback."""
+    formats = [fmt for fmt in ("avif", "webp") if features.check(fmt)]
+    return formats + ["jpeg"]
+
+
+def source_hash(path):
+    """Hash of an image file's bytes, naming its derivatives directory."""
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()[:16]
+
+
+def _save(image, path, fmt, quality, **options):
+    """Encode an image atomically, so an interrupted run never leaves a half-written derivative."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = path.with_name(path.name + ".tmp")
+    options["quality"] = quality
+    if fmt == "jpeg":
+        options.update(optimize=True, progressive=True)
+    elif fmt == "webp":
+        options.update(method=6)
+    image.save(tmp_file, format=fmt.upper(), **options)
+    os.replace(tmp_file, path)
+
+
+def _open_rgb(path):
+    """Open an image flattened onto white, as JPEG and the print PDF need."""
+    image = Image.open(path)
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def print_derivative(path, dpi=PRINT_DPI):
+    """JPEG of an illustration no larger than the PDF figure box at `dpi`; returns its path.
+
+    Images are only ever scaled down, and only when they have more pixels
+    than the figure can show at that DPI, so the page layout does not change.
+    """
+    target = DERIVATIVES_DIR / source_hash(path) / f"print-{dpi}dpi.jpg"
+    if target.exists():
+        return target
+    image = _open_rgb(path)
+    box = (round(FIGURE_WIDTH_CM / 2.54 * dpi), round(FIGURE_MAX_HEIGHT_CM / 2.54 * dpi))
+    image.thumbnail(box, Image.LANCZOS)
+    _save(image, target, "jpeg", PRINT_QUALITY, dpi=(dpi, dpi))
+    return target
+
+
+def web_derivatives(path, widths=WEB_WIDTHS):
+    """Web versions of an illustration; returns {format: [(width, path), ...]} for srcset.
+
+    Widths above the source's own are left out; the source width is used
+    instead when every target width is larger.
+    """
+    directory = DERIVATIVES_DIR / source_hash(path)
+    image = None
+    with Image.open(path) as probe:
+        source_width, source_height = probe.size
+    sizes = sorted({min(width, source_width) for width in widths})
+
+    derivatives = {}
+    for fmt in web_formats():
+        derivatives[fmt] = []
+        for width in sizes:
+            target = directory / f"web-{width}.{'jpg' if fmt == 'jpeg' else fmt}"
+            if not target.exists():
+                if image is None:
+                    image = _open_rgb(path)
+                height = round(source_height * width / source_width)
+                _save(image.resize((width, height), Image.LANCZOS), target, fmt, WEB_QUALITY[fmt])
+            derivatives[fmt].append((width, target))
+    return derivatives
+
+
+def label_font(size):
+    """The first bundled label font, at `size` pixels."""
+    for name in LABEL_FONTS:
+        if (FONTS_DIR / name).exists():
+            path = FONTS_DIR / name
+            break
+    else:
+        raise FileNotFoundError(f"No label font in {FONTS_DIR}; expected one of {', '.join(LABEL_FONTS)}")
+    if features.check("raqm"):
+        return ImageFont.truetype(str(path), size, layout_engine=ImageFont.Layout.RAQM), path
+    return ImageFont.truetype(str(path), size, layout_engine=ImageFont.Layout.BASIC), path
+
+
+def draw_rtl(draw, xy, text, font, fill, anchor):
+    """Draw Arabic text right-to-left, with raqm when Pillow has it, else reshaped for basic layout."""
+    if font.layout_engine == ImageFont.Layout.RAQM:
+        draw.text(xy, text, font=font, fill=fill, anchor=anchor, direction="rtl", language="ar")
+    else:
+        draw.text(xy, get_display(reshape(text)), font=font, fill=fill, anchor=anchor)
+
+
+def rtl_width(draw, text, font):
+    """Rendered width of Arabic text in pixels."""
+    if font.layout_engine == ImageFont.Layout.RAQM:
+        box = draw.textbbox((0, 0), text, font=font, direction="rtl", language="ar")
+    else:
+        box = draw.textbbox((0, 0), get_display(reshape(text)), font=font)
+    return box[2] - box[0]
+
+
+def fitted_font(draw, text, size, max_width):
+    """Label font shrunk until text fits in max_width."""
+    font, _ = label_font(size)
+    while size > 10 and rtl_width(draw, text, font) > max_width:
+        size = int(size * 0.9)
+        font, _ = label_font(size)
+    return font
+
+
+def arabic_variant(path, item):
+    """The illustration with the plan's Arabic title and labels composited on; returns its path.
+
+    The title goes in a banner above the image, right-aligned; each entry of
+    the item's labels_ar ({"text", "x", "y", "w", "h"}, the centre and size
+    of the English label as shares of the image size) is drawn on a white
+    tag centred there and at least that size, so it covers the English.
+    Variants are cached by the image hash, the text and the font file.
+    """
+    labels = item.get("labels_ar", [])
+    image_hash = source_hash(path)
+    _, font_path = label_font(10)
+    key = hashlib.sha256(json.dumps([image_hash, item.get("title_ar", ""), labels, source_hash(font_path)],
+                                    ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+    target = DERIVATIVES_DIR / image_hash / f"ar-{key}.jpg"
+    if target.exists():
+        return target
+
+    image = _open_rgb(path)
+    width, height = image.size
+    banner = round(width * BANNER_HEIGHT) if item.get("title_ar") else 0
+    canvas = Image.new("RGB", (width, height + banner), "white")
+    canvas.paste(image, (0, banner))
+    draw = ImageDraw.Draw(canvas)
+
+    if banner:
+        draw.rectangle((0, 0, width, banner), fill=BANNER_COLOR)
+        padding = round(banner * 0.35)
+        font = fitted_font(draw, item["title_ar"], round(banner * 0.45), width - 2 * padding)
+        draw_rtl(draw, (width - padding, banner / 2), item["title_ar"], font, "white", "rm")
+
+    for label in labels:
+        box_width, box_height = label.get("w", 0) * width, label.get("h", 0) * height
+        font = fitted_font(draw, label["text"], round(width * LABEL_SIZE), max(width * 0.4, box_width))
+        x, y = label["x"] * width, banner + label["y"] * height
+        pad = font.size * 0.4
+        half_width = max(rtl_width(draw, label["text"], font) / 2, box_width / 2) + pad
+        half_height = max(font.size * 0.7, box_height / 2) + pad / 2
+        # Tags at the edge are moved in so they stay on the image
+        x = min(max(x, half_width), width - half_width)
+        y = min(max(y, banner + half_height), banner + height - half_height)
+        draw.rounded_rectangle((x - half_width, y - half_height, x + half_width, y + half_height),
+                               radius=pad, fill="white", outline=BANNER_COLOR, width=max(1, round(pad / 4)))
+        draw_rtl(draw, (x, y), label["text"], font, "#333333", "mm")
+
+    _save(canvas, target, "jpeg", VARIANT_QUALITY)
+    return target
+
+
+def localized(path, lang, items=None):
+    """The version of an illustration the lang edition shows: the Arabic variant or the original.
+
+    items maps image paths to plan items (see plan_items_by_path); images
+    outside the plan are shown as they are.
+    """
+    item = (items if items is not None else plan_items_by_path()).get(Path(path).resolve())
+    if lang == "ar" and item and (item.get("title_ar") or item.get("labels_ar")):
+        return arabic_variant(path, item)
+    return path
+
+
+def make_derivatives(path, dpi=PRINT_DPI):
+    """Make (or find cached) print and web derivatives for one illustration."""
+    return print_derivative(path, dpi), web_derivatives(path)
+
+
+def prepare(paths, make=print_derivative):
+    """Run `make` over many illustrations at once; returns {source path: result}.
+
+    Pillow releases the GIL while resampling and encoding, so threads use
+    every core; cached derivatives cost only a hash of the source.
+    """
+    paths = list(dict.fromkeys(paths))
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        return dict(zip(paths, executor.map(make, paths)))
+
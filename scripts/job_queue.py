@@ -0,0 +1,241 @@
+"""
+SQLite-backed job queue shared by book generation worker processes.
+Jobs are leased for a limited time and kept alive by heartbeats; a worker
+that crashes simply lets its lease expire and the job is handed to someone
+else. Failed jobs are retried with backoff up to a fixed number of attempts.
+
+WAL mode lets readers and one writer proceed together, but it needs shared
+memory, so every worker must run on the same host. Workers on several hosts
+sharing a filesystem should use journal_mode="delete" instead, and then only
+on a filesystem with working POSIX locks.
+"""
+
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+# Configuration
+QUEUE_FILE = Path(__file__).parent.parent / "output" / "job_queue.sqlite3"
+DEFAULT_LEASE_SECONDS = 120
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_DELAY = 30              # seconds before a failed job is offered again, doubled per attempt
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    position INTEGER NOT NULL DEFAULT 0,
+    depends_on TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, available_at, position);
+"""
+
+
+class LeaseLost(RuntimeError):
+    """Raised when a worker no longer holds the lease on its job."""
+
+
+def worker_name():
+    """Identify the calling thread across processes and hosts, e.g. "build-box:4242:4250"."""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_native_id()}"
+
+
+class Job:
+    """A leased job: its id, kind, decoded payload and attempt number."""
+
+    def __init__(self, row):
+        self.id = row["id"]
+        self.kind = row["kind"]
+        self.payload = json.loads(row["payload"])
+        self.attempts = row["attempts"]
+        self.depends_on = row["depends_on"]
+
+
+class JobQueue:
+    """Durable queue of jobs with leases, heartbeats and retry counts.
+
+    Each thread gets its own connection; every state change runs in an
+    IMMEDIATE transaction, so two workers can never lease the same job.
+    """
+
+    def __init__(self, path=QUEUE_FILE, lease_seconds=DEFAULT_LEASE_SECONDS, journal_mode="wal"):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.journal_mode = journal_mode
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def transaction(self):
+        """Run a block as one write transaction, serialised across every process using the queue."""
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def enqueue(self, job_id, kind, payload, position=0, depends_on=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """Add a job unless one with this id exists; a failed one is reset for another round.
+
+        Returns True if the job will run.
+        """
+        with self.transaction() as db:
+            row = db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                db.execute(
+                    "INSERT INTO jobs (id, kind, payload, position, depends_on, max_attempts, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, kind, json.dumps(payload, ensure_ascii=False), position, depends_on,
+                     max_attempts, time.time()),
+                )
+                return True
+            if row["status"] == "failed":
+                db.execute(
+                    "UPDATE jobs SET status = 'pending', attempts = 0, available_at = 0, error = NULL, "
+                    "updated = ? WHERE id = ?", (time.time(), job_id))
+                return True
+            return row["status"] != "done"
+
+    def lease(self, owner):
+        """Claim the next runnable job for `owner`, or return None if nothing is ready.
+
+        A job is runnable when it is pending (or its lease has expired), its
+        retry delay has passed and the job it depends on is done.
+        """
+        now = time.time()
+        with self.transaction() as db:
+            # Crashed workers' jobs that have used up their attempts, and jobs
+            # whose dependency failed, can never run
+            db.execute(
+                "UPDATE jobs SET status = 'failed', error = 'lease expired', updated = ? "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= max_attempts", (now, now))
+            db.execute(
+                "UPDATE jobs SET status = 'failed', error = 'dependency failed: ' || depends_on, updated = ? "
+                "WHERE status = 'pending' AND depends_on IN (SELECT id FROM jobs WHERE status = 'failed')",
+                (now,))
+            row = db.execute(
+                "SELECT * FROM jobs j WHERE "
+                "((j.status = 'pending' AND j.available_at <= ?) OR (j.status = 'leased' AND j.lease_expires < ?)) "
+                "AND (j.depends_on IS NULL OR EXISTS "
+                "     (SELECT 1 FROM jobs d WHERE d.id = j.depends_on AND d.status = 'done')) "
+                "ORDER BY j.position, j.id LIMIT 1", (now, now)).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated = ? WHERE id = ?",
+                (owner, now + self.lease_seconds, now, row["id"]))
+            return Job({**dict(row), "attempts": row["attempts"] + 1})
+
+    def heartbeat(self, job, owner):
+        """Extend a lease; raises LeaseLost if another worker has taken the job over."""
+        now = time.time()
+        with self.transaction() as db:
+            changed = db.execute(
+                "UPDATE jobs SET lease_expires = ?, updated = ? "
+                "WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (now + self.lease_seconds, now, job.id, owner)).rowcount
+        if not changed:
+            raise LeaseLost(f"Lease on {job.id} lost")
+
+    @contextmanager
+    def keep_alive(self, job, owner):
+        """Heartbeat a job's lease from a background thread while the block runs."""
+        stop = threading.Event()
+        lost = []
+
+        def beat():
+            while not stop.wait(self.lease_seconds / 3):
+                try:
+                    self.heartbeat(job, owner)
+                except LeaseLost as e:
+                    lost.append(e)
+                    return
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield lost
+        finally:
+            stop.set()
+            thread.join()
+
+    def complete(self, job, owner, result=None, db=None):
+        """Mark a job done. Pass `db` to commit it inside an open transaction."""
+        if db is None:
+            with self.transaction() as db:
+                return self.complete(job, owner, result, db)
+        changed = db.execute(
+            "UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_owner = NULL, updated = ? "
+            "WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+            (json.dumps(result, ensure_ascii=False), time.time(), job.id, owner)).rowcount
+        if not changed:
+            raise LeaseLost(f"Lease on {job.id} lost before it completed")
+
+    def fail(self, job, owner, error):
+        """Record a failed attempt: back off and retry, or give up after max_attempts.
+
+        Returns True if the job will be retried.
+        """
+        now = time.time()
+        with self.transaction() as db:
+            row = db.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ? AND lease_owner = ?",
+                             (job.id, owner)).fetchone()
+            if row is None:
+                return False
+            retry = row["attempts"] < row["max_attempts"]
+            db.execute(
+                "UPDATE jobs SET status = ?, available_at = ?, error = ?, lease_owner = NULL, updated = ? "
+                "WHERE id = ?",
+                ("pending" if retry else "failed", now + RETRY_DELAY * 2 ** (row["attempts"] - 1),
+                 str(error), now, job.id))
+        return retry
+
+    def result(self, job_id):
+        """Decoded result of a finished job, or None."""
+        row = self._connection().execute("SELECT result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row["result"]) if row and row["result"] else None
+
+    def counts(self):
+        """Number of jobs in each status."""
+        rows = self._connection().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")
+        return {row["status"]: row["n"] for row in rows}
+
+    def unfinished(self):
+        """Jobs that are still pending or leased."""
+        counts = self.counts()
+        return counts.get("pending", 0) + counts.get("leased", 0)
+
+    def failures(self):
+        """(id, error) of every job that gave up."""
+        rows = self._connection().execute("SELECT id, error FROM jobs WHERE status = 'failed' ORDER BY id")
+        return [(row["id"], row["error"]) for row in rows]
@@ -0,0 +1,219 @@
+"""
+Per-call ledger for the generation scripts.
+Every model call appends one JSON line with its tokens, latency, retries and
+cache status, tagged with the chapter or illustration it was made for.
+"""
+
+import json
+import math
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from pathlib import Path
+
+# Configuration
+LEDGER_FILE = Path(__file__).parent.parent / "output" / "generation_ledger.jsonl"
+
+# USD list prices per million tokens: (input, output). Update when pricing changes.
+MODEL_PRICING = {
+    "gemini-3-flash-preview": (0.50, 3.00),
+    "gemini-3-pro-image-preview": (2.00, 120.00),
+}
+
+# Context caching: USD per million cached input tokens read, and per million stored per hour
+CACHE_PRICING = {
+    "gemini-3-flash-preview": (0.05, 1.00),
+}
+
+_call_context = contextvars.ContextVar("call_context", default={})
+
+
+@contextmanager
+def call_context(**fields):
+    """Tag the model calls made inside this block, e.g. item="01_company_types", lang="ar"."""
+    token = _call_context.set({**_call_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _call_context.reset(token)
+
+
+def current_context():
+    """Fields set by the enclosing call_context blocks."""
+    return dict(_call_context.get())
+
+
+def call_cost(model, prompt_tokens, output_tokens, cached_tokens=0):
+    """Cost of one call in USD, or None for models without a known price.
+
+    prompt_tokens includes any cached_tokens, which are billed at the cached rate.
+    """
+    if model not in MODEL_PRICING:
+        return None
+    input_price, output_price = MODEL_PRICING[model]
+    cached_tokens = cached_tokens or 0
+    cached_price = CACHE_PRICING.get(model, (input_price, 0))[0]
+    return (((prompt_tokens or 0) - cached_tokens) * input_price + cached_tokens * cached_price
+            + (output_tokens or 0) * output_price) / 1_000_000
+
+
+def cache_saving(model, cached_tokens):
+    """USD saved by reading cached_tokens from a cache instead of sending them, before storage."""
+    if model not in MODEL_PRICING or model not in CACHE_PRICING:
+        return 0.0
+    return (cached_tokens or 0) * (MODEL_PRICING[model][0] - CACHE_PRICING[model][0]) / 1_000_000
+
+
+def storage_cost(model, tokens, seconds):
+    """USD to keep `tokens` in a provider cache for `seconds`."""
+    if model not in CACHE_PRICING:
+        return 0.0
+    return (tokens or 0) * CACHE_PRICING[model][1] * seconds / 3600 / 1_000_000
+
+
+class Ledger:
+    """Append-only JSONL record of model calls, safe to share between threads."""
+
+    def __init__(self, path=LEDGER_FILE):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def record(self, model, response=None, latency=None, ttft=None, retries=0, cache_hit=False, **fields):
+        """Append one call, reading token counts from the response's usage metadata."""
+        usage = response.usage_metadata if response is not None else None
+        text = response.text if response is not None and not _has_inline_data(response) else None
+        entry = {
+            "time": time.time(),
+            **current_context(),
+            "model": model,
+            "prompt_tokens": usage.prompt_token_count if usage else None,
+            "output_tokens": usage.candidates_token_count if usage else None,
+            "cached_tokens": usage.cached_content_token_count if usage else None,
+            "output_words": len(text.split()) if text else 0,
+            "ttft": round(ttft, 3) if ttft is not None else None,
+            "latency": round(latency, 3) if latency is not None else None,
+            "retries": retries,
+            "cache_hit": cache_hit,
+            **fields,
+        }
+        self._append(entry)
+
+    def record_event(self, event, **fields):
+        """Append a record that is not a model call, such as the outcome of a hedged request."""
+        self._append({"time": time.time(), **current_context(), "event": event, **fields})
+
+    def _append(self, entry):
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+def _has_inline_data(response):
+    """Whether a response carries binary parts, such as generated images."""
+    if not response.candidates or not response.candidates[0].content:
+        return False
+    return any(part.inline_data for part in response.candidates[0].content.parts or [])
+
+
+def load_records(path=LEDGER_FILE):
+    """Read every record from a ledger file."""
+    path = Path(path)
+    if not path.exists():
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers, or None if empty."""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(0, min(len(values) - 1, math.ceil(pct / 100 * len(values)) - 1))
+    return values[rank]
+
+
+def summarize(records):
+    """Aggregate throughput, latency and cost over a set of records."""
+    hedges = [r for r in records if r.get("event") == "hedge"]
+    fired = [r for r in hedges if r.get("fired")]
+    prefix_caches = [r for r in records if r.get("event") == "prefix_cache"]
+    records = [r for r in records if "event" not in r]
+    # Cache hits cost nothing and return instantly, so only live calls count
+    live = [r for r in records if not r.get("cache_hit") and r.get("latency") is not None]
+    latencies = [r["latency"] for r in live]
+    ttfts = [r["ttft"] for r in live if r.get("ttft") is not None]
+    busy = sum(latencies)
+    words = sum(r.get("output_words") or 0 for r in live)
+    tokens = sum(r.get("output_tokens") or 0 for r in live)
+    costs = [call_cost(r["model"], r.get("prompt_tokens"), r.get("output_tokens"), r.get("cached_tokens"))
+             for r in live]
+    # Storage is charged for the whole TTL, an upper bound when a run deletes its caches early
+    storage = sum(storage_cost(r["model"], r.get("tokens"), r.get("ttl") or 0) for r in prefix_caches)
+    return {
+        "calls": len(records),
+        "cache_hits": sum(1 for r in records if r.get("cache_hit")),
+        "retries": sum(r.get("retries") or 0 for r in records),
+        "prompt_tokens": sum(r.get("prompt_tokens") or 0 for r in live),
+        "output_tokens": tokens,
+        "words_per_sec": words / busy if busy else None,
+        "tokens_per_sec": tokens / busy if busy else None,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "ttft_p50": percentile(ttfts, 50),
+        "cost": sum(c for c in costs if c is not None) + storage,
+        "cached_tokens": sum(r.get("cached_tokens") or 0 for r in live),
+        "prefix_caches": len(prefix_caches),
+        "cache_saved": sum(cache_saving(r["model"], r.get("cached_tokens")) for r in live) - storage,
+        "hedged_calls": len(hedges),
+        "hedges_fired": len(fired),
+        "hedges_won": sum(1 for r in fired if r.get("winner") == "backup"),
+        "hedge_saved": sum(r.get("saved") or 0 for r in fired),
+    }
+
+
+def print_report(path=LEDGER_FILE):
+    """Print per-item and overall throughput, latency and cost from a ledger."""
+    records = load_records(path)
+    if not records:
+        print(f"No ledger records in {path}")
+        return
+
+    def fmt(value, spec=".1f"):
+        return "-" if value is None else format(value, spec)
+
+    groups = {}
+    for record in (r for r in records if "event" not in r):
+        key = (record.get("lang") or "-", record.get("item") or "-")
+        groups.setdefault(key, []).append(record)
+
+    header = f"{'lang':<5}{'item':<28}{'calls':>6}{'hits':>6}{'retry':>6}{'in tok':>9}{'out tok':>9}" \
+             f"{'w/s':>8}{'p50 s':>8}{'p95 s':>8}{'cost $':>9}"
+    print(f"Ledger: {path}")
+    print(header)
+    print("-" * len(header))
+    for (lang, item), group in sorted(groups.items()):
+        s = summarize(group)
+        print(f"{lang:<5}{item[:27]:<28}{s['calls']:>6}{s['cache_hits']:>6}{s['retries']:>6}"
+              f"{s['prompt_tokens']:>9}{s['output_tokens']:>9}{fmt(s['words_per_sec']):>8}"
+              f"{fmt(s['latency_p50']):>8}{fmt(s['latency_p95']):>8}{fmt(s['cost'], '.4f'):>9}")
+
+    s = summarize(records)
+    print("-" * len(header))
+    print(f"Total calls: {s['calls']} ({s['cache_hits']} cache hits, {s['retries']} retries)")
+    print(f"Tokens: {s['prompt_tokens']:,} in / {s['output_tokens']:,} out")
+    print(f"Throughput: {fmt(s['words_per_sec'])} words/sec, {fmt(s['tokens_per_sec'])} tokens/sec")
+    print(f"Latency: p50 {fmt(s['latency_p50'])}s, p95 {fmt(s['latency_p95'])}s, "
+          f"time to first token p50 {fmt(s['ttft_p50'], '.2f')}s")
+    print(f"Estimated cost: ${s['cost']:.4f}")
+    if s['prefix_caches'] or s['cached_tokens']:
+        share = s['cached_tokens'] / s['prompt_tokens'] if s['prompt_tokens'] else 0
+        print(f"Prefix cache: {s['cached_tokens']:,} of {s['prompt_tokens']:,} input tokens read from "
+              f"{s['prefix_caches']} cached prefixes ({share:.0%}), saving ~${s['cache_saved']:.4f} "
+              f"after storage")
+    if s['hedged_calls']:
+        print(f"Hedging: fired on {s['hedges_fired']} of {s['hedged_calls']} calls, backup won "
+              f"{s['hedges_won']}, saved ~{s['hedge_saved']:.1f}s of latency")
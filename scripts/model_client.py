@@ -0,0 +1,388 @@
+"""
+Shared model client for the book generation scripts.
+Wraps a model backend (Gemini, or a local OpenAI-compatible server) with a
+content-addressed on-disk response cache, so identical calls are served
+locally and runs can be replayed offline, routes live calls through the
+shared rate-limit / retry scheduler, and records every call in the
+generation ledger.
+"""
+
+import os
+import json
+import time
+import hashlib
+import itertools
+import threading
+from pathlib import Path
+
+from google.genai import types
+
+from backends import GeminiBackend, OpenAICompatibleBackend, current_cancellation
+from rate_limiter import Scheduler
+from ledger import Ledger, LEDGER_FILE
+
+# Configuration
+CACHE_DIR = Path(__file__).parent.parent / ".cache" / "responses"
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_OPENAI_BASE_URL = "http://127.0.0.1:8080/v1"
+
+
+class CacheMiss(LookupError):
+    """Raised in replay mode when a call has no cached response."""
+
+
+def cache_key(model, contents, config):
+    """Hash (model, prompt, config) into a stable cache key."""
+    payload = json.dumps(
+        {
+            "model": model,
+            "contents": contents,
+            "config": config.model_dump(mode="json", exclude_none=True) if config else None,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        # Non-text contents, such as an image Part, are hashed by their JSON form
+        default=lambda part: part.model_dump(mode="json", exclude_none=True),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def has_content(response):
+    """Whether a response carries any output worth caching."""
+    return bool(response.candidates and response.candidates[0].content
+                and response.candidates[0].content.parts)
+
+
+class ResponseCache:
+    """Model responses stored as JSON files, evicted least-recently-used by total size."""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key):
+        """Return the cached response for key, or None."""
+        path = self._path(key)
+        try:
+            data = path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        # Touch the entry so eviction sees it as recently used
+        os.utime(path)
+        return types.GenerateContentResponse.model_validate_json(data)
+
+    def put(self, key, response):
+        """Store a response and evict old entries if the cache is over size."""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(response.model_dump_json(exclude_none=True), encoding="utf-8")
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """Delete least-recently-used entries until the cache fits max_bytes."""
+        with self._lock:
+            entries = []
+            for path in self.cache_dir.glob("*/*.json"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+
+
+class ModelClient:
+    """Model backend with a response cache, offline replay and a shared scheduler.
+
+    In replay mode every call must be answered from the cache; a miss raises
+    CacheMiss instead of going to the network. Live calls go through the
+    scheduler's rate limits, retries and deadlines. Cache entries and ledger
+    records are keyed by the model that really serves the call, so backends
+    never share responses.
+    """
+
+    def __init__(self, backend, cache=None, replay=False, scheduler=None, ledger=None):
+        if replay and cache is None:
+            raise ValueError("Replay mode needs a response cache")
+        self.backend = backend
+        self.cache = cache
+        self.replay = replay
+        self.scheduler = scheduler or Scheduler()
+        self.ledger = ledger
+        self._prefixes = {}          # cached content name -> hash of the prefix it holds
+
+    def _cached(self, key, model):
+        """Look a call up in the cache; in replay mode a miss is an error."""
+        if not key:
+            return None
+        cached = self.cache.get(key)
+        if cached is None and self.replay:
+            raise CacheMiss(f"No cached response for {model} call {key[:12]}")
+        return cached
+
+    def _record(self, model, response, start, **fields):
+        """Append a call to the ledger, if one is attached."""
+        if self.ledger:
+            self.ledger.record(self.backend.model_name(model), response, latency=time.monotonic() - start,
+                               backend=self.backend.name, **fields)
+
+    def _cache_key(self, model, contents, config):
+        if not self.cache:
+            return None
+        if config and config.cached_content:
+            # Provider cache names change every run; key on the prefix they hold instead
+            config = config.model_copy(update={"cached_content": self._prefixes.get(config.cached_content,
+                                                                                    config.cached_content)})
+        return cache_key(self.backend.model_name(model), contents, config)
+
+    def create_cache(self, model, prefix, ttl):
+        """Cache a prompt prefix on the provider as a system instruction; returns (name, expiry).
+
+        In replay mode nothing is uploaded: the name is derived from the prefix,
+        so cached responses recorded with the same prefix are still found.
+        The upload is recorded in the ledger as a "prefix_cache" event.
+        """
+        digest = "prefix:" + hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        if self.replay:
+            name = f"replay/{digest}"
+            self._prefixes[name] = digest
+            return name, float("inf")
+
+        start = time.monotonic()
+        estimated = estimate_prompt_tokens([prefix])
+        (name, expires, tokens), retries = self.scheduler.run(
+            lambda timeout: self.backend.create_cache(model, prefix, ttl), estimated)
+        self.scheduler.settle(tokens or 0, estimated)
+        self._prefixes[name] = digest
+        if self.ledger:
+            self.ledger.record_event("prefix_cache", model=self.backend.model_name(model), name=name,
+                                     tokens=tokens, ttl=ttl, retries=retries,
+                                     latency=round(time.monotonic() - start, 3))
+        return name, expires
+
+    def delete_cache(self, name):
+        """Delete a provider-side cache before its TTL runs out."""
+        if not self.replay:
+            self.backend.delete_cache(name)
+
+    def generate_content(self, model, contents, config=None):
+        """Generate content, serving byte-identical calls from the cache."""
+        start = time.monotonic()
+        key = self._cache_key(model, contents, config)
+        cached = self._cached(key, model)
+        if cached is not None:
+            self._record(model, cached, start, cache_hit=True)
+            return cached
+
+        estimated = estimate_prompt_tokens(contents)
+        try:
+            response, retries = self.scheduler.run(
+                lambda timeout: self.backend.generate_content(
+                    model=model, contents=contents, config=with_timeout(config, timeout)),
+                estimated,
+            )
+        except Exception as e:
+            self._record(model, None, start, error=str(e))
+            raise
+        self.scheduler.settle(total_tokens(response), estimated)
+        self._record(model, response, start, retries=retries)
+
+        if key and has_content(response):
+            self.cache.put(key, response)
+        return response
+
+    def generate_content_stream(self, model, contents, config=None):
+        """Stream content chunks; a cache hit arrives as a single chunk.
+
+        Failures before the first chunk are retried by the scheduler; once text
+        is flowing, errors propagate to the caller. The merged response is
+        cached only if the stream is read to the end, so a caller that aborts
+        early never leaves a truncated entry behind. A call whose Cancellation
+        (see backends.current_cancellation) is cancelled just stops, without
+        retrying, and is recorded as aborted.
+        """
+        start = time.monotonic()
+        key = self._cache_key(model, contents, config)
+        cached = self._cached(key, model)
+        if cached is not None:
+            self._record(model, cached, start, cache_hit=True)
+            yield cached
+            return
+
+        scheduler = self.scheduler
+        estimated = estimate_prompt_tokens(contents)
+        deadline = scheduler.deadline_at()
+        attempt = 0
+        text_parts = []
+        last_chunk = None
+        ttft = None
+        completed = False
+        error = None
+        try:
+            while True:
+                with scheduler.slot(estimated, deadline):
+                    try:
+                        stream = iter(self.backend.generate_content_stream(
+                            model=model, contents=contents,
+                            config=with_timeout(config, scheduler.remaining(deadline))))
+                        first_chunk = next(stream, None)
+                    except Exception as e:
+                        if not scheduler.should_retry(attempt, e) or cancelled():
+                            raise
+                        failure = e
+                    else:
+                        ttft = time.monotonic() - start
+                        for chunk in itertools.chain([first_chunk] if first_chunk is not None else [], stream):
+                            text_parts.append(chunk.text or "")
+                            last_chunk = chunk
+                            yield chunk
+                        scheduler.record_success()
+                        completed = True
+                        break
+
+                scheduler.record_failure(failure)
+                scheduler.backoff(attempt, failure, deadline)
+                attempt += 1
+        except Exception as e:
+            if cancelled():
+                return
+            error = str(e)
+            raise
+        finally:
+            response = merge_stream(text_parts, last_chunk) if last_chunk is not None else None
+            fields = {"error": error} if error else {}
+            if not completed and not error:
+                fields["aborted"] = True
+            self._record(model, response, start, ttft=ttft, retries=attempt, **fields)
+
+        if response is not None:
+            scheduler.settle(total_tokens(response), estimated)
+            if key and has_content(response):
+                self.cache.put(key, response)
+
+
+def cancelled():
+    """True if the current call's Cancellation has been cancelled."""
+    cancellation = current_cancellation.get()
+    return cancellation is not None and cancellation.cancelled
+
+
+def estimate_prompt_tokens(contents):
+    """Rough prompt size in tokens, for reserving rate-limit budget before a call."""
+    return sum(len(c) for c in contents if isinstance(c, str)) // 4
+
+
+def total_tokens(response):
+    """Tokens a response reports using, or 0 if it has no usage metadata."""
+    usage = response.usage_metadata
+    return (usage.total_token_count or 0) if usage else 0
+
+
+def with_timeout(config, timeout):
+    """Copy a generation config with a per-attempt HTTP timeout (seconds)."""
+    if timeout is None:
+        return config
+    http_options = types.HttpOptions(timeout=int(timeout * 1000))
+    if config is None:
+        return types.GenerateContentConfig(http_options=http_options)
+    return config.model_copy(update={"http_options": http_options})
+
+
+def merge_stream(text_parts, last_chunk):
+    """Build one response from streamed text chunks and the final chunk's metadata."""
+    finish_reason = last_chunk.candidates[0].finish_reason if last_chunk.candidates else None
+    return types.GenerateContentResponse(
+        candidates=[types.Candidate(
+            content=types.Content(role="model", parts=[types.Part(text="".join(text_parts))]),
+            finish_reason=finish_reason,
+        )],
+        usage_metadata=last_chunk.usage_metadata,
+    )
+
+
+def add_client_arguments(parser):
+    """Add the shared model client options to a script's argument parser."""
+    group = parser.add_argument_group("model client")
+    group.add_argument("--backend", choices=["gemini", "openai"], default="gemini",
+                       help="Serve calls from Gemini, or from a local OpenAI-compatible server such as "
+                            "llama.cpp or vLLM (default: gemini)")
+    group.add_argument("--base-url", default=None,
+                       help="Endpoint for --backend openai (default: $OPENAI_BASE_URL or "
+                            f"{DEFAULT_OPENAI_BASE_URL}); for gemini use $GEMINI_BASE_URL")
+    group.add_argument("--local-model", default=None,
+                       help="Model name to request from --backend openai (default: $OPENAI_MODEL, "
+                            "else the Gemini model name, which llama.cpp ignores)")
+    group.add_argument("--replay", action="store_true",
+                       help="Serve every model call from the response cache, without network access")
+    group.add_argument("--no-cache", action="store_true",
+                       help="Always call the model, bypassing the response cache")
+    group.add_argument("--cache-dir", type=Path, default=CACHE_DIR,
+                       help=f"Response cache directory (default: {CACHE_DIR})")
+    group.add_argument("--cache-max-mb", type=int, default=512,
+                       help="Evict least-recently-used cache entries beyond this size (default: 512)")
+    group.add_argument("--rpm", type=int, default=None,
+                       help="Requests-per-minute limit across all concurrent calls")
+    group.add_argument("--tpm", type=int, default=None,
+                       help="Tokens-per-minute limit across all concurrent calls")
+    group.add_argument("--max-concurrency", type=int, default=8,
+                       help="Most model calls in flight at once; halves on throttling (default: 8)")
+    group.add_argument("--max-retries", type=int, default=5,
+                       help="Retries for throttled or transient failures (default: 5)")
+    group.add_argument("--deadline", type=float, default=None, metavar="SECONDS",
+                       help="Give up on a call, including retries, after this long")
+    group.add_argument("--ledger", type=Path, default=LEDGER_FILE,
+                       help=f"Append a JSONL record of every model call here (default: {LEDGER_FILE})")
+    group.add_argument("--no-ledger", action="store_true",
+                       help="Do not record model calls")
+
+
+def get_backend(args):
+    """Build the backend chosen on the command line; no network access or key check yet."""
+    if args.backend == "openai":
+        return OpenAICompatibleBackend(
+            args.base_url or os.environ.get("OPENAI_BASE_URL", DEFAULT_OPENAI_BASE_URL),
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            model=args.local_model or os.environ.get("OPENAI_MODEL"),
+        )
+    return GeminiBackend(os.environ.get("GEMINI_API_KEY"), os.environ.get("GEMINI_BASE_URL"))
+
+
+def get_client(args):
+    """Initialize the model client from parsed arguments and the environment.
+
+    With the gemini backend, GEMINI_API_KEY is required unless replaying and
+    GEMINI_BASE_URL points the client at another endpoint, such as
+    fake_gemini_server.py. The openai backend needs no key unless the server
+    asks for one (OPENAI_API_KEY).
+    """
+    cache = None
+    if not args.no_cache or args.replay:
+        cache = ResponseCache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+    ledger = None if args.no_ledger else Ledger(args.ledger)
+    backend = get_backend(args)
+    if args.replay:
+        return ModelClient(backend, cache, replay=True, ledger=ledger)
+
+    if backend.name == "gemini" and not backend.api_key:
+        raise ValueError("GEMINI_API_KEY environment variable not set")
+
+    scheduler = Scheduler(
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        max_concurrency=args.max_concurrency,
+        max_retries=args.max_retries,
+        deadline=args.deadline,
+    )
+    return ModelClient(backend, cache, scheduler=scheduler, ledger=ledger)
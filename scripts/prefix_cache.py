@@ -0,0 +1,68 @@
+"""
+Provider-side caching of the prompt prefix every chapter call shares.
+The book spec, writing guidelines and audience are uploaded once per
+language as cached content with a TTL; chapter and section calls then send
+only their own tail and reference the cache, paying the cached-token rate
+for the prefix. Backends without caches get the prefix as a plain system
+instruction instead.
+"""
+
+import time
+import threading
+
+from console import log
+
+DEFAULT_TTL = 3600            # seconds a cached prefix lives on the provider
+REFRESH_MARGIN = 300          # replace a cache this close to expiry, so no call outlives it
+
+
+class PrefixCache:
+    """One cached prompt prefix per language, created on first use and renewed before it expires.
+
+    build_prefix(lang) returns the prefix text. If the provider refuses to
+    cache it (no cache support, or a prefix under the model's minimum size),
+    calls carry the prefix inline as a system instruction.
+    """
+
+    def __init__(self, client, model, build_prefix, ttl=DEFAULT_TTL):
+        self.client = client
+        self.model = model
+        self.build_prefix = build_prefix
+        self.ttl = ttl
+        self._entries = {}       # lang -> (cache name or None, expiry)
+        self._names = []         # (lang, cache name) for each cache created
+        self._lock = threading.Lock()
+
+    def _cache_name(self, lang):
+        """Name of a live cache for lang, creating one if needed; None means send the prefix inline."""
+        with self._lock:
+            name, expires = self._entries.get(lang, (None, 0))
+            if lang in self._entries and (name is None or expires - time.time() > REFRESH_MARGIN):
+                return name
+            try:
+                name, expires = self.client.create_cache(self.model, self.build_prefix(lang), self.ttl)
+                self._names.append((lang, name))
+                log(lang, f"Cached the shared prompt prefix as {name} (TTL {self.ttl}s)")
+            except Exception as e:
+                name, expires = None, float("inf")
+                log(lang, f"[!] Could not cache the prompt prefix ({e}); sending it with every call")
+            self._entries[lang] = (name, expires)
+            return name
+
+    def apply(self, config, lang):
+        """Copy a generation config so the call uses the shared prefix for lang."""
+        name = self._cache_name(lang)
+        if name:
+            return config.model_copy(update={"cached_content": name})
+        return config.model_copy(update={"system_instruction": self.build_prefix(lang)})
+
+    def close(self):
+        """Delete the caches this run created instead of paying storage until their TTL ends."""
+        with self._lock:
+            for lang, name in self._names:
+                try:
+                    self.client.delete_cache(name)
+                except Exception as e:
+                    log(lang, f"[!] Could not delete cached prefix {name}: {e}")
+            self._names = []
+            self._entries = {}
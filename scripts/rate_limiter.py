@@ -0,0 +1,209 @@
+"""
+Shared request scheduler for the model client.
+Token-bucket limits on requests and tokens per minute, exponential backoff
+with jitter, per-request deadlines and a concurrency cap that halves when
+the API throttles us and creeps back up while calls succeed.
+"""
+
+import re
+import time
+import random
+import threading
+from contextlib import contextmanager
+
+import httpx
+
+# HTTP status codes worth retrying; 429 also shrinks the concurrency cap
+THROTTLE_CODES = {429}
+TRANSIENT_CODES = {408, 500, 502, 503, 504}
+
+# Successful calls needed before the concurrency cap grows by one
+RECOVERY_SUCCESSES = 5
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request cannot finish before its deadline."""
+
+
+def error_code(exc):
+    """HTTP status code carried by an API error, if any."""
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_throttle(exc):
+    """Whether an error is a rate-limit / quota response."""
+    return error_code(exc) in THROTTLE_CODES
+
+
+def is_retryable(exc):
+    """Whether an error is throttling or a transient server or network failure."""
+    if error_code(exc) in THROTTLE_CODES | TRANSIENT_CODES:
+        return True
+    return isinstance(exc, (httpx.TransportError, ConnectionError, TimeoutError)) \
+        and not isinstance(exc, DeadlineExceeded)
+
+
+def retry_after(exc):
+    """Server-suggested retry delay in seconds, from Retry-After or google.rpc.RetryInfo."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+
+    details = getattr(exc, "details", None)
+    if isinstance(details, dict):
+        for detail in details.get("error", {}).get("details", []):
+            match = re.fullmatch(r"([\d.]+)s", str(detail.get("retryDelay", "")))
+            if match:
+                return float(match.group(1))
+    return None
+
+
+class TokenBucket:
+    """Refills `rate` units per minute up to `capacity`; the balance may go negative."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate / 60.0
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1, deadline=None):
+        """Block until `amount` units are available, or raise DeadlineExceeded."""
+        amount = min(amount, self.capacity)
+        with self.cond:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+                if deadline is not None and time.monotonic() + wait > deadline:
+                    raise DeadlineExceeded("Rate limit wait would pass the request deadline")
+                self.cond.wait(wait)
+
+    def debit(self, amount):
+        """Charge units after the fact, e.g. output tokens known only once a call ends."""
+        with self.cond:
+            self._refill()
+            self.tokens -= amount
+
+
+class Scheduler:
+    """Rate limits, retries and adaptive concurrency shared by every model call."""
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, max_concurrency=8,
+                 max_retries=5, base_delay=1.0, max_delay=60.0, deadline=None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.active = 0
+        self.successes = 0
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.throttled = 0
+        self.retries = 0
+        self.cond = threading.Condition()
+
+    def deadline_at(self):
+        """Absolute monotonic deadline for a request starting now, or None."""
+        return time.monotonic() + self.deadline if self.deadline else None
+
+    def remaining(self, deadline):
+        """Seconds left before a deadline, or None if there is none."""
+        if deadline is None:
+            return None
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise DeadlineExceeded("Request deadline passed")
+        return left
+
+    @contextmanager
+    def slot(self, estimated_tokens=0, deadline=None):
+        """Hold a concurrency slot and the rate-limit budget for one attempt."""
+        with self.cond:
+            while self.active >= self.limit:
+                if not self.cond.wait(self.remaining(deadline)):
+                    self.remaining(deadline)
+            self.active += 1
+        try:
+            if self.requests:
+                self.requests.acquire(1, deadline)
+            if self.tokens and estimated_tokens:
+                self.tokens.acquire(estimated_tokens, deadline)
+            yield
+        finally:
+            with self.cond:
+                self.active -= 1
+                self.cond.notify_all()
+
+    def record_success(self):
+        """Let the concurrency cap recover after a successful call."""
+        with self.cond:
+            self.successes += 1
+            if self.limit < self.max_concurrency and self.successes >= RECOVERY_SUCCESSES:
+                self.limit += 1
+                self.successes = 0
+                self.cond.notify_all()
+
+    def settle(self, actual_tokens, estimated_tokens=0):
+        """Charge the tokens a call really used beyond what was reserved up front."""
+        if self.tokens and actual_tokens > estimated_tokens:
+            self.tokens.debit(actual_tokens - estimated_tokens)
+
+    def record_failure(self, exc):
+        """Halve the concurrency cap when throttled."""
+        with self.cond:
+            self.retries += 1
+            self.successes = 0
+            if is_throttle(exc):
+                self.throttled += 1
+                self.limit = max(1, self.limit // 2)
+
+    def backoff(self, attempt, exc, deadline=None):
+        """Sleep before the next attempt: the server's hint, or capped exponential with full jitter."""
+        delay = retry_after(exc)
+        if delay is None:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if deadline is not None and time.monotonic() + delay > deadline:
+            raise DeadlineExceeded(f"Retry after {delay:.1f}s would pass the request deadline") from exc
+        time.sleep(delay)
+
+    def should_retry(self, attempt, exc):
+        """Whether a failed attempt should be retried."""
+        return attempt < self.max_retries and is_retryable(exc)
+
+    def run(self, call, estimated_tokens=0):
+        """Run call(timeout) under the limits, retrying throttled or transient failures.
+
+        `timeout` is the number of seconds left before the request deadline, or
+        None. Returns (result, retries).
+        """
+        deadline = self.deadline_at()
+        attempt = 0
+        while True:
+            try:
+                with self.slot(estimated_tokens, deadline):
+                    result = call(self.remaining(deadline))
+                self.record_success()
+                return result, attempt
+            except Exception as e:
+                if not self.should_retry(attempt, e):
+                    raise
+                self.record_failure(e)
+                self.backoff(attempt, e, deadline)
+                attempt += 1
@@ -0,0 +1,87 @@
+"""
+Markdown helpers for translating a chapter section by section.
+A chapter is split at its section headings so the pieces can be translated
+concurrently and put back in the same order; code blocks are swapped for
+placeholders so they never reach the model, and each translation is checked
+for the same heading, table and placeholder structure as its source.
+"""
+
+import re
+
+from chapter_check import parse_headings
+
+CODE_BLOCK = re.compile(r"^```.*?^```[ \t]*$", re.DOTALL | re.MULTILINE)
+PLACEHOLDER = "⟦CODE_{}⟧"
+PLACEHOLDER_PATTERN = re.compile(r"⟦CODE_(\d+)⟧")
+TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$")
+
+
+def split_sections(content, level=2):
+    """Split a chapter into segments at headings of `level` or above.
+
+    Returns a list of markdown strings: the chapter's opening (title and
+    introduction) first, then one per section, each starting with its
+    heading. Joining them with blank lines gives back the chapter.
+    """
+    lines = content.splitlines()
+    starts = [i for i, heading_level, _ in parse_headings(content) if 1 < heading_level <= level]
+    bounds = [0] + starts + [len(lines)]
+    segments = ["\n".join(lines[a:b]).strip() for a, b in zip(bounds, bounds[1:])]
+    return [segment for segment in segments if segment]
+
+
+def protect_code(text):
+    """Swap fenced code blocks for numbered placeholders; returns (text, blocks)."""
+    blocks = []
+
+    def stash(match):
+        blocks.append(match.group(0))
+        return PLACEHOLDER.format(len(blocks))
+
+    return CODE_BLOCK.sub(stash, text), blocks
+
+
+def restore_code(text, blocks):
+    """Put code blocks back in place of their placeholders, verbatim."""
+    return PLACEHOLDER_PATTERN.sub(lambda m: blocks[int(m.group(1)) - 1], text)
+
+
+def structure(text):
+    """The parts of a segment a translation must keep: heading levels, table shapes and placeholders."""
+    headings = [level for _, level, _ in parse_headings(text)]
+    tables = []
+    rows = []
+    for line in text.splitlines() + [""]:
+        stripped = line.strip()
+        if stripped.startswith("|"):
+            cells = stripped.strip("|").split("|")
+            rows.append("-" if TABLE_SEPARATOR.match(stripped) else len(cells))
+        elif rows:
+            tables.append(tuple(rows))
+            rows = []
+    return {"headings": headings, "tables": tables, "placeholders": sorted(PLACEHOLDER_PATTERN.findall(text))}
+
+
+def structure_mismatch(source, translation):
+    """Describe how a translation's structure differs from its source, or None if it matches."""
+    want, got = structure(source), structure(translation)
+    problems = []
+    if want["headings"] != got["headings"]:
+        problems.append(f"headings {want['headings']} became {got['headings']}")
+    if want["tables"] != got["tables"]:
+        problems.append(f"{len(want['tables'])} tables with shapes {want['tables']} became {got['tables']}")
+    if want["placeholders"] != got["placeholders"]:
+        problems.append("code block placeholders changed")
+    return "; ".join(problems) or None
+
+
+def strip_fence(text):
+    """Remove a ```markdown fence the model may wrap its whole answer in."""
+    text = text.strip()
+    match = re.fullmatch(r"```[a-z]*\n(.*)\n```", text, re.DOTALL)
+    return match.group(1).strip() if match else text
+
+
+def replace_heading(segment, title):
+    """Give a segment's opening heading new text, keeping its level."""
+    return re.sub(r"^(#{1,6})\s+.*", lambda m: f"{m.group(1)} {title}", segment, count=1)
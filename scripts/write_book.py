@@ -5,19 +5,55 @@ AI writes each chapter in both Arabic and English.
 """
 
 import os
+import re
 import json
+import time
+import hashlib
 import argparse
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from pathlib import Path
 from datetime import datetime
 
-from google import genai
 from google.genai import types
 
+from model_client import add_client_arguments, get_backend, get_client
+from ledger import call_context, print_report, LEDGER_FILE
+from hedging import HedgePolicy, MIN_HISTORY, race_stream
+from prefix_cache import DEFAULT_TTL, PrefixCache
+from console import log
+from extractive_summary import summarize as summarize_locally
+from chapter_check import check_chapter, describe, parse_headings, needs_repair, section_level, splice_sections
+from translation import (PLACEHOLDER, protect_code, replace_heading, restore_code, split_sections,
+                         strip_fence, structure_mismatch)
+from job_queue import JobQueue, LeaseLost, QUEUE_FILE, worker_name
+from generate_illustrations import (PLAN_FILE, IllustrationManifest, generate_illustration_plan, plan_key,
+                                    render_illustration)
+
 # Configuration
 BOOK_SPEC_PATH = Path(__file__).parent.parent / "book-project-spec.md"
 CHAPTERS_DIR_AR = Path(__file__).parent.parent / "chapters_ar"
 CHAPTERS_DIR_EN = Path(__file__).parent.parent / "chapters_en"
 
+# Chapter generation model and runaway-output guards
+CHAPTER_MODEL = "gemini-3-flash-preview"
+MAX_CHAPTER_ATTEMPTS = 3
+OVERSHOOT_FACTOR = 2.0        # abort past this multiple of word_target
+MAX_CHARS_PER_WORD = 12       # character budget per target word (catches whitespace floods)
+MAX_CHAR_RUN = 200            # longest run of one repeated character
+REPEAT_NGRAM = 20             # n-gram length (words) checked for loops
+MAX_NGRAM_REPEATS = 4
+MIN_REPEAT_PARAGRAPH = 80     # paragraphs shorter than this may legitimately repeat
+MAX_PARAGRAPH_REPEATS = 3
+MAX_SECTION_ATTEMPTS = 3
+MAX_TRANSLATION_ATTEMPTS = 2
+WORKER_POLL_SECONDS = 5       # idle workers check the queue this often
+
+# Separates the chapter from its summary when both come back in one response
+SUMMARY_DELIMITER = "<<<CHAPTER_SUMMARY>>>"
+
+ILLUSTRATION_MANIFEST = IllustrationManifest()
+
 # Book structure with target word counts
 BOOK_STRUCTURE = [
     {
@@ -428,14 +464,6 @@ BOOK_STRUCTURE = [
 ]
 
 
-def get_client():
-    """Initialize Gemini client with API key from environment."""
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY environment variable not set")
-    return genai.Client(api_key=api_key)
-
-
 def read_book_spec():
     """Read the book specification file."""
     with open(BOOK_SPEC_PATH, "r", encoding="utf-8") as f:
@@ -449,38 +477,223 @@ def get_progress_file(lang):
 
 
 def load_progress(lang):
-    """Load progress from file."""
+    """Load progress from file; in_progress is always a list of the chapters being written."""
     progress_file = get_progress_file(lang)
     if progress_file.exists():
         with open(progress_file, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {"completed": [], "in_progress": None}
+            progress = json.load(f)
+        # Older files hold a single chapter id, or None
+        in_progress = progress.get("in_progress")
+        if not isinstance(in_progress, list):
+            progress["in_progress"] = [in_progress] if in_progress else []
+        return progress
+    return {"completed": [], "in_progress": [], "chapters": {}}
 
 
 def save_progress(lang, progress):
-    """Save progress to file."""
+    """Save progress to file (atomically, so a crash never leaves it half-written)."""
     progress_file = get_progress_file(lang)
-    with open(progress_file, "w", encoding="utf-8") as f:
+    tmp_file = progress_file.with_suffix(".json.tmp")
+    with open(tmp_file, "w", encoding="utf-8") as f:
         json.dump(progress, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, progress_file)
+
+
+class RunawayDetector:
+    """Watch streamed chapter text for signs the model is looping or overshooting."""
+
+    def __init__(self, word_target):
+        self.max_words = int(word_target * OVERSHOOT_FACTOR)
+        self.max_chars = self.max_words * MAX_CHARS_PER_WORD
+        self.text = ""
+        self.words = []
+        self.content_words = []
+        self.ngrams = {}
+        self.paragraphs = {}
+        self._checked_paragraphs = 0
+        self._pending_word = ""
+        self._char_run = ("", 0)
+
+    def feed(self, chunk):
+        """Add a chunk of text; return a reason string if output has run away."""
+        self.text += chunk
+
+        char, run = self._char_run
+        for ch in chunk:
+            run = run + 1 if ch == char else 1
+            char = ch
+            if run > MAX_CHAR_RUN:
+                return f"{run} repeated {ch!r} characters"
+        self._char_run = (char, run)
+
+        if len(self.text) > self.max_chars:
+            return f"over {self.max_chars} characters"
+
+        # Only count words once a following separator shows they are complete
+        tokens = (self._pending_word + chunk).split()
+        if chunk and not chunk[-1].isspace():
+            self._pending_word = tokens.pop() if tokens else ""
+        else:
+            self._pending_word = ""
+        for word in tokens:
+            self.words.append(word)
+            if not any(ch.isalnum() for ch in word):
+                continue  # table pipes, rules and bullets repeat legitimately
+            self.content_words.append(word)
+            if len(self.content_words) >= REPEAT_NGRAM:
+                ngram = " ".join(self.content_words[-REPEAT_NGRAM:])
+                self.ngrams[ngram] = self.ngrams.get(ngram, 0) + 1
+                if self.ngrams[ngram] >= MAX_NGRAM_REPEATS:
+                    return f"{REPEAT_NGRAM}-word phrase repeated {MAX_NGRAM_REPEATS} times"
+
+        if len(self.words) > self.max_words:
+            return f"over {self.max_words} words"
+
+        # Paragraphs are complete once followed by a blank line
+        paragraphs = self.text.split("\n\n")[:-1]
+        for paragraph in paragraphs[self._checked_paragraphs:]:
+            paragraph = " ".join(paragraph.split())
+            if len(paragraph) >= MIN_REPEAT_PARAGRAPH:
+                self.paragraphs[paragraph] = self.paragraphs.get(paragraph, 0) + 1
+                if self.paragraphs[paragraph] >= MAX_PARAGRAPH_REPEATS:
+                    return f"paragraph repeated {MAX_PARAGRAPH_REPEATS} times"
+        self._checked_paragraphs = len(paragraphs)
+
+        return None
+
+
+def chapter_config(attempt):
+    """Generation config for a chapter attempt; retries after a runaway run cooler."""
+    return types.GenerateContentConfig(
+        temperature=max(0.2, 0.7 - 0.25 * attempt),
+        max_output_tokens=16000,
+    )
 
 
-def write_chapter_arabic(client, chapter_info, book_spec, previous_chapters_summary=""):
-    """Generate a single chapter in Arabic using AI."""
+def resume_prompt(prompt, partial, lang):
+    """Extend a chapter prompt so the model continues an interrupted draft."""
+    if lang == "ar":
+        return f"""{prompt}
 
-    sections_list = "\n".join([f"- {s}" for s in chapter_info['sections_ar']])
-    reference = chapter_info.get('reference', 'المصادر الرسمية السعودية')
+## ما كُتب حتى الآن
+{partial}
 
-    prompt = f"""أنت مؤلف كتاب متخصص في الأنظمة السعودية للشركات التقنية. اكتب الفصل التالي بالعربية الفصحى بأسلوب عملي ومهني.
+أكمل الفصل من حيث توقف النص أعلاه تماماً، دون تكرار أي جزء منه:
+"""
+    return f"""{prompt}
 
-## معلومات الفصل
-- العنوان: {chapter_info['title_ar']}
-- عدد الكلمات المستهدف: {chapter_info['word_target']} كلمة
-- المرجع الأساسي: {reference}
+## Written So Far
+{partial}
 
-## الأقسام المطلوبة
-{sections_list}
+Continue the chapter exactly where the text above stops, without repeating any of it:
+"""
 
-## إرشادات الكتابة
+
+def stream_chapter(client, prompt, chapter_info, lang, section=None, hedge=None, prefix=None):
+    """Stream a chapter to a partial file, aborting and retrying on runaway output.
+
+    Text is appended to <id>.partial.md (or <id>.section_NN.partial.md when
+    streaming one section) as it arrives, so an interrupted run resumes from the
+    last complete paragraph instead of starting over. With a hedge policy, a
+    slow call is raced against a duplicate; only the original writes the
+    partial file. With a prefix cache, the prompt is only the chapter-specific
+    tail and the call references the cached book context.
+    """
+
+    chapters_dir = CHAPTERS_DIR_AR if lang == "ar" else CHAPTERS_DIR_EN
+    part_name = chapter_info['id'] if section is None else f"{chapter_info['id']}.section_{section:02d}"
+    partial_file = chapters_dir / f"{part_name}.partial.md"
+    word_target = chapter_info['word_target']
+    if section is not None:
+        word_target //= len(chapter_info['sections_en'])
+
+    for attempt in range(MAX_CHAPTER_ATTEMPTS):
+        partial = ""
+        if partial_file.exists():
+            partial = partial_file.read_text(encoding="utf-8").rpartition("\n\n")[0]
+        detector = RunawayDetector(word_target)
+        if partial and detector.feed(partial + "\n\n"):
+            # The leftover draft is itself degenerate; start this attempt fresh
+            partial = ""
+            detector = RunawayDetector(word_target)
+        if partial:
+            log(lang, f"     Resuming from partial draft ({len(partial.split())} words)")
+        partial_file.write_text(partial + "\n\n" if partial else "", encoding="utf-8")
+
+        contents = [resume_prompt(prompt, partial, lang) if partial else prompt]
+        config = chapter_config(attempt)
+        if prefix:
+            config = prefix.apply(config, lang)
+        reason = None
+
+        if hedge:
+            with open(partial_file, "a", encoding="utf-8") as f:
+                def make_watch(role):
+                    racer_detector = detector
+                    if role != "primary":
+                        racer_detector = RunawayDetector(word_target)
+                        racer_detector.feed(partial + "\n\n" if partial else "")
+
+                    def watch(text):
+                        if role == "primary":
+                            f.write(text)
+                            f.flush()
+                        return racer_detector.feed(text)
+                    return watch
+
+                text, reason = race_stream(client, CHAPTER_MODEL, contents, config, hedge, word_target,
+                                           make_watch)
+            content = (partial + "\n\n" if partial else "") + text
+        else:
+            stream = client.generate_content_stream(model=CHAPTER_MODEL, contents=contents, config=config)
+            with open(partial_file, "a", encoding="utf-8") as f:
+                for chunk in stream:
+                    text = chunk.text or ""
+                    f.write(text)
+                    f.flush()
+                    reason = detector.feed(text)
+                    if reason:
+                        stream.close()
+                        break
+            content = detector.text
+
+        if not reason:
+            partial_file.unlink()
+            return content
+
+        log(lang, f"     [!] Runaway output after {len(detector.words)} words: {reason}")
+        partial_file.unlink()
+        if attempt + 1 < MAX_CHAPTER_ATTEMPTS:
+            log(lang, f"     Retrying with adjusted config ({attempt + 2}/{MAX_CHAPTER_ATTEMPTS})")
+
+    raise RuntimeError(f"Chapter {part_name} kept running away after "
+                       f"{MAX_CHAPTER_ATTEMPTS} attempts")
+
+
+def summary_instruction(lang):
+    """Prompt suffix asking for the chapter summary after a delimiter line."""
+    if lang == "ar":
+        return f"""
+بعد انتهاء الفصل، اكتب سطراً يحتوي فقط على {SUMMARY_DELIMITER} ثم ملخصاً مختصراً (٣-٥ جمل) للفصل بالعربية.
+"""
+    return f"""
+After the chapter, write a line containing only {SUMMARY_DELIMITER} followed by a brief summary (3-5 sentences) of the chapter in English.
+"""
+
+
+def split_inline_summary(text):
+    """Split a response into (chapter, summary); summary is None if the delimiter is missing."""
+    chapter, delimiter, summary = text.rpartition(SUMMARY_DELIMITER)
+    if not delimiter or not summary.strip():
+        return text, None
+    return chapter.rstrip() + "\n", summary.strip()
+
+
+# Parts of the chapter prompts shared by every chapter; with a prefix cache
+# they are sent once per language instead of with every call
+AUTHOR_AR = "أنت مؤلف كتاب متخصص في الأنظمة السعودية للشركات التقنية."
+
+GUIDELINES_AR = """## إرشادات الكتابة
 1. اكتب بالعربية الفصحى مع استخدام المصطلحات الإنجليزية التقنية عند الضرورة
 2. استخدم أسلوباً عملياً مباشراً يخاطب رواد الأعمال والمطورين
 3. أضف أمثلة عملية من واقع السوق السعودي
@@ -488,97 +701,396 @@ def write_chapter_arabic(client, chapter_info, book_spec, previous_chapters_summ
 5. اجعل المحتوى قابلاً للتطبيق مباشرة
 6. تجنب اللغة القانونية المعقدة - بسّط المفاهيم
 7. أضف نصائح عملية وتحذيرات من الأخطاء الشائعة
-8. اذكر المواد القانونية المحددة عند الإشارة للأنظمة
+8. اذكر المواد القانونية المحددة عند الإشارة للأنظمة"""
 
-## سياق الكتاب
+BOOK_CONTEXT_AR = """## سياق الكتاب
 هذا الكتاب بعنوان "البوصلة القانونية لشركات التقنية في السعودية" يستهدف:
 - رواد الأعمال السعوديين في قطاع التقنية
 - الشركات الأجنبية الراغبة في دخول السوق السعودي
 - المبرمجين ومديري المشاريع
-- المستثمرين في قطاع التقنية
-
-{f"## ملخص الفصول السابقة{chr(10)}{previous_chapters_summary}" if previous_chapters_summary else ""}
+- المستثمرين في قطاع التقنية"""
 
-## التنسيق
+FORMATTING_AR = """## التنسيق
 - استخدم Markdown للتنسيق
 - ابدأ بالعنوان الرئيسي (#)
 - استخدم العناوين الفرعية (## و ###)
 - أضف قوائم مرقمة ونقطية
 - استخدم الجداول للمقارنات
-- أضف اقتباسات للنصوص القانونية المهمة (>)
+- أضف اقتباسات للنصوص القانونية المهمة (>)"""
+
+AUTHOR_EN = "You are an expert author specializing in Saudi regulations for tech companies."
+
+GUIDELINES_EN = """## Writing Guidelines
+1. Write in clear, professional English accessible to international readers
+2. Use a practical, direct style addressing entrepreneurs and developers
+3. Add practical examples from the Saudi market context
+4. Use lists and tables where appropriate
+5. Make content immediately actionable
+6. Avoid complex legal jargon - simplify concepts
+7. Add practical tips and warnings about common mistakes
+8. Reference specific legal articles when citing regulations
+9. Include Arabic terms in parentheses where relevant (e.g., "Saudization (Nitaqat)")"""
+
+BOOK_CONTEXT_EN = """## Book Context
+This book titled "The Legal Compass for Tech Companies in Saudi Arabia" targets:
+- Saudi tech entrepreneurs
+- Foreign companies wanting to enter the Saudi market
+- Developers and project managers
+- Tech sector investors"""
+
+FORMATTING_EN = """## Formatting
+- Use Markdown formatting
+- Start with main heading (#)
+- Use subheadings (## and ###)
+- Add numbered and bulleted lists
+- Use tables for comparisons
+- Add blockquotes for important legal texts (>)"""
+
+
+def shared_prefix(lang, book_spec):
+    """The part of every chapter prompt that never changes: role, guidelines, audience and book spec."""
+    if lang == "ar":
+        return f"""{AUTHOR_AR} ستكتب فصول هذا الكتاب وأقسامه واحداً تلو الآخر بالعربية الفصحى بأسلوب عملي ومهني، وفق الإرشادات ومواصفات الكتاب التالية.
+
+{GUIDELINES_AR}
+
+{BOOK_CONTEXT_AR}
+
+{FORMATTING_AR}
+
+## مواصفات الكتاب
+{book_spec}
+"""
+    return f"""{AUTHOR_EN} You will write this book's chapters and sections one at a time in clear, professional English with a practical approach, following the guidelines and book specification below.
+
+{GUIDELINES_EN}
+
+{BOOK_CONTEXT_EN}
+
+{FORMATTING_EN}
+
+## Book Specification
+{book_spec}
+"""
+
+
+def chapter_prompt_arabic(chapter_info, previous_chapters_summary="", cached_prefix=False):
+    """Build the prompt for a whole chapter in Arabic (only the chapter-specific tail with cached_prefix)."""
+
+    sections_list = "\n".join([f"- {s}" for s in chapter_info['sections_ar']])
+    reference = chapter_info.get('reference', 'المصادر الرسمية السعودية')
+    chapter = f"""## معلومات الفصل
+- العنوان: {chapter_info['title_ar']}
+- عدد الكلمات المستهدف: {chapter_info['word_target']} كلمة
+- المرجع الأساسي: {reference}
+
+## الأقسام المطلوبة
+{sections_list}"""
+    previous = f"## ملخص الفصول السابقة{chr(10)}{previous_chapters_summary}" if previous_chapters_summary else ""
+
+    if cached_prefix:
+        return f"""اكتب الفصل التالي من الكتاب.
+
+{chapter}
+
+{previous}
 
 اكتب الفصل كاملاً الآن:
 """
 
-    response = client.models.generate_content(
-        model="gemini-3-flash-preview",
-        contents=[prompt],
-        config=types.GenerateContentConfig(
-            temperature=0.7,
-            max_output_tokens=16000,
-        )
-    )
+    prompt = f"""{AUTHOR_AR} اكتب الفصل التالي بالعربية الفصحى بأسلوب عملي ومهني.
 
-    return response.text
+{chapter}
 
+{GUIDELINES_AR}
 
-def write_chapter_english(client, chapter_info, book_spec, previous_chapters_summary=""):
-    """Generate a single chapter in English using AI."""
+{BOOK_CONTEXT_AR}
+
+{previous}
+
+{FORMATTING_AR}
+
+اكتب الفصل كاملاً الآن:
+"""
+
+    return prompt
 
-    sections_list = "\n".join([f"- {s}" for s in chapter_info['sections_en']])
-    reference = chapter_info.get('reference', 'Official Saudi Sources')
 
-    prompt = f"""You are an expert author specializing in Saudi regulations for tech companies. Write the following chapter in clear, professional English with a practical approach.
+def chapter_prompt_english(chapter_info, previous_chapters_summary="", cached_prefix=False):
+    """Build the prompt for a whole chapter in English (only the chapter-specific tail with cached_prefix)."""
 
-## Chapter Information
+    sections_list = "\n".join([f"- {s}" for s in chapter_info['sections_en']])
+    reference = chapter_info.get('reference', 'Official Saudi Sources')
+    chapter = f"""## Chapter Information
 - Title: {chapter_info['title_en']}
 - Target word count: {chapter_info['word_target']} words
 - Primary reference: {reference}
 
 ## Required Sections
+{sections_list}"""
+    previous = f"## Summary of Previous Chapters{chr(10)}{previous_chapters_summary}" if previous_chapters_summary else ""
+
+    if cached_prefix:
+        return f"""Write the following chapter of the book.
+
+{chapter}
+
+{previous}
+
+Write the complete chapter now:
+"""
+
+    prompt = f"""{AUTHOR_EN} Write the following chapter in clear, professional English with a practical approach.
+
+{chapter}
+
+{GUIDELINES_EN}
+
+{BOOK_CONTEXT_EN}
+
+{previous}
+
+{FORMATTING_EN}
+
+Write the complete chapter now:
+"""
+
+    return prompt
+
+
+def chapter_prompt(chapter_info, lang, previous_chapters_summary="", inline_summary=False, cached_prefix=False):
+    """Build the whole-chapter prompt, optionally asking for the summary inline."""
+    if lang == "ar":
+        prompt = chapter_prompt_arabic(chapter_info, previous_chapters_summary, cached_prefix)
+    else:
+        prompt = chapter_prompt_english(chapter_info, previous_chapters_summary, cached_prefix)
+    if inline_summary:
+        prompt += summary_instruction(lang)
+    return prompt
+
+
+def write_chapter_arabic(client, chapter_info, book_spec, previous_chapters_summary="", inline_summary=False,
+                         hedge=None, prefix=None):
+    """Generate a single chapter in Arabic using AI."""
+    prompt = chapter_prompt(chapter_info, "ar", previous_chapters_summary, inline_summary, prefix is not None)
+    return stream_chapter(client, prompt, chapter_info, "ar", hedge=hedge, prefix=prefix)
+
+
+def write_chapter_english(client, chapter_info, book_spec, previous_chapters_summary="", inline_summary=False,
+                          hedge=None, prefix=None):
+    """Generate a single chapter in English using AI."""
+    prompt = chapter_prompt(chapter_info, "en", previous_chapters_summary, inline_summary, prefix is not None)
+    return stream_chapter(client, prompt, chapter_info, "en", hedge=hedge, prefix=prefix)
+
+
+def section_prompt(chapter_info, index, lang, previous_chapters_summary="", cached_prefix=False):
+    """Build the prompt for one section of a chapter written section by section.
+
+    With cached_prefix only the section-specific tail is returned; the
+    guidelines come from the shared prefix.
+    """
+
+    sections = chapter_info['sections_ar'] if lang == "ar" else chapter_info['sections_en']
+    section = sections[index]
+    words = chapter_info['word_target'] // len(sections)
+    sections_list = "\n".join([f"- {s}" for s in sections])
+
+    if lang == "ar":
+        reference = chapter_info.get('reference', 'المصادر الرسمية السعودية')
+        details = f"""## معلومات الفصل
+- عنوان الفصل: {chapter_info['title_ar']}
+- المرجع الأساسي: {reference}
+- أقسام الفصل كاملة (تُكتب الأقسام الأخرى بشكل منفصل):
+{sections_list}
+
+## القسم المطلوب
+- العنوان: {section}
+- عدد الكلمات المستهدف: {words} كلمة"""
+        previous = f"## ملخص الفصول السابقة{chr(10)}{previous_chapters_summary}" if previous_chapters_summary else ""
+
+        if cached_prefix:
+            return f"""اكتب قسماً واحداً من أحد فصول الكتاب، دون تكرار محتوى الأقسام الأخرى من الفصل.
+
+{details}
+
+{previous}
+
+ابدأ بعنوان القسم كما هو (## {section})، واستخدم ### للعناوين الفرعية، ولا تكتب عنوان الفصل (#).
+
+اكتب القسم كاملاً الآن:
+"""
+
+        return f"""{AUTHOR_AR} اكتب قسماً واحداً من أحد فصول الكتاب بالعربية الفصحى بأسلوب عملي ومهني.
+
+{details}
+
+## إرشادات الكتابة
+1. اكتب بالعربية الفصحى مع استخدام المصطلحات الإنجليزية التقنية عند الضرورة
+2. استخدم أسلوباً عملياً مباشراً يخاطب رواد الأعمال والمطورين
+3. أضف أمثلة عملية من واقع السوق السعودي
+4. اذكر المواد القانونية المحددة عند الإشارة للأنظمة
+5. لا تكرر محتوى الأقسام الأخرى من الفصل
+
+{previous}
+
+## التنسيق
+- استخدم Markdown للتنسيق
+- ابدأ بعنوان القسم كما هو (## {section})
+- استخدم ### للعناوين الفرعية، ولا تكتب عنوان الفصل (#)
+- استخدم القوائم والجداول والاقتباسات (>) عند الحاجة
+
+اكتب القسم كاملاً الآن:
+"""
+
+    reference = chapter_info.get('reference', 'Official Saudi Sources')
+    details = f"""## Chapter Information
+- Chapter title: {chapter_info['title_en']}
+- Primary reference: {reference}
+- All sections of the chapter (the others are written separately):
 {sections_list}
 
+## Section to Write
+- Title: {section}
+- Target word count: {words} words"""
+    previous = f"## Summary of Previous Chapters{chr(10)}{previous_chapters_summary}" if previous_chapters_summary else ""
+
+    if cached_prefix:
+        return f"""Write one section of a book chapter, without repeating material that belongs to the chapter's other sections.
+
+{details}
+
+{previous}
+
+Start with the section heading exactly as given (## {section}), use ### for subheadings and do not write the chapter heading (#).
+
+Write the complete section now:
+"""
+
+    return f"""{AUTHOR_EN} Write one section of a book chapter in clear, professional English with a practical approach.
+
+{details}
+
 ## Writing Guidelines
 1. Write in clear, professional English accessible to international readers
 2. Use a practical, direct style addressing entrepreneurs and developers
 3. Add practical examples from the Saudi market context
-4. Use lists and tables where appropriate
-5. Make content immediately actionable
-6. Avoid complex legal jargon - simplify concepts
-7. Add practical tips and warnings about common mistakes
-8. Reference specific legal articles when citing regulations
-9. Include Arabic terms in parentheses where relevant (e.g., "Saudization (Nitaqat)")
-
-## Book Context
-This book titled "The Legal Compass for Tech Companies in Saudi Arabia" targets:
-- Saudi tech entrepreneurs
-- Foreign companies wanting to enter the Saudi market
-- Developers and project managers
-- Tech sector investors
+4. Reference specific legal articles when citing regulations
+5. Include Arabic terms in parentheses where relevant (e.g., "Saudization (Nitaqat)")
+6. Do not repeat material that belongs to the chapter's other sections
 
-{f"## Summary of Previous Chapters{chr(10)}{previous_chapters_summary}" if previous_chapters_summary else ""}
+{previous}
 
 ## Formatting
 - Use Markdown formatting
-- Start with main heading (#)
-- Use subheadings (## and ###)
-- Add numbered and bulleted lists
-- Use tables for comparisons
-- Add blockquotes for important legal texts (>)
+- Start with the section heading exactly as given (## {section})
+- Use ### for subheadings and do not write the chapter heading (#)
+- Use lists, tables and blockquotes (>) where appropriate
 
-Write the complete chapter now:
+Write the complete section now:
 """
 
-    response = client.models.generate_content(
-        model="gemini-3-flash-preview",
-        contents=[prompt],
-        config=types.GenerateContentConfig(
-            temperature=0.7,
-            max_output_tokens=16000,
-        )
-    )
 
-    return response.text
+def section_markdown(text, title, level=2):
+    """Normalise a generated section: drop any chapter heading the model added
+    and make sure it opens with its own heading at the given level."""
+    text = re.sub(r"^#\s+.+\n+", "", text.strip())
+    if text.startswith("## "):
+        text = "#" * level + text[2:]
+    else:
+        text = f"{'#' * level} {title}\n\n{text}"
+    return text
+
+
+def write_chapter_by_sections(client, chapter_info, lang, previous_chapters_summary="", hedge=None, prefix=None):
+    """Generate every section of a chapter concurrently and stitch them in order.
+
+    Finished sections are kept as <id>.section_NN.md until the chapter is
+    stitched, so a failed section is retried on its own without discarding
+    the others, even across runs. <id>.sections.json holds the chapter
+    fingerprint they were written with; section files (and partial drafts)
+    left by a run with another spec, prompt or model, or with no record of
+    one, are discarded.
+    """
+
+    chapters_dir = CHAPTERS_DIR_AR if lang == "ar" else CHAPTERS_DIR_EN
+    sections = chapter_info['sections_ar'] if lang == "ar" else chapter_info['sections_en']
+    title = chapter_info['title_ar'] if lang == "ar" else chapter_info['title_en']
+
+    record_file = chapters_dir / f"{chapter_info['id']}.sections.json"
+    current = chapter_fingerprint(chapter_info, lang, by_sections=True,
+                                  served_model=client.backend.model_name(CHAPTER_MODEL))
+    leftovers = sorted(chapters_dir.glob(f"{chapter_info['id']}.section_*.md"))
+    recorded = json.loads(record_file.read_text(encoding="utf-8")) if record_file.exists() else None
+    if leftovers and recorded != current:
+        log(lang, f"     Discarding {len(leftovers)} section drafts written from another spec, prompt or model")
+        for leftover in leftovers:
+            leftover.unlink()
+    tmp_file = record_file.with_suffix(".json.tmp")
+    tmp_file.write_text(json.dumps(current, indent=2), encoding="utf-8")
+    os.replace(tmp_file, record_file)
+
+    def section_file(index):
+        return chapters_dir / f"{chapter_info['id']}.section_{index:02d}.md"
+
+    def write_section(index):
+        done_file = section_file(index)
+        if done_file.exists():
+            return done_file.read_text(encoding="utf-8")
+
+        prompt = section_prompt(chapter_info, index, lang, previous_chapters_summary, prefix is not None)
+        for attempt in range(1, MAX_SECTION_ATTEMPTS + 1):
+            try:
+                with call_context(item=chapter_info['id'], lang=lang, kind="section", section=index):
+                    text = stream_chapter(client, prompt, chapter_info, lang, section=index,
+                                          hedge=hedge, prefix=prefix).strip()
+                break
+            except Exception as e:
+                if attempt == MAX_SECTION_ATTEMPTS:
+                    raise
+                log(lang, f"     [!] Section {index + 1} failed ({e}); retrying ({attempt + 1}/{MAX_SECTION_ATTEMPTS})")
+
+        text = section_markdown(text, sections[index])
+        done_file.write_text(text, encoding="utf-8")
+        return text
+
+    with ThreadPoolExecutor(max_workers=len(sections)) as executor:
+        section_texts = list(executor.map(write_section, range(len(sections))))
+
+    for index in range(len(sections)):
+        section_file(index).unlink()
+    record_file.unlink()
+
+    return f"# {title}\n\n" + "\n\n".join(section_texts) + "\n"
+
+
+def repair_chapter(client, chapter_info, content, lang, previous_chapters_summary="", hedge=None, prefix=None):
+    """Check a chapter against its spec and rewrite only its missing or truncated sections.
+
+    The sections are generated concurrently with the section prompt and
+    spliced into place. Returns (content, problems found before repair).
+    """
+
+    sections = chapter_info['sections_ar'] if lang == "ar" else chapter_info['sections_en']
+    report = check_chapter(content, sections, chapter_info['word_target'], lang)
+    problems = describe(report)
+    broken = needs_repair(report)
+    if not broken:
+        return content, problems
+
+    log(lang, f"     Regenerating {len(broken)} of {len(sections)} sections")
+    level = section_level(report)
+
+    def write_section(entry):
+        index = entry['index']
+        prompt = section_prompt(chapter_info, index, lang, previous_chapters_summary, prefix is not None)
+        with call_context(item=chapter_info['id'], lang=lang, kind="section", section=index, repair=True):
+            text = stream_chapter(client, prompt, chapter_info, lang, section=index, hedge=hedge, prefix=prefix)
+        return index, section_markdown(text, entry['title'], level)
+
+    with ThreadPoolExecutor(max_workers=len(broken)) as executor:
+        replacements = dict(executor.map(write_section, broken))
+
+    return splice_sections(content, report, replacements), problems
 
 
 def generate_chapter_summary(client, chapter_content, lang):
@@ -597,7 +1109,7 @@ def generate_chapter_summary(client, chapter_content, lang):
 
 Summary:"""
 
-    response = client.models.generate_content(
+    response = client.generate_content(
         model="gemini-3-flash-preview",
         contents=[prompt],
         config=types.GenerateContentConfig(
@@ -609,7 +1121,429 @@ Summary:"""
     return response.text
 
 
-def write_book_in_language(client, book_spec, lang):
+def draft_chapter(client, chapter, book_spec, lang, previous_summary="", by_sections=False,
+                  inline_summary=False, hedge=None, repair=False, prefix=None):
+    """Generate one chapter and save it; returns (content, inline summary or None).
+
+    With repair, sections missing from the draft or cut short are
+    regenerated and spliced in before it is saved.
+    """
+
+    chapters_dir = CHAPTERS_DIR_AR if lang == "ar" else CHAPTERS_DIR_EN
+    chapter_id = chapter['id']
+
+    # Generate chapter
+    summary = None
+    with call_context(item=chapter_id, lang=lang, kind="chapter"):
+        if by_sections:
+            content = write_chapter_by_sections(client, chapter, lang, previous_summary, hedge, prefix)
+        elif lang == "ar":
+            content = write_chapter_arabic(client, chapter, book_spec, previous_summary, inline_summary, hedge,
+                                           prefix)
+        else:
+            content = write_chapter_english(client, chapter, book_spec, previous_summary, inline_summary, hedge,
+                                            prefix)
+    if inline_summary and not by_sections:
+        content, summary = split_inline_summary(content)
+        if summary is None:
+            log(lang, "     [!] No inline summary in response; requesting one separately")
+    if repair:
+        content, problems = repair_chapter(client, chapter, content, lang, previous_summary, hedge, prefix)
+        for problem in problems:
+            log(lang, f"     [!] {chapter_id}: {problem}")
+
+    # Save chapter
+    with open(chapters_dir / f"{chapter_id}.md", "w", encoding="utf-8") as f:
+        f.write(content)
+
+    return content, summary
+
+
+def summarize_chapter(client, chapter, content, lang, summary=None, local_summaries=False):
+    """Save the summary used as context for later chapters, generating it unless given."""
+
+    chapters_dir = CHAPTERS_DIR_AR if lang == "ar" else CHAPTERS_DIR_EN
+    chapter_id = chapter['id']
+    title = chapter['title_ar'] if lang == "ar" else chapter['title_en']
+
+    if summary is None and local_summaries:
+        summary = summarize_locally(content, lang)
+    if summary is None:
+        with call_context(item=chapter_id, lang=lang, kind="summary"):
+            summary = generate_chapter_summary(client, content, lang)
+    summary_file = chapters_dir / f"{chapter_id}_summary.txt"
+    with open(summary_file, "w", encoding="utf-8") as f:
+        f.write(f"## {title}\n{summary}")
+
+    return summary
+
+
+def write_chapter(client, chapter, book_spec, lang, previous_summary="", by_sections=False,
+                  inline_summary=False, local_summaries=False, hedge=None, repair=False, prefix=None):
+    """Generate one chapter and its summary, and save both to disk.
+
+    With inline_summary the summary comes back in the same response as the
+    chapter, saving a second round trip (not available with by_sections).
+    With local_summaries it is extracted from the chapter text locally,
+    without a model call.
+    """
+    content, summary = draft_chapter(client, chapter, book_spec, lang, previous_summary, by_sections,
+                                     inline_summary, hedge, repair, prefix)
+    summary = summarize_chapter(client, chapter, content, lang, summary, local_summaries)
+    return content, summary
+
+
+def translation_prompt(text, source_lang, lang):
+    """Prompt for translating one chapter segment from source_lang into lang."""
+    if lang == "ar":
+        return f"""أنت مترجم متخصص في الأنظمة السعودية للشركات التقنية. ترجم الجزء التالي من كتاب "البوصلة القانونية لشركات التقنية في السعودية" من الإنجليزية إلى العربية الفصحى بأسلوب مهني وعملي.
+
+## قواعد الترجمة
+1. حافظ على بنية Markdown كما هي: نفس العناوين ومستوياتها، والقوائم، والاقتباسات (>)، والروابط
+2. ترجم نصوص خلايا الجداول مع الإبقاء على نفس عدد الصفوف والأعمدة وسطر الفواصل (---)
+3. اترك العناصر مثل ⟦CODE_1⟧ كما هي وفي مكانها دون أي تغيير
+4. استخدم الأسماء العربية الرسمية للأنظمة والجهات السعودية
+5. أبقِ أرقام المواد والمبالغ والتواريخ كما هي
+6. لا تضف أي محتوى ولا تحذف منه، واكتب الترجمة فقط دون أي تعليق
+
+## النص
+{text}
+"""
+    return f"""You are a translator specializing in Saudi regulations for tech companies. Translate the following part of the book "The Legal Compass for Tech Companies in Saudi Arabia" from Arabic into clear, professional English.
+
+## Translation Rules
+1. Keep the Markdown structure exactly: the same headings and heading levels, lists, blockquotes (>) and links
+2. Translate table cell text but keep the same number of rows and columns and the separator row (---)
+3. Leave placeholders such as ⟦CODE_1⟧ unchanged and in place
+4. Use the official English names of Saudi laws and authorities, with the Arabic term in parentheses where helpful (e.g., "Saudization (Nitaqat)")
+5. Keep article numbers, amounts and dates as they are
+6. Do not add or remove content; output only the translation, with no commentary
+
+## Text
+{text}
+"""
+
+
+def translation_config(attempt):
+    """Generation config for a translation attempt; low temperature keeps it close to the source."""
+    return types.GenerateContentConfig(
+        temperature=0.2 if attempt == 0 else 0.0,
+        max_output_tokens=16000,
+    )
+
+
+def translate_segment(client, chapter_id, text, source_lang, lang, index):
+    """Translate one chapter segment, retrying once if its structure comes back changed."""
+    protected, blocks = protect_code(text)
+    for attempt in range(MAX_TRANSLATION_ATTEMPTS):
+        with call_context(item=chapter_id, lang=lang, kind="translation", section=index):
+            response = client.generate_content(
+                model=CHAPTER_MODEL,
+                contents=[translation_prompt(protected, source_lang, lang)],
+                config=translation_config(attempt),
+            )
+        translated = strip_fence(response.text or "")
+        problem = structure_mismatch(protected, translated) if translated else "empty response"
+        if not problem:
+            break
+        retrying = attempt + 1 < MAX_TRANSLATION_ATTEMPTS
+        log(lang, f"     [!] {chapter_id} segment {index}: {problem}; " + ("retrying" if retrying else "keeping it"))
+    # A code block whose placeholder the model dropped still goes in, after its segment
+    missing = [block for i, block in enumerate(blocks, 1) if PLACEHOLDER.format(i) not in translated]
+    return "\n\n".join([restore_code(translated, blocks)] + missing)
+
+
+def translate_chapter(client, chapter, source, source_lang, lang):
+    """Translate a chapter's markdown from source_lang into lang, one concurrent call per section.
+
+    The segments come back in source order, so section n of one edition is
+    section n of the other. The chapter title and the headings of spec
+    sections are set from BOOK_STRUCTURE rather than translated, so both
+    editions use the spec's titles.
+    """
+    segments = split_sections(source)
+    source_sections = chapter['sections_ar'] if source_lang == "ar" else chapter['sections_en']
+    sections = chapter['sections_ar'] if lang == "ar" else chapter['sections_en']
+    report = check_chapter(source, source_sections, chapter['word_target'], source_lang)
+    spec_titles = {entry['heading']: sections[entry['index']] for entry in report['sections']
+                   if entry['level'] == 2 and entry['index'] < len(sections)}
+
+    def translate(index):
+        return translate_segment(client, chapter['id'], segments[index], source_lang, lang, index)
+
+    with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+        translated = list(executor.map(translate, range(len(segments))))
+
+    for i, segment in enumerate(segments):
+        headings = parse_headings(segment)
+        if not headings or headings[0][0] != 0:
+            continue
+        _, level, text = headings[0]
+        if level == 1:
+            translated[i] = replace_heading(translated[i], chapter['title_ar'] if lang == "ar" else chapter['title_en'])
+        elif text in spec_titles:
+            translated[i] = replace_heading(translated[i], spec_titles[text])
+    return "\n\n".join(translated) + "\n"
+
+
+def translate_chapter_file(client, chapter, source_lang, lang):
+    """Translate a finished chapter into lang and save it.
+
+    Returns (content, fingerprint of the source text it was translated from).
+    """
+    source_dir = CHAPTERS_DIR_AR if source_lang == "ar" else CHAPTERS_DIR_EN
+    chapters_dir = CHAPTERS_DIR_AR if lang == "ar" else CHAPTERS_DIR_EN
+    source = (source_dir / f"{chapter['id']}.md").read_text(encoding="utf-8")
+    content = translate_chapter(client, chapter, source, source_lang, lang)
+    with open(chapters_dir / f"{chapter['id']}.md", "w", encoding="utf-8") as f:
+        f.write(content)
+    return content, fingerprint(source)
+
+
+def order_completed(completed):
+    """Sort completed chapter ids into book order."""
+    order = {chapter['id']: i for i, chapter in enumerate(BOOK_STRUCTURE)}
+    return sorted(completed, key=lambda chapter_id: order.get(chapter_id, len(order)))
+
+
+def earlier_chapters(chapter_id, completed):
+    """Completed chapters that come before chapter_id in book order."""
+    order = {chapter['id']: i for i, chapter in enumerate(BOOK_STRUCTURE)}
+    return [c for c in order_completed(completed) if order.get(c, len(order)) < order[chapter_id]]
+
+
+def fingerprint(value):
+    """Short stable hash of a JSON-serialisable value."""
+    payload = json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def chapter_fingerprint(chapter, lang, by_sections=False, inline_summary=False, served_model=CHAPTER_MODEL,
+                        translate_from=None):
+    """Hashes of what a chapter is generated from: its spec, prompt template and model config.
+
+    The prompt is rendered without previous-chapters context, so only edits to
+    the template itself (or the spec fields it shows) change its hash.
+    served_model is the model the backend really uses, so switching from a
+    local draft model to Gemini marks chapters stale. A chapter translated
+    from translate_from is fingerprinted by the translation prompt instead.
+    """
+    other_lang = "_en" if lang == "ar" else "_ar"
+    spec = {key: value for key, value in chapter.items() if not key.endswith(other_lang)}
+    config = chapter_config(0)
+    if translate_from:
+        prompts = [translation_prompt("", translate_from, lang)]
+        config = translation_config(0)
+    elif by_sections:
+        sections = chapter['sections_ar'] if lang == "ar" else chapter['sections_en']
+        prompts = [section_prompt(chapter, i, lang) for i in range(len(sections))]
+    else:
+        prompts = [chapter_prompt(chapter, lang, inline_summary=inline_summary)]
+    config = config.model_dump(mode="json", exclude_none=True)
+    return {
+        "spec": fingerprint(spec),
+        "prompt": fingerprint(prompts),
+        "model": fingerprint([served_model, config]),
+    }
+
+
+def chapter_record(chapter, lang, context_ids, by_sections=False, inline_summary=False,
+                   served_model=CHAPTER_MODEL, translate_from=None, source=None):
+    """Progress entry for a finished chapter: its fingerprint and the chapters it drew context from.
+
+    A translated chapter also records its source language and the
+    fingerprint of the source text, so editing the source retranslates it.
+    """
+    record = {
+        **chapter_fingerprint(chapter, lang, by_sections, inline_summary, served_model, translate_from),
+        "served_model": served_model,
+        "sections": by_sections,
+        "inline_summary": inline_summary,
+        "context": list(context_ids),
+    }
+    if translate_from:
+        record.update(translated_from=translate_from, source=source)
+    return record
+
+
+def source_fingerprint(chapter_id, source_lang):
+    """Fingerprint of a chapter's text in source_lang, or None if it is not written."""
+    chapter_file = (CHAPTERS_DIR_AR if source_lang == "ar" else CHAPTERS_DIR_EN) / f"{chapter_id}.md"
+    if not chapter_file.exists():
+        return None
+    return fingerprint(chapter_file.read_text(encoding="utf-8"))
+
+
+def plan_rebuild(lang, progress, cascade=False, served_model=CHAPTER_MODEL):
+    """Work out which chapters need writing, mapped to the reason why.
+
+    A completed chapter is stale when its spec, prompt template or model config
+    no longer matches its recorded fingerprint, or when it was translated
+    from a source chapter that has changed since. With cascade, chapters whose
+    context summaries came from a rebuilt chapter are rebuilt too.
+    Completed chapters without a fingerprint are assumed current.
+    """
+    records = progress.get("chapters", {})
+    rebuild = {}
+    for chapter in BOOK_STRUCTURE:
+        chapter_id = chapter['id']
+        record = records.get(chapter_id)
+        if chapter_id not in progress['completed']:
+            rebuild[chapter_id] = "not written"
+        elif record:
+            translated_from = record.get("translated_from")
+            current = chapter_fingerprint(chapter, lang, record.get("sections", False),
+                                          record.get("inline_summary", False), served_model, translated_from)
+            changed = [key for key in ("spec", "prompt", "model") if record.get(key) != current[key]]
+            if translated_from and record.get("source") != source_fingerprint(chapter_id, translated_from):
+                changed.append("source")
+            if changed:
+                rebuild[chapter_id] = f"{', '.join(changed)} changed"
+
+    while cascade:
+        added = False
+        for chapter in BOOK_STRUCTURE:
+            chapter_id = chapter['id']
+            record = records.get(chapter_id)
+            if chapter_id in rebuild or not record:
+                continue
+            sources = [c for c in record.get("context", []) if c in rebuild and rebuild[c] != "not written"]
+            if sources:
+                more = f" and {len(sources) - 1} more" if len(sources) > 1 else ""
+                rebuild[chapter_id] = f"context from {sources[0]}{more}"
+                added = True
+        if not added:
+            break
+
+    return rebuild
+
+
+def print_plan(lang, progress, cascade=False, served_model=CHAPTER_MODEL):
+    """Print what a run would write for one language, without writing anything."""
+    rebuild = plan_rebuild(lang, progress, cascade, served_model)
+    records = progress.get("chapters", {})
+    log(lang, f"\nPlan: {len(rebuild)} of {len(BOOK_STRUCTURE)} chapters to write")
+    for chapter in BOOK_STRUCTURE:
+        chapter_id = chapter['id']
+        if chapter_id in rebuild:
+            status = f"write   ({rebuild[chapter_id]})"
+        elif chapter_id in records:
+            status = "current"
+        else:
+            status = "current (no fingerprint yet; recorded on the next run)"
+        log(lang, f"  {chapter_id:<32} {status}")
+
+
+def estimate_tokens(text):
+    """Roughly estimate prompt tokens (~4 chars per token, ~2.5 for Arabic script)."""
+    arabic_chars = sum(1 for ch in text if "\u0600" <= ch <= "\u06ff")
+    return int(arabic_chars / 2.5 + (len(text) - arabic_chars) / 4)
+
+
+def read_summaries(chapters_dir, chapter_ids):
+    """Read the saved summaries for the given chapters, in book order."""
+    summaries = []
+    for chapter_id in order_completed(chapter_ids):
+        summary_file = chapters_dir / f"{chapter_id}_summary.txt"
+        if summary_file.exists():
+            with open(summary_file, "r", encoding="utf-8") as f:
+                summaries.append(f.read().strip())
+    return summaries
+
+
+def build_context_digest(summaries, budget):
+    """Condense chapter summaries into a rolling digest that fits a token budget.
+
+    The most recent chapters keep their full summary. Older ones are reduced to
+    their heading and first sentence, then to the heading alone, and the oldest
+    are dropped once even that no longer fits.
+    """
+
+    def render(summary, level):
+        heading, _, body = summary.partition("\n")
+        if level == 0:
+            return summary
+        if level == 1:
+            first_sentence = re.split(r"(?<=[.!?؟])\s+", body.strip(), maxsplit=1)[0]
+            return f"{heading}\n{first_sentence}"
+        return heading
+
+    chosen = []
+    used = 0
+    level = 0
+    for summary in reversed(summaries):
+        while level < 3:
+            text = render(summary, level)
+            cost = estimate_tokens(text + "\n\n")
+            if used + cost <= budget:
+                chosen.append(text)
+                used += cost
+                break
+            level += 1
+        else:
+            break
+
+    return "\n\n".join(reversed(chosen))
+
+
+def previous_chapters_context(lang, completed, previous_summary, context_budget=None):
+    """Return the previous-chapters context for the next chapter prompt.
+
+    Without a budget this is the full summary history. With one, it is a digest
+    built from the *_summary.txt files, and the saving is reported.
+    """
+    if not context_budget:
+        return previous_summary
+
+    chapters_dir = CHAPTERS_DIR_AR if lang == "ar" else CHAPTERS_DIR_EN
+    digest = build_context_digest(read_summaries(chapters_dir, completed), context_budget)
+    full_tokens = estimate_tokens(previous_summary)
+    digest_tokens = estimate_tokens(digest)
+    log(lang, f"     Context: ~{digest_tokens} tokens (saved ~{full_tokens - digest_tokens} "
+              f"of ~{full_tokens} vs full history)")
+    return digest
+
+
+def refresh_progress(lang, progress, by_sections=False, inline_summary=False, cascade=False,
+                     served_model=CHAPTER_MODEL):
+    """Drop stale chapters from the completed list so they are written again.
+
+    Chapters completed before fingerprints were recorded are assumed current
+    and fingerprinted now.
+    """
+    records = progress.setdefault("chapters", {})
+    untracked = [c for c in BOOK_STRUCTURE if c['id'] in progress['completed'] and c['id'] not in records]
+    for chapter in untracked:
+        records[chapter['id']] = chapter_record(chapter, lang, earlier_chapters(chapter['id'], progress['completed']),
+                                                by_sections, inline_summary, served_model)
+    if untracked:
+        log(lang, f"Recorded fingerprints for {len(untracked)} previously completed chapters")
+
+    stale = {chapter_id: reason for chapter_id, reason in plan_rebuild(lang, progress, cascade, served_model).items()
+             if chapter_id in progress['completed']}
+    for chapter_id, reason in stale.items():
+        log(lang, f"[~] {chapter_id} is stale ({reason}); rewriting")
+    progress['completed'] = [c for c in progress['completed'] if c not in stale]
+    save_progress(lang, progress)
+
+
+def summaries_before(lang, chapter_id, completed, previous_summary):
+    """Return (chapter ids, summary text) of the completed chapters before chapter_id.
+
+    Normally every completed chapter comes first and the running summary is
+    used as is; when a stale chapter is rewritten mid-book, the later chapters'
+    summaries are left out.
+    """
+    earlier = earlier_chapters(chapter_id, completed)
+    if len(earlier) == len(completed):
+        return earlier, previous_summary
+    chapters_dir = CHAPTERS_DIR_AR if lang == "ar" else CHAPTERS_DIR_EN
+    return earlier, "\n\n".join(read_summaries(chapters_dir, earlier))
+
+
+def write_book_in_language(client, book_spec, lang, workers=1, context_budget=None, by_sections=False,
+                           inline_summary=False, local_summaries=False, cascade=False, hedge=None,
+                           repair=False, prefix=None):
     """Write the entire book in a specific language."""
 
     lang_name = "Arabic" if lang == "ar" else "English"
@@ -617,13 +1551,15 @@ def write_book_in_language(client, book_spec, lang):
     chapters_dir.mkdir(exist_ok=True)
 
     progress = load_progress(lang)
+    served_model = client.backend.model_name(CHAPTER_MODEL)
+    refresh_progress(lang, progress, by_sections, inline_summary, cascade, served_model)
 
-    print(f"\n{'='*60}")
-    print(f"Writing {lang_name} Version")
-    print(f"{'='*60}")
-    print(f"Total chapters: {len(BOOK_STRUCTURE)}")
-    print(f"Completed: {len(progress['completed'])}")
-    print("-" * 40)
+    log(lang, f"\n{'='*60}")
+    log(lang, f"Writing {lang_name} Version")
+    log(lang, f"{'='*60}")
+    log(lang, f"Total chapters: {len(BOOK_STRUCTURE)}")
+    log(lang, f"Completed: {len(progress['completed'])}")
+    log(lang, "-" * 40)
 
     # Build summary of previous chapters
     summaries = []
@@ -635,6 +1571,11 @@ def write_book_in_language(client, book_spec, lang):
 
     previous_summary = "\n\n".join(summaries) if summaries else ""
 
+    if workers > 1:
+        return write_book_concurrently(client, book_spec, lang, progress, previous_summary, workers,
+                                       context_budget, by_sections, inline_summary, local_summaries, hedge,
+                                       repair, prefix)
+
     # Process each chapter
     for chapter in BOOK_STRUCTURE:
         chapter_id = chapter['id']
@@ -643,78 +1584,575 @@ def write_book_in_language(client, book_spec, lang):
 
         # Skip completed chapters
         if chapter_id in progress['completed']:
-            print(f"\n[✓] {title} - already completed")
+            log(lang, f"\n[✓] {title} - already completed")
             continue
 
-        print(f"\n[...] Writing: {title}")
-        print(f"     Target: {chapter['word_target']} words")
+        log(lang, f"\n[...] Writing: {title}")
+        log(lang, f"     Target: {chapter['word_target']} words")
 
         # Mark as in progress
-        progress['in_progress'] = chapter_id
+        progress['in_progress'] = [chapter_id]
         save_progress(lang, progress)
 
         try:
-            # Generate chapter
-            if lang == "ar":
-                content = write_chapter_arabic(client, chapter, book_spec, previous_summary)
-            else:
-                content = write_chapter_english(client, chapter, book_spec, previous_summary)
-
-            # Save chapter
-            with open(chapter_file, "w", encoding="utf-8") as f:
-                f.write(content)
-
-            # Generate and save summary for context
-            summary = generate_chapter_summary(client, content, lang)
-            summary_file = chapters_dir / f"{chapter_id}_summary.txt"
-            with open(summary_file, "w", encoding="utf-8") as f:
-                f.write(f"## {title}\n{summary}")
+            context_ids, chapter_summary = summaries_before(lang, chapter_id, progress['completed'],
+                                                            previous_summary)
+            context = previous_chapters_context(lang, context_ids, chapter_summary, context_budget)
+            content, summary = write_chapter(client, chapter, book_spec, lang, context, by_sections,
+                                             inline_summary, local_summaries, hedge, repair, prefix)
 
             # Update summaries for next chapter
             previous_summary += f"\n\n## {title}\n{summary}"
 
             # Mark as completed
-            progress['completed'].append(chapter_id)
-            progress['in_progress'] = None
+            progress['completed'] = order_completed(progress['completed'] + [chapter_id])
+            progress['chapters'][chapter_id] = chapter_record(chapter, lang, context_ids, by_sections,
+                                                              inline_summary, served_model)
+            progress['in_progress'] = []
             save_progress(lang, progress)
 
             # Count words
             word_count = len(content.split())
-            print(f"[✓] Completed: {chapter_file.name} ({word_count} words)")
+            log(lang, f"[✓] Completed: {chapter_file.name} ({word_count} words)")
 
         except Exception as e:
-            print(f"[✗] Error writing chapter: {e}")
-            progress['in_progress'] = None
+            log(lang, f"[✗] Error writing chapter: {e}")
+            progress['in_progress'] = []
             save_progress(lang, progress)
             raise
 
     return progress
 
 
+def write_book_concurrently(client, book_spec, lang, progress, previous_summary, workers,
+                            context_budget=None, by_sections=False, inline_summary=False,
+                            local_summaries=False, hedge=None, repair=False, prefix=None):
+    """Write the remaining chapters with a bounded pool of worker threads.
+
+    Chapters run independently, so each one only sees the summaries of
+    chapters that were already completed when the run started. If a chapter
+    fails, chapters not yet started are cancelled, the ones in flight are
+    allowed to finish and are recorded, and then the first error is raised.
+    """
+
+    progress_lock = threading.Lock()
+    in_flight = set()
+    served_model = client.backend.model_name(CHAPTER_MODEL)
+
+    pending = [c for c in BOOK_STRUCTURE if c['id'] not in progress['completed']]
+    for chapter in BOOK_STRUCTURE:
+        if chapter['id'] in progress['completed']:
+            title = chapter['title_ar'] if lang == "ar" else chapter['title_en']
+            log(lang, f"\n[✓] {title} - already completed")
+
+    log(lang, f"\nWriting {len(pending)} chapters with {workers} workers...")
+    completed_at_start = list(progress['completed'])
+    context = previous_chapters_context(lang, completed_at_start, previous_summary, context_budget)
+
+    def run(chapter):
+        with progress_lock:
+            in_flight.add(chapter['id'])
+            progress['in_progress'] = order_completed(in_flight)
+            save_progress(lang, progress)
+        try:
+            context_ids, chapter_summary = summaries_before(lang, chapter['id'], completed_at_start,
+                                                            previous_summary)
+            chapter_context = context
+            if chapter_summary is not previous_summary:
+                chapter_context = previous_chapters_context(lang, context_ids, chapter_summary, context_budget)
+            content, _ = write_chapter(client, chapter, book_spec, lang, chapter_context, by_sections,
+                                       inline_summary, local_summaries, hedge, repair, prefix)
+            return content, context_ids
+        finally:
+            with progress_lock:
+                in_flight.discard(chapter['id'])
+                progress['in_progress'] = order_completed(in_flight)
+                save_progress(lang, progress)
+
+    error = None
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run, chapter): chapter for chapter in pending}
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            chapter = futures[future]
+            title = chapter['title_ar'] if lang == "ar" else chapter['title_en']
+            try:
+                content, context_ids = future.result()
+            except Exception as e:
+                log(lang, f"[✗] Error writing chapter {chapter['id']}: {e}")
+                if error is None:
+                    error = e
+                    for other in futures:
+                        other.cancel()
+                continue
+
+            # Mark as completed
+            with progress_lock:
+                progress['completed'] = order_completed(progress['completed'] + [chapter['id']])
+                progress['chapters'][chapter['id']] = chapter_record(chapter, lang, context_ids, by_sections,
+                                                                     inline_summary, served_model)
+                save_progress(lang, progress)
+
+            done += 1
+            word_count = len(content.split())
+            log(lang, f"[✓] ({done}/{len(pending)}) Completed: {title} - {chapter['id']}.md ({word_count} words)")
+
+    if error is not None:
+        raise error
+    return progress
+
+
+def translate_book_in_language(client, lang, source_lang, workers=1, source_run=None):
+    """Translate the book into lang from the finished source_lang chapters.
+
+    Chapters are picked up as soon as the source has them, so with
+    source_run (the future of a source_lang run in progress) translation
+    overlaps generation; without it the chapters already written are used.
+    A chapter is translated again when its source text changes; chapters
+    written directly in lang are left as they are.
+    """
+
+    lang_name = "Arabic" if lang == "ar" else "English"
+    source_name = "Arabic" if source_lang == "ar" else "English"
+    chapters_dir = CHAPTERS_DIR_AR if lang == "ar" else CHAPTERS_DIR_EN
+    chapters_dir.mkdir(exist_ok=True)
+
+    progress = load_progress(lang)
+    served_model = client.backend.model_name(CHAPTER_MODEL)
+    refresh_progress(lang, progress, served_model=served_model)
+
+    log(lang, f"\n{'='*60}")
+    log(lang, f"Translating {lang_name} Version from {source_name}")
+    log(lang, f"{'='*60}")
+    log(lang, f"Total chapters: {len(BOOK_STRUCTURE)}")
+    log(lang, f"Completed: {len(progress['completed'])}")
+    log(lang, "-" * 40)
+
+    def run(chapter):
+        content, source = translate_chapter_file(client, chapter, source_lang, lang)
+        # The translation's own summary is extracted locally; no second model call is needed
+        summarize_chapter(client, chapter, content, lang, local_summaries=True)
+        return content, source
+
+    in_flight = {}
+    failed = set()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            # Checked before scanning, so the chapters the source finished last are still picked up
+            source_finished = source_run is None or source_run.done()
+            not_ready = plan_rebuild(source_lang, load_progress(source_lang), served_model=served_model)
+            if source_run is None:
+                # Nothing is writing the source, so every source chapter on disk counts as finished
+                not_ready = {chapter_id: reason for chapter_id, reason in not_ready.items()
+                             if reason != "not written" or source_fingerprint(chapter_id, source_lang) is None}
+            busy = {chapter['id'] for chapter in in_flight.values()}
+            for chapter in BOOK_STRUCTURE:
+                chapter_id = chapter['id']
+                if chapter_id in not_ready or chapter_id in busy or chapter_id in failed:
+                    continue
+                record = progress['chapters'].get(chapter_id, {})
+                if chapter_id in progress['completed'] and (
+                        not record.get("translated_from")
+                        or record.get("source") == source_fingerprint(chapter_id, source_lang)):
+                    continue
+                title = chapter['title_ar'] if lang == "ar" else chapter['title_en']
+                log(lang, f"\n[...] Translating: {title}")
+                future = executor.submit(run, chapter)
+                in_flight[future] = chapter
+
+            if not in_flight:
+                if source_finished:
+                    break
+                time.sleep(WORKER_POLL_SECONDS)
+                continue
+
+            done, _ = wait(in_flight, timeout=WORKER_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                chapter = in_flight.pop(future)
+                try:
+                    content, source = future.result()
+                except Exception as e:
+                    log(lang, f"[✗] Error translating chapter {chapter['id']}: {e}")
+                    failed.add(chapter['id'])
+                    continue
+                progress['completed'] = order_completed(set(progress['completed']) | {chapter['id']})
+                progress['chapters'][chapter['id']] = chapter_record(chapter, lang, [], served_model=served_model,
+                                                                     translate_from=source_lang, source=source)
+                save_progress(lang, progress)
+                log(lang, f"[✓] Translated: {chapter['id']}.md ({len(content.split())} words)")
+
+    if failed:
+        raise RuntimeError(f"{len(failed)} chapters could not be translated: {', '.join(order_completed(failed))}")
+    return progress
+
+
+def find_chapter(chapter_id):
+    """Look a chapter up in BOOK_STRUCTURE by id."""
+    return next(chapter for chapter in BOOK_STRUCTURE if chapter['id'] == chapter_id)
+
+
+def seed_queue(queue, languages, by_sections=False, inline_summary=False, local_summaries=False,
+               context_budget=None, illustrations=False, served_model=CHAPTER_MODEL, repair=False,
+               translate_from=None):
+    """Enqueue a chapter and a summary job for every chapter that needs writing.
+
+    Every worker calls this on start; jobs are keyed by chapter fingerprint, so
+    existing jobs are kept and only changed chapters get new ones. With
+    translate_from, the other language gets translate jobs that wait for the
+    source chapter instead. Returns the number of jobs that still have to run.
+    """
+    queued = 0
+    source_jobs = {}             # chapter id -> summary job of its source chapter
+    # The source language goes first so its translations can depend on its jobs
+    for lang in sorted(languages, key=lambda lang: lang != translate_from):
+        (CHAPTERS_DIR_AR if lang == "ar" else CHAPTERS_DIR_EN).mkdir(exist_ok=True)
+        with queue.transaction():
+            progress = load_progress(lang)
+            refresh_progress(lang, progress, by_sections, inline_summary, served_model=served_model)
+        translating = translate_from is not None and lang != translate_from
+
+        for position, chapter in enumerate(BOOK_STRUCTURE):
+            if chapter['id'] in progress['completed']:
+                continue
+            payload = {"lang": lang, "chapter": chapter['id'], "by_sections": by_sections,
+                       "inline_summary": inline_summary, "local_summaries": local_summaries,
+                       "context_budget": context_budget, "repair": repair}
+            if translating:
+                # A new source text means a new translation
+                source = source_jobs.get(chapter['id']) or source_fingerprint(chapter['id'], translate_from)
+                if source is None:
+                    log(lang, f"[!] {chapter['id']} has no {translate_from} chapter to translate yet; skipped")
+                    continue
+                key = fingerprint([chapter_fingerprint(chapter, lang, served_model=served_model,
+                                                       translate_from=translate_from), source])
+                chapter_job = f"{lang}/translate/{chapter['id']}/{key}"
+                payload["translate_from"] = translate_from
+                queued += queue.enqueue(chapter_job, "translate", payload, position,
+                                        depends_on=source_jobs.get(chapter['id']))
+            else:
+                key = fingerprint(chapter_fingerprint(chapter, lang, by_sections, inline_summary, served_model))
+                chapter_job = f"{lang}/chapter/{chapter['id']}/{key}"
+                queued += queue.enqueue(chapter_job, "chapter", payload, position)
+                source_jobs[chapter['id']] = f"{lang}/summary/{chapter['id']}/{key}"
+            queued += queue.enqueue(f"{lang}/summary/{chapter['id']}/{key}", "summary", payload, position,
+                                    depends_on=chapter_job)
+
+    if illustrations:
+        if PLAN_FILE.exists():
+            queued += enqueue_illustrations(queue)
+        else:
+            queued += queue.enqueue("illustrations/plan", "illustration_plan", {})
+    return queued
+
+
+def enqueue_illustrations(queue, depends_on=None):
+    """Enqueue one job per illustration plan item the manifest has no image for."""
+    with open(PLAN_FILE, "r", encoding="utf-8") as f:
+        plan = json.load(f)
+    ILLUSTRATION_MANIFEST.adopt(plan)
+    queued = 0
+    for i, illustration in enumerate(plan, 1):
+        if not ILLUSTRATION_MANIFEST.done(illustration):
+            queued += queue.enqueue(f"illustrations/{i:02d}/{plan_key(illustration)}", "illustration",
+                                    {"index": i, "illustration": illustration}, i, depends_on)
+    return queued
+
+
+def run_job(client, queue, job, owner, book_spec, hedge=None, prefix=None):
+    """Run one leased job and mark it done."""
+    payload = job.payload
+
+    if job.kind == "chapter":
+        lang = payload['lang']
+        chapter = find_chapter(payload['chapter'])
+        chapters_dir = CHAPTERS_DIR_AR if lang == "ar" else CHAPTERS_DIR_EN
+        # Like --workers, a chapter sees the summaries finished before it starts
+        context_ids = earlier_chapters(chapter['id'], load_progress(lang)['completed'])
+        summaries = "\n\n".join(read_summaries(chapters_dir, context_ids))
+        context = previous_chapters_context(lang, context_ids, summaries, payload['context_budget'])
+        content, summary = draft_chapter(client, chapter, book_spec, lang, context, payload['by_sections'],
+                                         payload['inline_summary'], hedge, payload.get('repair', False), prefix)
+        queue.complete(job, owner, {"context": context_ids, "summary": summary,
+                                    "words": len(content.split())})
+
+    elif job.kind == "translate":
+        lang = payload['lang']
+        chapter = find_chapter(payload['chapter'])
+        content, source = translate_chapter_file(client, chapter, payload['translate_from'], lang)
+        queue.complete(job, owner, {"context": [], "summary": summarize_locally(content, lang),
+                                    "words": len(content.split()), "source": source})
+
+    elif job.kind == "summary":
+        lang = payload['lang']
+        chapter = find_chapter(payload['chapter'])
+        chapters_dir = CHAPTERS_DIR_AR if lang == "ar" else CHAPTERS_DIR_EN
+        drafted = queue.result(job.depends_on)
+        content = (chapters_dir / f"{chapter['id']}.md").read_text(encoding="utf-8")
+        summarize_chapter(client, chapter, content, lang, drafted['summary'], payload['local_summaries'])
+        # The queue's write lock also serialises progress.json updates between processes
+        with queue.transaction() as db:
+            progress = load_progress(lang)
+            progress['completed'] = order_completed(set(progress['completed']) | {chapter['id']})
+            progress.setdefault('chapters', {})[chapter['id']] = chapter_record(
+                chapter, lang, drafted['context'], payload['by_sections'], payload['inline_summary'],
+                client.backend.model_name(CHAPTER_MODEL), payload.get('translate_from'), drafted.get('source'))
+            save_progress(lang, progress)
+            queue.complete(job, owner, {"words": drafted['words']}, db=db)
+
+    elif job.kind == "illustration_plan":
+        if not PLAN_FILE.exists():
+            with call_context(item="illustration_plan", kind="plan"):
+                plan = generate_illustration_plan(client, book_spec)
+            tmp_file = PLAN_FILE.with_suffix(".json.tmp")
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(plan, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, PLAN_FILE)
+        enqueue_illustrations(queue)
+        queue.complete(job, owner)
+
+    elif job.kind == "illustration":
+        index, illustration = payload['index'], payload['illustration']
+        status, detail = render_illustration(client, ILLUSTRATION_MANIFEST, illustration, index)
+        if status == "failed":
+            raise RuntimeError(f"No image for {illustration['title_en']}: {detail}")
+        queue.complete(job, owner, {"path": str(detail)})
+
+    else:
+        raise ValueError(f"Unknown job kind: {job.kind}")
+
+
+def run_worker(client, queue, book_spec, threads=1, hedge=None, prefix=None):
+    """Drain the job queue with `threads` threads; returns once no job is pending or leased.
+
+    Several worker processes, on this machine or others sharing the queue
+    file, can drain the same queue. A crashed worker's jobs are picked up
+    again once their leases expire.
+    """
+
+    def work():
+        owner = worker_name()
+        done = 0
+        while True:
+            job = queue.lease(owner)
+            if job is None:
+                if not queue.unfinished():
+                    return done
+                time.sleep(WORKER_POLL_SECONDS)
+                continue
+
+            tag = job.payload.get('lang', 'img')
+            log(tag, f"[...] {job.id} (attempt {job.attempts})")
+            try:
+                with queue.keep_alive(job, owner), call_context(worker=owner):
+                    run_job(client, queue, job, owner, book_spec, hedge, prefix)
+            except LeaseLost as e:
+                log(tag, f"[!] {e}; another worker has taken it over")
+                continue
+            except Exception as e:
+                retry = queue.fail(job, owner, e)
+                log(tag, f"[✗] {job.id}: {e}" + ("; will retry" if retry else "; giving up"))
+                continue
+            done += 1
+            log(tag, f"[✓] {job.id}")
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        done = sum(executor.map(lambda _: work(), range(threads)))
+
+    counts = queue.counts()
+    print(f"\nWorker finished {done} jobs. Queue: {counts.get('done', 0)} done, "
+          f"{counts.get('failed', 0)} failed")
+    for job_id, error in queue.failures():
+        print(f"  [✗] {job_id}: {error}")
+
+
+def check_book(languages, client=None, hedge=None, prefix=None):
+    """Check every written chapter against its spec; with a client, repair what is broken.
+
+    Returns the number of chapters with problems that are left unrepaired.
+    """
+    unresolved = 0
+    for lang in languages:
+        chapters_dir = CHAPTERS_DIR_AR if lang == "ar" else CHAPTERS_DIR_EN
+        completed = load_progress(lang)['completed']
+        log(lang, f"\nChecking {len(BOOK_STRUCTURE)} chapters against the book structure")
+        for chapter in BOOK_STRUCTURE:
+            chapter_file = chapters_dir / f"{chapter['id']}.md"
+            if not chapter_file.exists():
+                log(lang, f"  {chapter['id']:<32} not written")
+                continue
+            content = chapter_file.read_text(encoding="utf-8")
+            sections = chapter['sections_ar'] if lang == "ar" else chapter['sections_en']
+            report = check_chapter(content, sections, chapter['word_target'], lang)
+            problems = describe(report)
+            log(lang, f"  {chapter['id']:<32} {report['words']} words" + ("" if problems else ", ok"))
+            for problem in problems:
+                log(lang, f"      - {problem}")
+            if not needs_repair(report):
+                continue
+            if client is None:
+                unresolved += 1
+                continue
+            summaries = "\n\n".join(read_summaries(chapters_dir, earlier_chapters(chapter['id'], completed)))
+            content, _ = repair_chapter(client, chapter, content, lang, summaries, hedge, prefix)
+            tmp_file = chapter_file.with_suffix(".md.tmp")
+            tmp_file.write_text(content, encoding="utf-8")
+            os.replace(tmp_file, chapter_file)
+            after = check_chapter(content, sections, chapter['word_target'], lang)
+            if needs_repair(after):
+                unresolved += 1
+            log(lang, f"  [✓] {chapter['id']} repaired ({report['words']} -> {after['words']} words)")
+    return unresolved
+
+
 def main():
     """Main automation flow."""
     parser = argparse.ArgumentParser(description="Write the Saudi Tech Legal Compass book")
     parser.add_argument("--lang", choices=["ar", "en", "both"], default="both",
                         help="Language to write: ar (Arabic), en (English), or both (default)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of chapters to generate concurrently (default: 1, sequential "
+                             "with full previous-chapter context)")
+    parser.add_argument("--context-budget", type=int, default=None, metavar="TOKENS",
+                        help="Cap the previous-chapters context at roughly this many tokens using a "
+                             "rolling digest of the chapter summaries (default: full history)")
+    parser.add_argument("--sections", action="store_true",
+                        help="Generate each chapter section as its own concurrent request and stitch "
+                             "them under the chapter heading")
+    summary_group = parser.add_mutually_exclusive_group()
+    summary_group.add_argument("--inline-summary", action="store_true",
+                               help="Ask for each chapter's summary in the same response as the "
+                                    "chapter instead of a second call (not with --sections)")
+    summary_group.add_argument("--local-summaries", action="store_true",
+                               help="Build chapter summaries with a local extractive summarizer "
+                                    "instead of a model call")
+    parser.add_argument("--cascade", action="store_true",
+                        help="When a chapter is rewritten because its spec, prompt or model changed, "
+                             "also rewrite the later chapters that used its summary as context")
+    parser.add_argument("--hedge", type=float, default=None, metavar="PERCENTILE",
+                        help="Fire a duplicate chapter request when the first token, or completion, "
+                             "is slower than this percentile of past calls in the ledger (e.g. 95); "
+                             "the first to finish is kept")
+    parser.add_argument("--repair", action="store_true",
+                        help="Check each new chapter against its sections and word target, and "
+                             "regenerate only the sections that are missing or cut short")
+    parser.add_argument("--prefix-cache", type=int, nargs="?", const=DEFAULT_TTL, default=None, metavar="TTL",
+                        help="Upload the book spec, guidelines and audience once per language as cached "
+                             "content living TTL seconds (default: %(const)s) and send chapter calls only "
+                             "their own tail; Gemini only, other backends get the prefix inline")
+    parser.add_argument("--translate-from", choices=["en", "ar"], default=None,
+                        help="Write the book in this language only and translate it into the other, "
+                             "section by section with concurrent calls, as each chapter is finished; "
+                             "headings, tables and code blocks keep the source structure")
+    parser.add_argument("--plan", action="store_true",
+                        help="List the chapters a run would write, and why, without writing anything")
+    worker_group = parser.add_argument_group("job queue")
+    worker_group.add_argument("--worker", action="store_true",
+                              help="Drain a shared SQLite job queue of chapters and summaries; run "
+                                   "several workers at once, here or on hosts sharing the queue file")
+    worker_group.add_argument("--queue", type=Path, default=QUEUE_FILE,
+                              help=f"Job queue database (default: {QUEUE_FILE})")
+    worker_group.add_argument("--queue-journal", choices=["wal", "delete"], default="wal",
+                              help="SQLite journal mode: wal for workers on one host, delete for "
+                                   "workers on several hosts sharing a filesystem (default: wal)")
+    worker_group.add_argument("--illustrations", action="store_true",
+                              help="Also queue illustration jobs from the illustration plan")
+    add_client_arguments(parser)
+    subparsers = parser.add_subparsers(dest="command")
+    report_parser = subparsers.add_parser(
+        "report", help="Summarize the generation ledger: throughput, latency and cost per chapter")
+    report_parser.add_argument("ledger_file", nargs="?", type=Path, default=LEDGER_FILE,
+                               help=f"Ledger to read (default: {LEDGER_FILE})")
+    check_parser = subparsers.add_parser(
+        "check", help="Check written chapters for missing or truncated sections, without model calls")
+    check_parser.add_argument("--repair", action="store_true",
+                              help="Regenerate the missing or truncated sections and splice them in")
     args = parser.parse_args()
 
+    if args.command == "report":
+        print_report(args.ledger_file)
+        return
+
     print("=" * 60)
     print("Saudi Tech Legal Compass - Book Writer")
     print("البوصلة القانونية لشركات التقنية في السعودية")
     print("=" * 60)
 
-    client = get_client()
-    book_spec = read_book_spec()
-
     languages = []
     if args.lang in ["ar", "both"]:
         languages.append("ar")
     if args.lang in ["en", "both"]:
         languages.append("en")
 
-    results = {}
-    for lang in languages:
-        results[lang] = write_book_in_language(client, book_spec, lang)
+    if args.translate_from and languages == [args.translate_from]:
+        parser.error(f"--translate-from {args.translate_from} needs the other language in --lang")
+    if args.inline_summary and args.sections:
+        parser.error("--inline-summary cannot be used with --sections; sections are summarized by a separate call")
+
+    if args.command == "check" and not args.repair:
+        unresolved = check_book(languages)
+        print(f"\n{unresolved} chapters have missing or truncated sections"
+              + ("; run `check --repair` to regenerate them" if unresolved else ""))
+        return
+
+    if args.plan:
+        for lang in languages:
+            print_plan(lang, load_progress(lang), args.cascade, get_backend(args).model_name(CHAPTER_MODEL))
+        return
+
+    client = get_client(args)
+    book_spec = read_book_spec()
+
+    hedge = None
+    if args.hedge:
+        hedge = HedgePolicy.from_ledger(args.ledger, args.hedge)
+        if hedge:
+            print(f"\nHedging slow chapter calls: {hedge.describe()}")
+        else:
+            print(f"\nHedging off: fewer than {MIN_HISTORY} past chapter calls in {args.ledger}")
+
+    prefix = None
+    if args.prefix_cache:
+        prefix = PrefixCache(client, CHAPTER_MODEL, lambda lang: shared_prefix(lang, book_spec), args.prefix_cache)
+
+    try:
+        if args.command == "check":
+            unresolved = check_book(languages, client, hedge, prefix)
+            print(f"\n{unresolved} chapters still have missing or truncated sections after repair")
+            return
+
+        if args.worker:
+            queue = JobQueue(args.queue, journal_mode=args.queue_journal)
+            queued = seed_queue(queue, languages, args.sections, args.inline_summary, args.local_summaries,
+                                args.context_budget, args.illustrations, client.backend.model_name(CHAPTER_MODEL),
+                                args.repair, args.translate_from)
+            print(f"\nJob queue: {args.queue} ({queued} jobs to run)")
+            run_worker(client, queue, book_spec, max(1, args.workers), hedge, prefix)
+            return
+
+        # Languages share nothing but BOOK_STRUCTURE, so run their pipelines side by side;
+        # a translation follows its source language's run as chapters finish
+        results = {}
+        with ThreadPoolExecutor(max_workers=len(languages)) as executor:
+            futures = {}
+            for lang in sorted(languages, key=lambda lang: lang != args.translate_from):
+                if args.translate_from and lang != args.translate_from:
+                    source_run = next((f for f, l in futures.items() if l == args.translate_from), None)
+                    future = executor.submit(translate_book_in_language, client, lang, args.translate_from,
+                                             workers=max(1, args.workers), source_run=source_run)
+                else:
+                    future = executor.submit(write_book_in_language, client, book_spec, lang,
+                                             workers=args.workers, context_budget=args.context_budget,
+                                             by_sections=args.sections, inline_summary=args.inline_summary,
+                                             local_summaries=args.local_summaries, cascade=args.cascade,
+                                             hedge=hedge, repair=args.repair, prefix=prefix)
+                futures[future] = lang
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+    finally:
+        if prefix:
+            prefix.close()
 
     # Final summary
     print("\n" + "=" * 60)